@@ -1,9 +1,11 @@
 import time
 
-from .openapi_adaptor import client
+from .transport import ClientSettings
 
 
 def main():
+    client = ClientSettings().build()
+
     assistant = client.beta.assistants.create(
         name="Math Tutor",
         instructions="You are a personal math tutor. Write and run code to answer math questions.",
@@ -0,0 +1,203 @@
+from collections import deque
+from time import monotonic
+
+from openai import BadRequestError
+
+from gen.hedging import percentile
+from gen.openapi_adaptor import AIModel, OpenAIModel, Question
+from gen.response_cache import ResponseCache
+from gen.singleflight import SingleFlight
+
+
+class Backend:
+    """
+    One OpenAI compatible endpoint behind a MultiBackendModel, with the counters
+    used to route requests to it and report on it.
+    """
+
+    def __init__(self, model: OpenAIModel, weight: float = 1.0, window: int = 500) -> None:
+        self.model = model
+        self.weight = weight
+        self.outstanding = 0
+        self.requests = 0
+        self.failures = 0
+        self.consecutive_failures = 0
+        self.ejected = 0
+        self.ejected_until = 0.0
+        self.latencies = deque(maxlen=window)
+        self.first_request = None
+
+    @property
+    def name(self) -> str:
+        return self.model.name
+
+    @property
+    def healthy(self) -> bool:
+        return monotonic() >= self.ejected_until and not self.model.circuit_breaker.is_open
+
+    @property
+    def load(self) -> float:
+        # the request about to be sent counts too, so idle backends are ordered by weight
+        return (self.outstanding + 1) / self.weight
+
+    def stats(self) -> dict:
+        elapsed = monotonic() - self.first_request if self.first_request else 0
+        prefix = f"backend {self.name}"
+
+        return {
+            f"{prefix} requests": self.requests,
+            f"{prefix} failures": self.failures,
+            f"{prefix} ejected": self.ejected,
+            f"{prefix} p50 latency": percentile(self.latencies, 0.5),
+            f"{prefix} p95 latency": percentile(self.latencies, 0.95),
+            f"{prefix} requests/s": round(self.requests / elapsed, 2) if elapsed else None,
+        }
+
+
+class MultiBackendModel(AIModel):
+    """
+    Spreads chat calls over several OpenAI compatible endpoints. Each request goes
+    to the healthy backend with the fewest outstanding requests relative to its
+    weight. A backend that fails failure_threshold times in a row, or whose own
+    circuit breaker opens, is left out for cooldown seconds. A failed request is
+    tried on the next backend before the error is raised.
+    """
+
+    def __init__(
+        self, backends: list[Backend], failure_threshold: int = 3, cooldown: float = 30.0
+    ) -> None:
+        super().__init__()
+        if not backends:
+            raise ValueError("at least one backend is required")
+
+        self.backends = backends
+        self.failure_threshold = failure_threshold
+        self.cooldown = cooldown
+        self.inflight = SingleFlight()
+        self.failovers = 0
+
+    async def open(self) -> "MultiBackendModel":
+        for backend in self.backends:
+            await backend.model.open()
+        return self
+
+    async def close(self):
+        for backend in self.backends:
+            await backend.model.close()
+
+    async def __aenter__(self) -> "MultiBackendModel":
+        return await self.open()
+
+    async def __aexit__(self, *exc_info):
+        await self.close()
+
+    async def list_models(self, list_all=False):
+        for backend in self.backends:
+            print(f"{backend.name}:")
+            await backend.model.list_models(list_all)
+
+    def pick(self, exclude: set = ()) -> Backend | None:
+        candidates = [backend for backend in self.backends if backend not in exclude]
+        if not candidates:
+            return None
+
+        healthy = [backend for backend in candidates if backend.healthy]
+        if healthy:
+            return min(healthy, key=lambda backend: (backend.load, backend.requests))
+
+        # everything is ejected, use whichever comes back first rather than stalling
+        return min(candidates, key=lambda backend: backend.ejected_until)
+
+    async def call_chat(
+        self,
+        messages: [dict],
+        question: Question = None,
+        trys: int = None,
+        print_output=False,
+        variant: int = 0,
+    ) -> (str, Question):
+        # backends have their own caches and in flight tracking, share identical
+        # requests here so they are not sent to two different endpoints
+        key = ResponseCache.key("", messages, {"variant": variant})
+
+        results, backend, leader = await self.inflight.do(
+            key, lambda: self.dispatch(messages, question, trys, print_output, variant)
+        )
+
+        # the backend only logged the request for the caller that sent it
+        log = getattr(backend.model, "log", None)
+        if question is not leader and question is not None and log is not None:
+            log(question, results)
+
+        return results, question
+
+    async def dispatch(
+        self, messages: [dict], question: Question, trys: int, print_output: bool, variant: int
+    ) -> tuple[str, Backend, Question]:
+        tried = set()
+
+        while True:
+            backend = self.pick(tried)
+            tried.add(backend)
+
+            try:
+                results, _ = await self.send(backend, messages, question, trys, print_output, variant)
+                return results, backend, question
+            except BadRequestError:
+                # the request itself is at fault, another backend will not help
+                raise
+            except Exception:
+                if len(tried) == len(self.backends):
+                    raise
+
+                self.failovers += 1
+
+    async def send(
+        self,
+        backend: Backend,
+        messages: [dict],
+        question: Question,
+        trys: int,
+        print_output: bool,
+        variant: int,
+    ) -> (str, Question):
+        backend.outstanding += 1
+        backend.requests += 1
+        backend.first_request = backend.first_request or monotonic()
+        start = monotonic()
+
+        try:
+            result = await backend.model.call_chat(
+                messages, question, trys=trys, print_output=print_output, variant=variant
+            )
+        except BadRequestError:
+            raise
+        except Exception:
+            self.record_failure(backend)
+            raise
+        finally:
+            backend.outstanding -= 1
+
+        backend.consecutive_failures = 0
+        backend.latencies.append(monotonic() - start)
+
+        return result
+
+    def record_failure(self, backend: Backend):
+        backend.failures += 1
+        backend.consecutive_failures += 1
+
+        if backend.consecutive_failures >= self.failure_threshold:
+            if backend.healthy:
+                backend.ejected += 1
+                print(f"backend {backend.name} ejected for {self.cooldown}s")
+
+            backend.ejected_until = monotonic() + self.cooldown
+            backend.consecutive_failures = 0
+
+    def stats(self) -> dict:
+        stats = {"backend failovers": self.failovers, **self.inflight.stats()}
+        for backend in self.backends:
+            stats.update(backend.stats())
+
+        return stats
@@ -0,0 +1,252 @@
+from abc import ABC, abstractmethod
+from asyncio import sleep
+from hashlib import sha256
+import json
+from pathlib import Path
+import re
+from typing import Callable
+from uuid import uuid4
+
+from openai import AsyncOpenAI
+
+from gen.openapi_adaptor import Question
+
+ENDPOINT = "/v1/chat/completions"
+FINISHED = {"completed", "failed", "expired", "cancelled"}
+# an expired or cancelled batch still has an output file with the requests it finished
+WITH_RESULTS = {"completed", "expired", "cancelled"}
+
+
+class BatchClient(ABC):
+    """
+    Submits a JSONL file of chat completion requests and fetches the results once
+    the batch has finished. Results map custom ids to the response content.
+    """
+
+    @abstractmethod
+    async def submit(self, path: Path) -> str:
+        pass
+
+    @abstractmethod
+    async def status(self, batch_id: str) -> str:
+        pass
+
+    @abstractmethod
+    async def results(self, batch_id: str) -> dict[str, str]:
+        pass
+
+    async def close(self):
+        pass
+
+
+class OpenAIBatchClient(BatchClient):
+    def __init__(self, client: AsyncOpenAI, completion_window: str = "24h") -> None:
+        self.client = client
+        self.completion_window = completion_window
+
+    async def submit(self, path: Path) -> str:
+        with open(path, "rb") as f:
+            batch_file = await self.client.files.create(file=f, purpose="batch")
+
+        batch = await self.client.batches.create(
+            input_file_id=batch_file.id,
+            endpoint=ENDPOINT,
+            completion_window=self.completion_window,
+        )
+
+        return batch.id
+
+    async def status(self, batch_id: str) -> str:
+        batch = await self.client.batches.retrieve(batch_id)
+        return batch.status
+
+    async def results(self, batch_id: str) -> dict[str, str]:
+        batch = await self.client.batches.retrieve(batch_id)
+
+        results = {}
+        for file_id in (batch.output_file_id, batch.error_file_id):
+            if file_id:
+                content = await self.client.files.content(file_id)
+                results.update(read_results(content.text))
+
+        return results
+
+    async def close(self):
+        await self.client.close()
+
+
+class LocalBatchClient(BatchClient):
+    """
+    A file based stand-in for the batch API. Each request is answered by respond,
+    which is given the request body, and the output is written next to the input in
+    the format the batch API uses.
+    """
+
+    def __init__(self, respond: Callable[[dict], str]) -> None:
+        self.respond = respond
+        self.batches = {}
+
+    async def submit(self, path: Path) -> str:
+        batch_id = f"batch_{uuid4().hex}"
+        output_path = Path(path).with_name(f"{batch_id}.output.jsonl")
+
+        with open(path) as requests, open(output_path, "w") as output:
+            for line in requests:
+                request = json.loads(line)
+                body = {"choices": [{"message": {"content": self.respond(request["body"])}}]}
+                output.write(json.dumps({"custom_id": request["custom_id"], "response": {"body": body}}))
+                output.write("\n")
+
+        self.batches[batch_id] = output_path
+
+        return batch_id
+
+    async def status(self, batch_id: str) -> str:
+        return "completed" if batch_id in self.batches else "failed"
+
+    async def results(self, batch_id: str) -> dict[str, str]:
+        return read_results(self.batches[batch_id].read_text())
+
+
+def read_results(text: str) -> dict[str, str]:
+    results = {}
+    for line in text.splitlines():
+        if not line.strip():
+            continue
+
+        result = json.loads(line)
+        body = (result.get("response") or {}).get("body") or {}
+        choices = body.get("choices") or []
+
+        if result.get("error") or not choices:
+            print(f"batch request {result.get('custom_id')} failed: {result.get('error') or body}")
+            continue
+
+        results[result["custom_id"]] = "\n".join(
+            choice["message"]["content"] or "" for choice in choices
+        )
+
+    return results
+
+
+def custom_ids(requests: list[tuple[list[dict], Question]]) -> list[str]:
+    """
+    Ids are stable across runs so a batch can be resumed and readable enough to find
+    an item in the file. Identical prompts get a numbered suffix to keep them unique.
+    """
+    ids = []
+    seen = {}
+
+    for messages, question in requests:
+        digest = sha256(json.dumps([question.get_filename(), messages], sort_keys=True).encode())
+        name = re.sub(r"[^A-Za-z0-9_-]", "_", f"{question.get_filename()}-{question.get_name()}")
+        request_id = f"{name[:40]}-{digest.hexdigest()[:16]}"
+
+        seen[request_id] = seen.get(request_id, 0) + 1
+        if seen[request_id] > 1:
+            request_id = f"{request_id}-{seen[request_id]}"
+
+        ids.append(request_id)
+
+    return ids
+
+
+class BatchRunner:
+    """
+    Runs a set of chat requests through a BatchClient instead of live calls. Each
+    set of requests is written beside path, named after a hash of its custom ids,
+    and the batch id is kept next to it so a run that is restarted with the same
+    requests picks up the batch it already submitted. Separate sets, such as
+    items sent again after a packed batch, get files of their own.
+    """
+
+    def __init__(
+        self,
+        client: BatchClient,
+        model: str,
+        path: Path,
+        params: dict = None,
+        poll_interval: float = 60.0,
+    ) -> None:
+        self.client = client
+        self.model = model
+        self.path = Path(path)
+        self.params = params or {}
+        self.poll_interval = poll_interval
+        self.submitted = 0
+        self.failed = 0
+
+    async def call_chat_all(
+        self, requests: list[tuple[list[dict], Question]]
+    ) -> list[tuple[str, Question]]:
+        if not requests:
+            return []
+
+        ids = custom_ids(requests)
+        path = self.requests_path(ids)
+
+        digest = self.write(path, ids, requests)
+        batch_id = self.submitted_batch(path, digest)
+
+        if batch_id is None:
+            batch_id = await self.client.submit(path)
+            path.with_suffix(".batch").write_text(f"{digest}\n{batch_id}\n")
+            self.submitted += len(requests)
+            print(f"submitted batch {batch_id} with {len(requests)} requests")
+        else:
+            print(f"resuming batch {batch_id}")
+
+        status = await self.wait(batch_id)
+        results = await self.client.results(batch_id) if status in WITH_RESULTS else {}
+
+        responses = []
+        for request_id, (_, question) in zip(ids, requests):
+            if request_id not in results:
+                self.failed += 1
+            responses.append((results.get(request_id, ""), question))
+
+        return responses
+
+    def requests_path(self, ids: list[str]) -> Path:
+        digest = sha256("\n".join(ids).encode()).hexdigest()[:12]
+        return self.path.with_name(f"{self.path.stem}-{digest}{self.path.suffix}")
+
+    def write(self, path: Path, ids: list[str], requests: list[tuple[list[dict], Question]]) -> str:
+        path.parent.mkdir(parents=True, exist_ok=True)
+
+        lines = [
+            json.dumps(
+                {
+                    "custom_id": request_id,
+                    "method": "POST",
+                    "url": ENDPOINT,
+                    "body": {"model": self.model, "messages": messages, **self.params},
+                }
+            )
+            for request_id, (messages, _) in zip(ids, requests)
+        ]
+        content = "\n".join(lines) + "\n"
+        path.write_text(content)
+
+        return sha256(content.encode()).hexdigest()
+
+    def submitted_batch(self, path: Path, digest: str) -> str | None:
+        try:
+            previous_digest, batch_id = path.with_suffix(".batch").read_text().split()
+        except (OSError, ValueError):
+            return None
+
+        return batch_id if previous_digest == digest else None
+
+    async def wait(self, batch_id: str) -> str:
+        while True:
+            status = await self.client.status(batch_id)
+            if status in FINISHED:
+                if status != "completed":
+                    print(f"batch {batch_id} {status}")
+                return status
+
+            await sleep(self.poll_interval)
+
+    def stats(self) -> dict:
+        return {"batch requests submitted": self.submitted, "batch requests failed": self.failed}
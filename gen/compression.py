@@ -0,0 +1,126 @@
+import re
+
+from gen.fast_path import IGNORED_DERIVES
+from gen.splitting import CHAR, skip_string
+
+DECLARATION = re.compile(
+    r"^(?:pub(?:\([^)]*\))?\s+)?(?:(?:async|const|unsafe|extern\s+\"\w+\")\s+)*"
+    r"(?:fn|struct|enum|trait|type|const|static|mod|union)\s+([A-Za-z_]\w*)"
+)
+
+DERIVE = re.compile(r"^#\[derive\(([\w\s,:]*)\)\]$")
+
+# attributes that make no difference to the translation
+NOISE = re.compile(r"^#\[(?:allow|warn|deny|inline|must_use|doc|rustfmt|clippy)\b")
+
+
+class PromptCompressor:
+    """
+    Strips text the model does not need from Rust sources before they are sent:
+    comments, blank lines, trailing whitespace, lint and inline attributes and
+    derives that have no Go equivalent. Doc comments are kept aside, keyed by the
+    name of the item they document, so they can be put back on the Go
+    declarations when the code is assembled.
+    """
+
+    def __init__(self) -> None:
+        self.original = 0
+        self.compressed = 0
+
+    def compress(self, source: str) -> tuple[str, dict[str, list[str]]]:
+        docs = {}
+        pending = []
+        lines = []
+
+        for line in source.splitlines():
+            stripped = line.strip()
+
+            if stripped.startswith("///") and not stripped.startswith("////"):
+                pending.append(("// " + stripped[3:].strip()).rstrip())
+                continue
+
+            if stripped.startswith("#[") and stripped.endswith("]"):
+                attribute = compact_attribute(stripped)
+                if attribute:
+                    lines.append(line[: len(line) - len(line.lstrip())] + attribute)
+                continue
+
+            if pending and stripped and not stripped.startswith("//"):
+                declaration = DECLARATION.match(stripped)
+                if declaration:
+                    docs.setdefault(declaration.group(1), pending)
+                pending = []
+
+            lines.append(line)
+
+        code = "\n".join(
+            line.rstrip() for line in strip_comments("\n".join(lines)).splitlines() if line.strip()
+        )
+
+        self.original += len(source)
+        self.compressed += len(code)
+
+        return code, docs
+
+    def stats(self) -> dict:
+        return {
+            "prompt compression ratio": round(self.compressed / self.original, 3) if self.original else None,
+            "source characters removed by compression": self.original - self.compressed,
+        }
+
+
+def compact_attribute(attribute: str) -> str | None:
+    """
+    The attribute as it should be sent, or None if it can be left out.
+    """
+    if NOISE.match(attribute):
+        return None
+
+    derive = DERIVE.match(attribute)
+    if derive is None:
+        return attribute
+
+    derives = [name.strip() for name in derive.group(1).split(",") if name.strip()]
+    derives = [name for name in derives if name not in IGNORED_DERIVES]
+
+    return f"#[derive({','.join(derives)})]" if derives else None
+
+
+def strip_comments(source: str, literals: bool = False) -> str:
+    """
+    Removes line and block comments, leaving strings and chars that contain
+    comment markers alone. With literals set the strings and chars are emptied too.
+    """
+    code = []
+    idx = 0
+
+    while idx < len(source):
+        c = source[idx]
+
+        if source.startswith("//", idx):
+            newline = source.find("\n", idx)
+            idx = len(source) if newline == -1 else newline
+            continue
+
+        if source.startswith("/*", idx):
+            close = source.find("*/", idx + 2)
+            idx = len(source) if close == -1 else close + 2
+            continue
+
+        if c == '"' or source.startswith('r"', idx) or source.startswith('r#"', idx):
+            end = skip_string(source, idx)
+            code.append('""' if literals else source[idx:end])
+            idx = end
+            continue
+
+        if c == "'":
+            char = CHAR.match(source, idx)
+            length = len(char.group()) if char else 1
+            code.append("''" if literals and char else source[idx : idx + length])
+            idx += length
+            continue
+
+        code.append(c)
+        idx += 1
+
+    return "".join(code)
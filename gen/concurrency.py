@@ -0,0 +1,99 @@
+from asyncio import Condition
+from collections import deque
+from time import monotonic
+
+from gen.hedging import percentile
+
+# latencies needed before slow responses are treated as overload
+MIN_LATENCY_SAMPLES = 20
+
+
+class AdaptiveConcurrency:
+    """
+    An AIMD window on the number of requests in flight. Every healthy response
+    grows the window by increase / window, roughly one slot per window of
+    successes, while overload signals (429s, 5xxs, timeouts) multiply it by
+    decrease. Only one cut is made per median latency, so a burst of failures
+    from the same window counts once.
+
+    Latency varies with the length of the output, so it is not an overload
+    signal by default. With latency_factor set, a response slower than
+    latency_factor times the p90 of recent latencies counts as one.
+    """
+
+    def __init__(
+        self,
+        initial: int = 16,
+        minimum: int = 1,
+        maximum: int = 256,
+        increase: float = 1.0,
+        decrease: float = 0.5,
+        latency_factor: float = None,
+    ) -> None:
+        self.limit = float(initial)
+        self.minimum = minimum
+        self.maximum = maximum
+        self.increase = increase
+        self.decrease = decrease
+        self.latency_factor = latency_factor
+        self.in_flight = 0
+        self.latencies = deque(maxlen=500)
+        self.last_decrease = 0.0
+        self.decreases = 0
+        self.peak = self.limit
+        self.condition = Condition()
+
+    @property
+    def window(self) -> int:
+        return max(self.minimum, int(self.limit))
+
+    async def acquire(self):
+        async with self.condition:
+            await self.condition.wait_for(lambda: self.in_flight < self.window)
+            self.in_flight += 1
+
+    async def release(self, latency: float = None, overloaded: bool = False):
+        if overloaded:
+            self.on_overload()
+        elif latency is not None:
+            self.on_success(latency)
+
+        async with self.condition:
+            self.in_flight -= 1
+            self.condition.notify_all()
+
+    @property
+    def baseline(self) -> float | None:
+        return percentile(self.latencies, 0.5)
+
+    def on_success(self, latency: float):
+        slow = (
+            self.latency_factor is not None
+            and len(self.latencies) >= MIN_LATENCY_SAMPLES
+            and latency > percentile(self.latencies, 0.9) * self.latency_factor
+        )
+        self.latencies.append(latency)
+
+        if slow:
+            self.on_overload()
+            return
+
+        self.limit = min(self.maximum, self.limit + self.increase / self.limit)
+        self.peak = max(self.peak, self.limit)
+
+    def on_overload(self):
+        now = monotonic()
+        if now - self.last_decrease < (self.baseline or 0):
+            return
+
+        self.last_decrease = now
+        self.decreases += 1
+        self.limit = max(self.minimum, self.limit * self.decrease)
+        print(f"concurrency window reduced to {self.window}")
+
+    def stats(self) -> dict:
+        return {
+            "concurrency window": self.window,
+            "concurrency window peak": int(self.peak),
+            "concurrency window decreases": self.decreases,
+        }
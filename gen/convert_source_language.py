@@ -1,12 +1,22 @@
-from asyncio import gather, run
-from dataclasses import dataclass
+from asyncio import as_completed, ensure_future, gather, run
+from dataclasses import dataclass, field
 from os import makedirs, path, walk
 from pathlib import Path
 
+from gen.batch import BatchRunner
+from gen.compression import PromptCompressor
 from gen.enums import Language
-from gen.openapi_adaptor import AIModel, OpenAIModel, Question, ok
+from gen.fast_path import translate_rust_to_go
+from gen.imports import ImportIndex
+from gen.memory import TranslationMemory
+from gen.packing import LIBRARIES, PromptPacker
+from gen.splitting import ItemSplitter
+from gen.structured import INSTRUCTIONS as STRUCTURED_INSTRUCTIONS, parse_structured, to_converted_code
+from gen.openapi_adaptor import AIModel, OpenAIModel, Question, assistant_response, ok, user_message
 from gen.parsers import GoParser, RustParser, ParsedItem
-from gen.parsers.common import Parser
+from gen.parsers.common import ConvertedCode, Parser, extract_code_blocks, run_parser
+from gen.parsers.cache import parse_cache
+from gen.tokens import estimate_message_tokens, estimate_tokens
 
 
 extensions = {
@@ -29,9 +39,9 @@ class ParsedCode:
     code_objects: list[ParsedItem]
 
     @property
-    def imports(self):
-        imports = [i for i in self.code_objects if i.type == "imports"]
-        return ",".join(imports).split(",")
+    def imports(self) -> list[str]:
+        imports = [item.source for item in self.code_objects if item.type == "imports"]
+        return [path for path in ",".join(imports).split(",") if path]
 
 
 @dataclass
@@ -39,6 +49,7 @@ class RustQuestion(Question):
     item: ParsedItem
     code: ParsedCode
     filename: str
+    docs: dict[str, list[str]] = None
 
     def get_text(self) -> str:
         return f"{self.name}\n\n```rust\n{self.expression}\n```\n"
@@ -79,16 +90,68 @@ class RustQuestion(Question):
         return self.name
 
 
+@dataclass
+class FragmentQuestion(RustQuestion):
+    """
+    One part of an item too big to convert in a single request.
+    """
+
+    parent: ParsedItem = None
+    part: int = 0
+    parts: int = 1
+
+    def __repr__(self) -> str:
+        return f"{self.name} part {self.part + 1} of {self.parts}"
+
+
 @dataclass
 class LanguageConverter:
     source_language: Language
     target_language: Language
     model: AIModel
+    requeue_attempts: int = 1
+    candidates: int = 1
+    batch: BatchRunner = None
+    fast_path: bool = True
+    fast_path_hits: int = field(default=0, init=False)
+    memory: TranslationMemory = None
+    packer: PromptPacker = None
+    splitter: ItemSplitter = None
+    granularity: str = "method"
+    compressor: PromptCompressor = None
+    import_context: bool = True
+    import_index: ImportIndex = field(default_factory=ImportIndex, init=False, repr=False)
+    structured: bool = False
+    structured_responses: int = field(default=0, init=False)
+    structured_fallbacks: int = field(default=0, init=False)
+    prompt_tokens_saved: int = field(default=0, init=False)
+    candidates_rescued: int = field(default=0, init=False)
+    candidates_failed: int = field(default=0, init=False)
+    parsed: dict[str, list[ParsedItem]] = field(default_factory=dict, init=False, repr=False)
+
+    def __post_init__(self):
+        if self.granularity == "method":
+            return
+
+        skipped = [
+            name
+            for name, enabled in (
+                ("the fast path", self.fast_path),
+                ("the translation memory", self.memory is not None),
+                ("packing", self.packer is not None),
+            )
+            if enabled
+        ]
+        if skipped:
+            print(
+                f"granularity {self.granularity}: structs and files grouped into one request go to the "
+                f"model as they are, {', '.join(skipped)} only apply to single declarations"
+            )
 
     async def convert_directory(self, src_dir: str, dest_dir: str, exclude=set[str]):
         from_ext = extensions[self.source_language]
         to_ext = extensions[self.target_language][0]
-        tasks = []
+        files_to_convert = []
 
         for root, _, files in walk(src_dir, topdown=False):
             for f in files:
@@ -104,11 +167,67 @@ class LanguageConverter:
 
                 dest = Path(f.replace(src_dir, dest_dir).replace(src.suffix, to_ext))
 
-                tasks.extend(self.convert_file(src, dest))
+                files_to_convert.append((src, dest))
+
+        await self.preparse([src for src, _ in files_to_convert])
+
+        if self.batch:
+            await self.convert_batch(files_to_convert)
+            return
+
+        tasks = []
+        for src, dest in files_to_convert:
+            tasks.extend(self.convert_file(src, dest))
 
         await gather(*tasks)
 
+    async def preparse(self, files: list[Path]):
+        """
+        Parse the source and tests of every file up front, parsers that support it
+        handle the whole batch with a single helper process.
+        """
+        codes = []
+        packages = []
+        for src in files:
+            for code in self.source_parser.extract_source_and_tests(src.read_text()):
+                if code:
+                    codes.append(code)
+                    packages.append(src.parent.name)
+
+        for code, package, code_objects in zip(codes, packages, await self.source_parser.parse_many_async(codes)):
+            if code_objects is not None:
+                self.parsed[code] = code_objects
+                self.import_index.add_symbols(code_objects, package)
+
+    async def convert_batch(self, files_to_convert: list[tuple[Path, Path]]):
+        """
+        Render the prompt for every item in every file into a single batch, wait for
+        it to finish, then assemble each file from its share of the results.
+        """
+        jobs = []
+        for src, dest in files_to_convert:
+            jobs.extend(self.source_jobs(src, dest))
+
+        file_requests = await gather(
+            *[self.make_requests(code, dest, conversion_func) for _, code, dest, conversion_func in jobs]
+        )
+
+        responses = await self.respond_all(
+            [request for requests in file_requests for request in requests]
+        )
+
+        start = 0
+        for (package_name, _, dest, _), requests in zip(jobs, file_requests):
+            await self.write_code(package_name, responses[start : start + len(requests)], dest)
+            start += len(requests)
+
     def convert_file(self, src: Path, dest: Path):
+        return [
+            self.convert_source(package_name, code, dest, conversion_func)
+            for package_name, code, dest, conversion_func in self.source_jobs(src, dest)
+        ]
+
+    def source_jobs(self, src: Path, dest: Path) -> list[tuple]:
         print(f"converting {src} to {dest}")
         if not dest.parent.exists():
             makedirs(dest.parent)
@@ -119,25 +238,17 @@ class LanguageConverter:
 
         source, tests = self.source_parser.extract_source_and_tests(code)
 
-        tasks = []
+        jobs = []
 
         if source:
-            tasks.append(
-                self.convert_source(
-                    package_name, source, dest, self.make_source_conversion_messages
-                )
-            )
+            jobs.append((package_name, source, dest, self.make_source_conversion_messages))
 
         if tests:
             tests_dest = dest.parent / f"{dest.stem}_test{dest.suffix}"
 
-            tasks.append(
-                self.convert_source(
-                    package_name, tests, tests_dest, self.make_test_conversion_messages
-                )
-            )
+            jobs.append((package_name, tests, tests_dest, self.make_test_conversion_messages))
 
-        return tasks
+        return jobs
 
     async def convert_source_simple(self, _, code, dest, conversion_func):
         messages = conversion_func(code)
@@ -148,32 +259,409 @@ class LanguageConverter:
         return new_code
 
     async def convert_source(self, package_name, code, dest, conversion_func):
-        tasks = []
-        code_objects = self.source_parser.parse(code)
+        requests = await self.make_requests(code, dest, conversion_func)
+
+        response = await self.respond_all(requests)
+
+        return await self.write_code(package_name, response, dest)
+
+    async def make_requests(self, code, dest, conversion_func) -> list[tuple[list[dict], Question]]:
+        requests = []
+        code_objects = self.parsed.get(code) or await self.source_parser.parse_async(code)
         if code_objects is None:
             raise ValueError(f"Error parsing code. {dest}")
 
         parsed_code = ParsedCode(code_objects)
 
-        for item in self.source_parser.enumerate_code(code_objects):
+        # groups too big for the splitter's limit are sent as their members instead
+        max_tokens = self.splitter.max_tokens if self.splitter else None
+        items = list(self.source_parser.enumerate_code(code_objects, self.granularity, max_tokens=max_tokens))
+        self.prompt_tokens_saved += self.tokens_saved(code_objects, items, conversion_func)
+
+        for item in items:
             if item.name == "imports":
                 continue
-            messages = conversion_func(item.source)
-            tasks.append(
-                self.model.call_chat(
-                    messages, RustQuestion(item, parsed_code, dest)
+
+            pieces = self.splitter.split(item) if self.splitter else [item]
+
+            # a split impl can hold several split methods, each is joined on its own
+            fragments = {}
+            for piece in pieces:
+                if piece.type == "fragment":
+                    fragments.setdefault(piece.name, []).append(piece)
+
+            parents = {
+                name: ParsedItem(
+                    name,
+                    "method" if group[0].receiver else "function",
+                    "\n".join(fragment.source for fragment in group),
+                    group[0].receiver,
                 )
-            )
+                for name, group in fragments.items()
+            }
+
+            for piece in pieces:
+                libs = (
+                    self.import_index.relevant(str(dest), parsed_code.imports, piece.source)
+                    if self.import_context
+                    else []
+                )
+                source, docs = self.compressor.compress(piece.source) if self.compressor else (piece.source, None)
+                messages = conversion_func(source, libs)
+
+                if self.structured:
+                    messages = messages[:-1] + [user_message(STRUCTURED_INSTRUCTIONS), ok()] + messages[-1:]
+
+                if piece.type != "fragment":
+                    requests.append((messages, RustQuestion(piece, parsed_code, dest, docs)))
+                    continue
+
+                group = fragments[piece.name]
+                question = FragmentQuestion(
+                    piece,
+                    parsed_code,
+                    dest,
+                    docs,
+                    parent=parents[piece.name],
+                    part=group.index(piece),
+                    parts=len(group),
+                )
+                requests.append((self.add_fragment_instructions(messages, question), question))
+
+        return requests
+
+    def tokens_saved(self, code_objects: list[ParsedItem], items: list[ParsedItem], conversion_func) -> int:
+        """
+        Estimated prompt tokens saved against sending every method with the full
+        source of its struct, the instructions sent with each request included.
+        """
+        per_method = [
+            item
+            for item in self.source_parser.enumerate_code(code_objects, "method", summarize=False)
+            if item.name != "imports"
+        ]
+        items = [item for item in items if item.name != "imports"]
+
+        overhead = estimate_message_tokens(conversion_func(""))
+        before = sum(estimate_tokens(item.source) for item in per_method) + overhead * len(per_method)
+        after = sum(estimate_tokens(item.source) for item in items) + overhead * len(items)
+
+        return before - after
+
+    def add_fragment_instructions(self, messages: list[dict], question: FragmentQuestion) -> list[dict]:
+        if question.part == 0:
+            position = "It starts with the function signature, convert that and leave the function open."
+        elif question.part == question.parts - 1:
+            position = "It ends with the function's closing brace, only this part closes the function."
+        else:
+            position = "It continues the function body, do not repeat the signature or close the function."
+
+        instructions = (
+            f"The next message is part {question.part + 1} of {question.parts} of the function "
+            f"{question.name}, which is too long to convert at once. {position} Convert only the "
+            f"statements in this part, using the same variable names as the other parts would."
+        )
+
+        return messages[:-1] + [user_message(instructions), ok()] + messages[-1:]
+
+    def join_fragments(self, responses: list[tuple[str, Question]]) -> list[tuple[str, Question]]:
+        """
+        Join the responses for the fragments of a split function back into one
+        response for the whole function.
+        """
+        joined = []
+        parts = []
+        docs = {}
+        markdown_name = markdown_names[self.target_language]
+
+        for response, question in responses:
+            if not isinstance(question, FragmentQuestion):
+                joined.append((response, question))
+                continue
+
+            parts.append(next(iter(extract_code_blocks(response, markdown_name)), ""))
+            docs.update(question.docs or {})
 
-        response = await gather(*tasks)
+            if question.part == question.parts - 1:
+                code = self.target_parser.join_code_blocks(parts)
+                parent = RustQuestion(question.parent, question.code, question.filename, docs or None)
+                joined.append((f"```{markdown_name}\n{code}```", parent))
+                parts = []
+                docs = {}
 
-        new_code = self.target_parser.assemble_new_code(package_name, response)
+        return joined
+
+    async def write_code(self, package_name, response, dest) -> str:
+        response = self.join_fragments(response)
+        new_code = await self.target_parser.assemble_new_code_async(package_name, response)
 
         if dest:
             dest.write_text(new_code)
 
         return new_code
 
+    async def respond_all(self, requests: list[tuple[list[dict], Question]]) -> list[tuple[str, Question]]:
+        """
+        Answer what the rule based translator or the translation memory can handle
+        directly and send the rest to the model, live or as a batch. Close matches
+        from the memory are added to the prompt as examples.
+        """
+        responses = [None] * len(requests)
+        pending = []
+
+        for idx, (messages, question) in enumerate(requests):
+            response = self.translate(question)
+            if response is not None:
+                self.fast_path_hits += 1
+            elif self.memory is not None:
+                code, examples = self.memory.lookup(question.expression)
+                if code is not None:
+                    response = f"```{markdown_names[self.target_language]}\n{code}```"
+                messages = self.add_examples(messages, examples)
+
+            if response is None:
+                pending.append((idx, (messages, question)))
+            else:
+                responses[idx] = (response, question)
+
+        results = await self.send_all([request for _, request in pending])
+
+        for (idx, (_, question)), response in zip(pending, results):
+            if self.structured:
+                response = (self.read_structured(*response), question)
+
+            responses[idx] = response
+            if self.memory is not None and response[0] and not isinstance(question, FragmentQuestion):
+                # only code that would be assembled is remembered, not the raw reply
+                code = await run_parser(self.usable_block, response[0], question)
+                if code:
+                    self.memory.learn(question.expression, code)
+
+        return responses
+
+    def read_structured(self, response: str, question: Question) -> str:
+        """
+        The code from a structured response, ready to assemble without parsing it.
+        Fragments become a code block so they can be joined with the other parts.
+        Responses that are not valid structured output are returned unchanged and
+        read as markdown.
+        """
+        structured = parse_structured(response)
+
+        if structured is not None and isinstance(question, FragmentQuestion):
+            code = ConvertedCode("\n\n".join(decl.source for decl in structured.decls), structured.imports)
+        else:
+            code = structured and to_converted_code(structured, question)
+
+        if not code:
+            if response:
+                self.structured_fallbacks += 1
+            return response
+
+        self.structured_responses += 1
+
+        if isinstance(question, FragmentQuestion):
+            imports = self.target_parser.make_imports(code.imports) if code.imports else ""
+            return f"```{markdown_names[self.target_language]}\n{imports}{code}\n```"
+
+        # assembly takes converted code as is, so compressed away docs go back on here
+        if getattr(question, "docs", None):
+            code = ConvertedCode(self.target_parser.attach_docs(code, question.docs), code.imports)
+
+        return code
+
+    async def send_all(self, requests: list[tuple[list[dict], Question]]) -> list[tuple[str, Question]]:
+        """
+        Send the requests live or as a batch, packing small items together when a
+        packer is set. Items that cannot be split out of a packed response are sent
+        again on their own. Packed responses are markdown so nothing is packed when
+        structured output is asked for.
+        """
+        call_chat_all = self.batch.call_chat_all if self.batch else self.call_chat_all
+        if self.packer is None or self.structured:
+            return await call_chat_all(requests)
+
+        source_name = markdown_names[self.source_language]
+        target_name = markdown_names[self.target_language]
+
+        packs = self.packer.pack(requests, source_name, target_name)
+        results = await call_chat_all([request for _, request in packs])
+
+        responses = [None] * len(requests)
+        for (indices, _), (response, _) in zip(packs, results):
+            if len(indices) == 1:
+                responses[indices[0]] = (response, requests[indices[0]][1])
+                continue
+
+            for idx, section in zip(indices, self.packer.split(response, len(indices), target_name)):
+                if section is not None:
+                    responses[idx] = (section, requests[idx][1])
+
+        retry = [idx for idx, response in enumerate(responses) if response is None]
+        for idx, response in zip(retry, await call_chat_all([requests[idx] for idx in retry]) if retry else []):
+            responses[idx] = response
+
+        return responses
+
+    def add_examples(self, messages: list[dict], examples: list[tuple[str, str]]) -> list[dict]:
+        if not examples:
+            return messages
+
+        source_name = markdown_names[self.source_language]
+        target_name = markdown_names[self.target_language]
+
+        shots = []
+        for source, target in examples:
+            shots.append(user_message(f"```{source_name}\n{source}```"))
+            shots.append(assistant_response(f"```{target_name}\n{target}```"))
+
+        return messages[:-1] + shots + messages[-1:]
+
+    def translate(self, question: Question) -> str | None:
+        if not self.fast_path or (self.source_language, self.target_language) != (Language.Rust, Language.Golang):
+            return None
+
+        known_types = {
+            item.name for item in question.code.code_objects if item.type in ("struct", "enum", "type")
+        }
+
+        return translate_rust_to_go(question.item, known_types)
+
+    async def call_chat_all(self, requests: list[tuple[list[dict], Question]]) -> list[tuple[str, Question]]:
+        """
+        Send every request concurrently. Failed requests are re-queued behind the rest
+        rather than failing the file, anything that still fails gets an empty response
+        so it is written out as a comment.
+        """
+        responses = await gather(
+            *[self.call_chat(messages, question) for messages, question in requests],
+            return_exceptions=True,
+        )
+
+        for _ in range(self.requeue_attempts):
+            failed = [idx for idx, response in enumerate(responses) if isinstance(response, Exception)]
+            if not failed:
+                break
+
+            print(f"re-queueing {len(failed)} failed requests")
+
+            retried = await gather(
+                *[self.call_chat(*requests[idx]) for idx in failed],
+                return_exceptions=True,
+            )
+
+            for idx, response in zip(failed, retried):
+                responses[idx] = response
+
+        return [
+            ("", question) if isinstance(response, Exception) else response
+            for response, (_, question) in zip(responses, requests)
+        ]
+
+    async def call_chat(self, messages: list[dict], question: Question) -> tuple[str, Question]:
+        if self.candidates <= 1:
+            return await self.model.call_chat(messages, question)
+
+        return await self.call_chat_best_of(messages, question)
+
+    async def call_chat_best_of(self, messages: list[dict], question: Question) -> tuple[str, Question]:
+        """
+        Ask for several candidates in parallel and check each with the target parser as
+        it arrives, the first that parses and names the item wins and the rest are
+        cancelled. If none are usable the first response received is returned.
+        """
+
+        async def candidate(variant: int) -> tuple[int, tuple[str, Question]]:
+            return variant, await self.model.call_chat(messages, question, variant=variant)
+
+        calls = [ensure_future(candidate(variant)) for variant in range(self.candidates)]
+
+        first_response = None
+        error = None
+
+        try:
+            for call in as_completed(calls):
+                try:
+                    variant, response = await call
+                except Exception as err:
+                    error = err
+                    continue
+
+                if first_response is None:
+                    first_response = response
+
+                if await run_parser(self.is_usable_response, response[0], question):
+                    if variant:
+                        self.candidates_rescued += 1
+                    return response
+        finally:
+            for call in calls:
+                call.cancel()
+
+        self.candidates_failed += 1
+
+        if first_response is None:
+            raise error
+
+        return first_response
+
+    def is_usable_response(self, response: str, question: Question) -> bool:
+        return self.usable_block(response, question) is not None
+
+    def usable_block(self, response: str, question: Question) -> str | None:
+        """
+        The code block of a response that assembly would take the item from, or
+        None if there is no such block.
+        """
+        if self.structured and not isinstance(response, ConvertedCode):
+            structured = parse_structured(response)
+            response = structured and to_converted_code(structured, question) or response
+
+        if isinstance(response, ConvertedCode):
+            imports = self.target_parser.make_imports(response.imports) if response.imports else ""
+            return f"{imports}{response}"
+
+        for code_block in extract_code_blocks(response, markdown_names[self.target_language]):
+            code, _ = self.target_parser.get_code_and_imports(code_block, question, set())
+            if code:
+                return code_block
+
+        return None
+
+    def stats(self) -> dict:
+        stats = {
+            **parse_cache.stats(),
+            "calls avoided by the fast path": self.fast_path_hits,
+            "prompt tokens saved by granularity": self.prompt_tokens_saved,
+        }
+        if self.batch:
+            stats.update(self.batch.stats())
+        if self.memory is not None:
+            stats.update(self.memory.stats())
+        if self.packer is not None:
+            stats.update(self.packer.stats())
+        if self.splitter is not None:
+            stats.update(self.splitter.stats())
+        if self.compressor is not None:
+            stats.update(self.compressor.stats())
+        if self.import_context:
+            stats.update(self.import_index.stats())
+        if self.structured:
+            stats.update(
+                {
+                    "structured responses assembled directly": self.structured_responses,
+                    "structured responses read as markdown": self.structured_fallbacks,
+                }
+            )
+        if self.candidates <= 1:
+            return stats
+
+        return {
+            **stats,
+            "items rescued by a later candidate": self.candidates_rescued,
+            "items with no usable candidate": self.candidates_failed,
+        }
+
     def make_source_conversion_messages(self, code, libs=[]):
         messages = [
             {
@@ -187,20 +675,22 @@ class LanguageConverter:
                         f"that the code is well formatted, follows best practices and is uses valid syntax so that can be parsed by the {self.target_language.name} compiler."
             },
             ok(),
-            {"role": "user", "content": code},
         ]
 
         if libs:
             messages.extend(
                 [
-                    ok(),
                     {
                         "role": "user",
-                        "content": f"Please use this following libraries if applicable: {', '.join(self.libs)}",
+                        "content": f"{LIBRARIES}{', '.join(libs)}",
                     },
+                    ok(),
                 ]
             )
 
+        # the code is always the last message, packing and batching rely on it
+        messages.append({"role": "user", "content": code})
+
         return messages
 
     def make_test_conversion_messages(self, code, libs=[]):
@@ -216,20 +706,22 @@ class LanguageConverter:
                 "Please convert the entire file, DO NOT leave placeholders for someone else to finish converting the code.",
             },
             ok(),
-            {"role": "user", "content": code},
         ]
 
         if libs:
             messages.extend(
                 [
-                    ok(),
                     {
                         "role": "user",
-                        "content": f"Please use this following libraries if applicable: {', '.join(self.libs)}",
+                        "content": f"{LIBRARIES}{', '.join(libs)}",
                     },
+                    ok(),
                 ]
             )
 
+        # the code is always the last message, packing and batching rely on it
+        messages.append({"role": "user", "content": code})
+
         return messages
 
     @property
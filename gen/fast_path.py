@@ -0,0 +1,323 @@
+import re
+
+from gen.parsers.common import ConvertedCode, ParsedItem
+
+TAB = "\t"
+
+PRIMITIVES = {
+    "i8": "int8",
+    "i16": "int16",
+    "i32": "int32",
+    "i64": "int64",
+    "isize": "int",
+    "u8": "uint8",
+    "u16": "uint16",
+    "u32": "uint32",
+    "u64": "uint64",
+    "usize": "int",
+    "f32": "float32",
+    "f64": "float64",
+    "bool": "bool",
+    "char": "rune",
+    "String": "string",
+    "&str": "string",
+    "&'staticstr": "string",
+}
+
+# derives that have no effect on the Go translation
+IGNORED_DERIVES = {"Debug", "Clone", "Copy", "PartialEq", "Eq", "Hash", "PartialOrd", "Ord", "Default"}
+
+INTEGER = re.compile(r"^-?(0x[0-9a-fA-F_]+|0o[0-7_]+|0b[01_]+|[0-9][0-9_]*)(?:[iu](?:8|16|32|64|size))?$")
+FLOAT = re.compile(r"^-?[0-9][0-9_]*\.[0-9_]+(?:[eE][+-]?[0-9]+)?(?:f32|f64)?$")
+STRING = re.compile(r'^"(?:[^"\\\n]|\\[nrt\\"])*"$')
+CHAR = re.compile(r"^'(?:[^'\\]|\\[nrt\\'])'$")
+
+CONST = re.compile(r"^(pub(?:\([^)]*\))?\s+)?const\s+([A-Za-z_]\w*)\s*:\s*(.+?)\s*=\s*(.+?)\s*;$", re.S)
+STRUCT = re.compile(r"^(pub(?:\([^)]*\))?\s+)?struct\s+([A-Za-z_]\w*)\s*(;|\{(.*)\})$", re.S)
+ENUM = re.compile(r"^(pub(?:\([^)]*\))?\s+)?enum\s+([A-Za-z_]\w*)\s*\{(.*)\}$", re.S)
+FIELD = re.compile(r"^(pub(?:\([^)]*\))?\s+)?([a-z_]\w*)\s*:\s*(.+?),?$")
+VARIANT = re.compile(r"^([A-Z]\w*)\s*(?:=\s*(.+?))?,?$")
+REPR = re.compile(r"^#\[repr\((\w+)\)\]$")
+DERIVE = re.compile(r"^#\[derive\(([\w\s,]*)\)\]$")
+
+
+def translate_rust_to_go(item: ParsedItem, known_types: set[str] = frozenset()) -> ConvertedCode | None:
+    """
+    Translate consts with literal values, unit and field-only structs and C-like
+    enums straight into Go. Anything not fully understood returns None and is left
+    to the model. Field types must be primitives, strings, Vecs, arrays, HashMaps or
+    HashSets of those, or types in known_types.
+
+    Type names are kept as they are in Rust, private or not, so they match both
+    the references to them from other items and the names the converted methods
+    are matched against.
+    """
+    header = read_header(item.source)
+    if header is None:
+        return None
+
+    comments, repr_type, body = header
+
+    if item.type == "const" and repr_type is None:
+        code = translate_const(body)
+    elif item.type == "struct" and repr_type is None:
+        code = translate_struct(body, known_types)
+    elif item.type == "enum":
+        code = translate_enum(body, repr_type)
+    else:
+        return None
+
+    if code is None:
+        return None
+
+    return ConvertedCode("\n".join(comments + [code]))
+
+
+def read_header(source: str) -> tuple[list[str], str | None, str] | None:
+    """
+    Split the doc comments and attributes off an item. Attributes other than
+    ignorable derives and a repr make the item unsupported.
+    """
+    comments = []
+    repr_type = None
+    lines = source.strip().splitlines()
+
+    while lines:
+        line = lines[0].strip()
+
+        if line.startswith("///") or (line.startswith("//") and not line.startswith("//!")):
+            comments.append("//" + line.lstrip("/"))
+        elif line.startswith("#["):
+            derive = DERIVE.match(line)
+            repr_match = REPR.match(line)
+
+            if derive:
+                if not {d.strip() for d in derive.group(1).split(",") if d.strip()} <= IGNORED_DERIVES:
+                    return None
+            elif repr_match:
+                repr_type = repr_match.group(1)
+            else:
+                return None
+        elif line:
+            break
+
+        lines.pop(0)
+
+    return comments, repr_type, "\n".join(lines).strip()
+
+
+def translate_const(body: str) -> str | None:
+    match = CONST.match(body)
+    if match is None:
+        return None
+
+    public, name, rust_type, value = match.groups()
+
+    go = go_type(rust_type)
+    value = go_literal(value)
+    if go is None or value is None:
+        return None
+
+    return f"const {go_name(name, bool(public))} {go} = {value}"
+
+
+def translate_struct(body: str, known_types: set[str]) -> str | None:
+    match = STRUCT.match(body)
+    if match is None:
+        return None
+
+    _, name, _, fields = match.groups()
+    if fields is None or not fields.strip():
+        return f"type {name} struct{{}}"
+
+    members = read_members(fields)
+    if members is None:
+        return None
+
+    lines = []
+    for comments, field in members:
+        field_match = FIELD.match(field)
+        if field_match is None:
+            return None
+
+        field_public, field_name, rust_type = field_match.groups()
+        go = go_type(rust_type, known_types)
+        if go is None:
+            return None
+
+        lines.append((comments, go_name(field_name, bool(field_public)), go))
+
+    width = max(len(field_name) for _, field_name, _ in lines)
+    declaration = [f"type {name} struct {{"]
+
+    for comments, field_name, go in lines:
+        declaration.extend(f"{TAB}{comment}" for comment in comments)
+        declaration.append(f"{TAB}{field_name.ljust(width)} {go}")
+
+    declaration.append("}")
+
+    return "\n".join(declaration)
+
+
+def translate_enum(body: str, repr_type: str | None) -> str | None:
+    match = ENUM.match(body)
+    if match is None:
+        return None
+
+    _, name, variants = match.groups()
+    members = read_members(variants)
+
+    underlying = PRIMITIVES.get(repr_type or "isize")
+    if not members or underlying is None or underlying in ("string", "bool", "rune"):
+        return None
+
+    values = []
+    explicit = False
+    next_value = 0
+
+    for comments, variant in members:
+        variant_match = VARIANT.match(variant)
+        if variant_match is None:
+            return None
+
+        variant_name, discriminant = variant_match.groups()
+        if discriminant is not None:
+            if not INTEGER.match(discriminant):
+                return None
+            number = re.sub(r"[iu](?:8|16|32|64|size)$", "", discriminant).replace("_", "")
+            # rust reads a leading zero as decimal, python only accepts it with base 10
+            next_value = int(number, 0 if re.match(r"^-?0[xob]", number) else 10)
+            explicit = True
+
+        values.append((comments, variant_name, next_value))
+        next_value += 1
+
+    type_name = name
+    declaration = [f"type {type_name} {underlying}", "", "const ("]
+
+    names = [f"{type_name}{variant_name}" for _, variant_name, _ in values]
+    width = max(len(constant) for constant in names)
+
+    for idx, ((comments, _, value), constant) in enumerate(zip(values, names)):
+        declaration.extend(f"{TAB}{comment}" for comment in comments)
+
+        if explicit:
+            declaration.append(f"{TAB}{constant.ljust(width)} {type_name} = {value}")
+        elif idx == 0:
+            declaration.append(f"{TAB}{constant} {type_name} = iota")
+        else:
+            declaration.append(f"{TAB}{constant}")
+
+    declaration.append(")")
+
+    return "\n".join(declaration)
+
+
+def read_members(body: str) -> list[tuple[list[str], str]] | None:
+    """
+    Fields or variants one per line, each with the comments above it. Attributes
+    and members spread over several lines are not supported.
+    """
+    members = []
+    comments = []
+
+    for line in body.splitlines():
+        line = line.strip()
+        if not line:
+            continue
+
+        if line.startswith("//"):
+            comments.append("//" + line.lstrip("/"))
+            continue
+
+        if line.startswith("#[") or "/*" in line or "//" in line:
+            return None
+
+        if len([part for part in split_args(line) if part.strip()]) != 1:
+            return None
+
+        members.append((comments, line))
+        comments = []
+
+    return members
+
+
+def go_type(rust_type: str, known_types: set[str] = frozenset()) -> str | None:
+    rust_type = rust_type.strip()
+    compact = rust_type.replace(" ", "")
+
+    if compact in PRIMITIVES:
+        return PRIMITIVES[compact]
+
+    if compact in known_types:
+        return compact
+
+    generic = re.match(r"^(\w+)<(.+)>$", compact)
+    if generic:
+        container, args = generic.group(1), split_args(generic.group(2))
+
+        if container == "Vec" and len(args) == 1:
+            inner = go_type(args[0], known_types)
+            return inner and f"[]{inner}"
+
+        if container == "HashMap" and len(args) == 2:
+            key, value = go_type(args[0], known_types), go_type(args[1], known_types)
+            return key and value and f"map[{key}]{value}"
+
+        if container == "HashSet" and len(args) == 1:
+            inner = go_type(args[0], known_types)
+            return inner and f"map[{inner}]struct{{}}"
+
+        return None
+
+    array = re.match(r"^\[(.+);([0-9]+)\]$", compact)
+    if array:
+        inner = go_type(array.group(1), known_types)
+        return inner and f"[{array.group(2)}]{inner}"
+
+    return None
+
+
+def split_args(args: str) -> list[str]:
+    parts = []
+    depth = 0
+    start = 0
+
+    for idx, c in enumerate(args):
+        if c in "<[(":
+            depth += 1
+        elif c in ">])":
+            depth -= 1
+        elif c == "," and depth == 0:
+            parts.append(args[start:idx])
+            start = idx + 1
+
+    parts.append(args[start:])
+
+    return parts
+
+
+def go_literal(value: str) -> str | None:
+    value = value.strip()
+
+    if value in ("true", "false") or STRING.match(value) or CHAR.match(value):
+        return value
+
+    if INTEGER.match(value):
+        return re.sub(r"[iu](?:8|16|32|64|size)$", "", value)
+
+    if FLOAT.match(value):
+        return re.sub(r"f(?:32|64)$", "", value)
+
+    return None
+
+
+def go_name(name: str, exported: bool) -> str:
+    """
+    SNAKE_CASE and snake_case become PascalCase when exported and camelCase when
+    not. Names already in CamelCase keep their casing apart from the first letter.
+    """
+    if "_" in name or name.isupper() or name.islower():
+        name = "".join(part[:1].upper() + part[1:].lower() for part in name.split("_") if part)
+
+    return (name[:1].upper() if exported else name[:1].lower()) + name[1:]
@@ -0,0 +1,103 @@
+from asyncio import FIRST_COMPLETED, ensure_future, wait
+from collections import deque
+from time import monotonic
+from typing import Awaitable, Callable, TypeVar
+
+T = TypeVar("T")
+
+
+def percentile(values, fraction: float) -> float | None:
+    if not values:
+        return None
+
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+
+class HedgePolicy:
+    """
+    Sends a duplicate request when the first has run longer than the given
+    percentile of recent latencies for the model. Whichever finishes first wins
+    and the other is cancelled. Hedges are capped at budget times the number of
+    requests.
+
+    Two latency series are kept: what callers saw, and how long the primary
+    request took (or had taken when it was cancelled, a lower bound), which is
+    the latency without hedging.
+    """
+
+    def __init__(
+        self, percentile: float = 0.95, budget: float = 0.05, min_samples: int = 20, window: int = 500
+    ) -> None:
+        self.percentile = percentile
+        self.budget = budget
+        self.min_samples = min_samples
+        self.latencies = deque(maxlen=window)
+        self.primary_latencies = deque(maxlen=window)
+        self.requests = 0
+        self.hedges = 0
+        self.hedge_wins = 0
+
+    def delay(self) -> float | None:
+        if len(self.primary_latencies) < self.min_samples:
+            return None
+
+        return percentile(self.primary_latencies, self.percentile)
+
+    def can_hedge(self) -> bool:
+        return self.hedges < self.budget * self.requests
+
+    async def run(self, request: Callable[[], Awaitable[T]]) -> T:
+        self.requests += 1
+        start = monotonic()
+
+        primary = ensure_future(request())
+        tasks = {primary}
+
+        try:
+            delay = self.delay()
+            if delay is not None:
+                done, _ = await wait(tasks, timeout=delay)
+
+                if not done and self.can_hedge():
+                    self.hedges += 1
+                    tasks.add(ensure_future(request()))
+
+            while True:
+                done, _ = await wait(tasks, return_when=FIRST_COMPLETED)
+
+                if primary in done:
+                    self.primary_latencies.append(monotonic() - start)
+
+                winner = next((task for task in done if task.exception() is None), None)
+                if winner is not None or done == tasks:
+                    break
+
+                # one of the pair failed, keep waiting on the other
+                tasks -= done
+
+            if winner is None:
+                return await next(iter(done))
+
+            if winner is not primary:
+                self.hedge_wins += 1
+                if not primary.done():
+                    self.primary_latencies.append(monotonic() - start)
+
+            self.latencies.append(monotonic() - start)
+
+            return winner.result()
+        finally:
+            for task in tasks:
+                if not task.done():
+                    task.cancel()
+
+    def stats(self) -> dict:
+        return {
+            "hedge rate": round(self.hedges / self.requests, 3) if self.requests else 0,
+            "hedge wins": self.hedge_wins,
+            "p95 latency": percentile(self.latencies, 0.95),
+            "p99 latency": percentile(self.latencies, 0.99),
+            "p95 latency without hedging": percentile(self.primary_latencies, 0.95),
+            "p99 latency without hedging": percentile(self.primary_latencies, 0.99),
+        }
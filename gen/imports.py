@@ -0,0 +1,71 @@
+import re
+
+from gen.compression import strip_comments
+from gen.parsers.common import ParsedItem
+from gen.parsers.rust import imported_name
+
+IDENTIFIER = re.compile(r"[A-Za-z_]\w*")
+
+# items that can be imported from another module of the crate
+DECLARED = ("struct", "enum", "trait", "type", "function", "const", "static", "macro")
+
+LOCAL_ROOTS = ("crate", "super", "self")
+
+
+class ImportIndex:
+    """
+    The imports of each file and the package every item of the crate is
+    converted into, built once for the whole directory. For each item only the
+    imports it actually uses are passed to the prompt, and imports of the crate's
+    own items name the package they end up in.
+    """
+
+    def __init__(self) -> None:
+        self.symbols = {}
+        self.files = {}
+        self.items = 0
+        self.imports_sent = 0
+        self.imports_skipped = 0
+
+    def add_symbols(self, code_objects: list[ParsedItem], package: str):
+        for item in code_objects:
+            if item.type in DECLARED and not item.receiver:
+                self.symbols.setdefault(item.name, package)
+
+    def file_imports(self, filename: str, imports: list[str]) -> dict[str, str]:
+        if filename not in self.files:
+            self.files[filename] = {imported_name(path): path for path in imports}
+
+        return self.files[filename]
+
+    def relevant(self, filename: str, imports: list[str], source: str) -> list[str]:
+        """
+        The imports of filename used by source, globs are always included.
+        """
+        imports = self.file_imports(filename, imports)
+        names = set(IDENTIFIER.findall(strip_comments(source)))
+
+        libs = [
+            self.describe(name, path)
+            for name, path in imports.items()
+            if name in names or name == "*"
+        ]
+
+        self.items += 1
+        self.imports_sent += len(libs)
+        self.imports_skipped += len(imports) - len(libs)
+
+        return libs
+
+    def describe(self, name: str, path: str) -> str:
+        package = self.symbols.get(name)
+        if package is None or path.split("::")[0] not in LOCAL_ROOTS:
+            return path
+
+        return f"{path} (converted in package {package})"
+
+    def stats(self) -> dict:
+        return {
+            "imports passed to prompts": self.imports_sent,
+            "imports left out as unused": self.imports_skipped,
+        }
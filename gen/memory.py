@@ -0,0 +1,276 @@
+from pathlib import Path
+import re
+from zlib import crc32
+
+try:
+    import numpy as np
+except ImportError:  # only needed when a translation memory is used
+    np = None
+
+from gen.fast_path import go_name
+
+PRIME = (1 << 61) - 1
+MAX_HASH = (1 << 32) - 1
+
+RUST_KEYWORDS = {
+    "as", "async", "await", "break", "const", "continue", "crate", "dyn", "else", "enum",
+    "extern", "false", "fn", "for", "if", "impl", "in", "let", "loop", "match", "mod",
+    "move", "mut", "pub", "ref", "return", "self", "Self", "static", "struct", "super",
+    "trait", "true", "type", "unsafe", "use", "where", "while", "Some", "None", "Ok",
+    "Err", "Option", "Result", "String", "Vec", "Box", "str", "bool", "char", "i8", "i16",
+    "i32", "i64", "isize", "u8", "u16", "u32", "u64", "usize", "f32", "f64",
+}
+
+TOKEN = re.compile(
+    r'(?P<comment>//[^\n]*|/\*.*?\*/)'
+    r'|(?P<literal>"(?:[^"\\]|\\.)*"|\'(?:[^\'\\]|\\.)\'|\d[\w.]*)'
+    r"|(?P<name>[A-Za-z_]\w*)"
+    r"|(?P<symbol>\S)",
+    re.S,
+)
+
+GO_BLOCK = re.compile(r"```(?:go|Go|golang)[^\n]*\n(.*?)```", re.S)
+RUST_BLOCK = re.compile(r"```rust[^\n]*\n(.*?)```", re.S)
+
+
+def tokenize(code: str) -> tuple[list[str], list[str]]:
+    """
+    Returns the raw tokens and their normalised form, where identifiers that are not
+    keywords or common std types become ID and literals LIT, so code that differs
+    only in names and values normalises to the same sequence.
+    """
+    raw, normalised = [], []
+
+    for match in TOKEN.finditer(code):
+        kind = match.lastgroup
+        if kind == "comment":
+            continue
+
+        token = match.group()
+        raw.append(token)
+
+        if kind == "literal":
+            normalised.append("LIT")
+        elif kind == "name" and token not in RUST_KEYWORDS:
+            normalised.append("ID")
+        else:
+            normalised.append(token)
+
+    return raw, normalised
+
+
+class MinHash:
+    """
+    MinHash signatures computed with NumPy over hashed k-token shingles, all
+    permutations applied in one vectorised step.
+    """
+
+    def __init__(self, num_perm: int = 128, shingle_size: int = 5, seed: int = 1) -> None:
+        if np is None:
+            raise ImportError("the translation memory needs numpy, install the memory extra")
+
+        generator = np.random.default_rng(seed)
+        self.a = generator.integers(1, MAX_HASH, num_perm, dtype=np.uint64)
+        self.b = generator.integers(0, MAX_HASH, num_perm, dtype=np.uint64)
+        self.shingle_size = shingle_size
+
+    def shingles(self, tokens: list[str]) -> "np.ndarray":
+        k = min(self.shingle_size, len(tokens)) or 1
+        hashes = {
+            crc32("\x1f".join(tokens[idx : idx + k]).encode())
+            for idx in range(max(len(tokens) - k + 1, 1))
+        }
+
+        return np.fromiter(hashes, dtype=np.uint64, count=len(hashes))
+
+    def signature(self, tokens: list[str]) -> "np.ndarray":
+        hashes = self.shingles(tokens)[:, None]
+        return ((hashes * self.a + self.b) % PRIME & MAX_HASH).min(axis=0)
+
+
+class TranslationMemory:
+    """
+    Previously converted Rust items and their Go translations, indexed with
+    MinHash/LSH so near duplicates can be found without comparing against every
+    entry. An item whose normalised tokens match an entry exactly is reused with
+    the names and literals swapped over. Close matches are offered as examples.
+    """
+
+    def __init__(
+        self,
+        num_perm: int = 128,
+        bands: int = 32,
+        example_threshold: float = 0.5,
+        max_examples: int = 2,
+    ) -> None:
+        if num_perm % bands:
+            raise ValueError("num_perm must be a multiple of bands")
+
+        self.minhash = MinHash(num_perm)
+        self.bands = bands
+        self.rows = num_perm // bands
+        self.example_threshold = example_threshold
+        self.max_examples = max_examples
+        self.entries = []
+        self.signatures = []
+        self.buckets = [{} for _ in range(bands)]
+        self.lookups = 0
+        self.reused = 0
+        self.examples = 0
+
+    def __len__(self) -> int:
+        return len(self.entries)
+
+    def band_keys(self, signature: "np.ndarray") -> list[bytes]:
+        return [signature[band * self.rows : (band + 1) * self.rows].tobytes() for band in range(self.bands)]
+
+    def add(self, source: str, target: str):
+        if not source.strip() or not target.strip():
+            return
+
+        raw, normalised = tokenize(source)
+        if not raw:
+            return
+
+        signature = self.minhash.signature(normalised)
+        idx = len(self.entries)
+
+        self.entries.append((source, target, raw, normalised))
+        self.signatures.append(signature)
+
+        for bucket, key in zip(self.buckets, self.band_keys(signature)):
+            bucket.setdefault(key, []).append(idx)
+
+    def similar(self, source: str) -> list[tuple[float, int]]:
+        _, normalised = tokenize(source)
+        if not normalised or not self.entries:
+            return []
+
+        signature = self.minhash.signature(normalised)
+
+        candidates = set()
+        for bucket, key in zip(self.buckets, self.band_keys(signature)):
+            candidates.update(bucket.get(key, ()))
+
+        if not candidates:
+            return []
+
+        ids = np.fromiter(candidates, dtype=np.int64, count=len(candidates))
+        scores = (np.stack([self.signatures[idx] for idx in ids]) == signature).mean(axis=1)
+
+        order = np.argsort(-scores, kind="stable")
+        return [(float(scores[pos]), int(ids[pos])) for pos in order]
+
+    def lookup(self, source: str) -> tuple[str | None, list[tuple[str, str]]]:
+        """
+        Returns Go code to reuse directly, or failing that up to max_examples
+        (rust, go) pairs close enough to guide the model.
+        """
+        self.lookups += 1
+        raw, normalised = tokenize(source)
+
+        examples = []
+        for score, idx in self.similar(source):
+            entry_source, target, entry_raw, entry_normalised = self.entries[idx]
+
+            if entry_normalised == normalised:
+                reused = rename(target, entry_raw, raw)
+                if reused is not None:
+                    self.reused += 1
+                    return reused, []
+
+            if score >= self.example_threshold and len(examples) < self.max_examples:
+                examples.append((entry_source, target))
+
+        if examples:
+            self.examples += 1
+
+        return None, examples
+
+    def learn(self, source: str, target: str):
+        """
+        Add a conversion that was accepted for assembly, target is the Go code
+        taken from the response rather than the raw reply.
+        """
+        self.add(source, target)
+
+    def load(self, directory: Path) -> int:
+        """
+        Add the pairs from the markdown logs written by OpenAIModel.log, or the
+        responses-* fixture folders which use the same format.
+        """
+        added = 0
+        for path in sorted(Path(directory).rglob("*.md")):
+            pair = read_log(path.read_text())
+            if pair is not None:
+                self.add(*pair)
+                added += 1
+
+        return added
+
+    def stats(self) -> dict:
+        return {
+            "translation memory entries": len(self.entries),
+            "translation memory lookups": self.lookups,
+            "translation memory reused": self.reused,
+            "translation memory used as examples": self.examples,
+            "translation memory hit rate": round((self.reused + self.examples) / self.lookups, 3)
+            if self.lookups
+            else None,
+        }
+
+
+def read_log(text: str) -> tuple[str, str] | None:
+    source = RUST_BLOCK.search(text)
+    if source is None:
+        return None
+
+    target = GO_BLOCK.search(text, source.end())
+    if target is None:
+        return None
+
+    return source.group(1), target.group(1)
+
+
+def rename(target: str, old_tokens: list[str], new_tokens: list[str]) -> str | None:
+    """
+    Carry the differences between two token-for-token identical Rust sources over
+    to the Go translation of the first, including the Go spellings of renamed
+    identifiers. Every name and literal, changed or not, must map one to one, so
+    `a + b` is not reused for `a + a`. Returns None if it does not, or if a
+    difference cannot be found in the translation to carry over.
+    """
+    mapping = {}
+    reverse = {}
+    changed = {}
+
+    for old, new in zip(old_tokens, new_tokens):
+        if not re.match(r"^[\w\"']", old):
+            continue
+
+        spellings = [(old, new)]
+        if re.match(r"^[A-Za-z_]\w*$", old):
+            spellings.extend((go_name(old, exported), go_name(new, exported)) for exported in (True, False))
+
+        for old_spelling, new_spelling in spellings:
+            if mapping.setdefault(old_spelling, new_spelling) != new_spelling:
+                return None
+            if reverse.setdefault(new_spelling, old_spelling) != old_spelling:
+                return None
+
+        if old == new:
+            continue
+
+        if not any(re.search(rf"(?<!\w){re.escape(spelling)}(?!\w)", target) for spelling, _ in spellings):
+            return None
+
+        changed.update((old_spelling, new_spelling) for old_spelling, new_spelling in spellings if old_spelling != new_spelling)
+
+    if not changed:
+        return target
+
+    pattern = re.compile(
+        "|".join(rf"(?<!\w){re.escape(old)}(?!\w)" for old in sorted(changed, key=len, reverse=True))
+    )
+
+    return pattern.sub(lambda match: changed[match.group()], target)
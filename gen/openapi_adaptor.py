@@ -4,18 +4,32 @@ from datetime import datetime
 from operator import attrgetter
 from os import getenv, makedirs
 from pathlib import Path
-from time import sleep
-
-from openai import AsyncOpenAI, BadRequestError
+from time import monotonic
+
+from openai import (
+    APIConnectionError,
+    APIStatusError,
+    APITimeoutError,
+    AsyncOpenAI,
+    RateLimitError,
+)
+
+from gen.concurrency import AdaptiveConcurrency
+from gen.hedging import HedgePolicy
+from gen.rate_limit import RateLimiter
+from gen.response_cache import ResponseCache
+from gen.retry import CircuitBreaker, RetryBudget, RetryPolicy
+from gen.singleflight import SingleFlight
+from gen.tokens import estimate_message_tokens, estimate_tokens
+from gen.transport import ClientSettings
 
 
 # MODEL = getenv("OPENAI_MODEL", "gpt-4-0125-preview")  # "gpt-4-1106-preview")
 MODEL = getenv("OPENAI_MODEL", "gpt-3.5-turbo-0125")
-ORG_ID = getenv("OPENAI_ORG_ID", "org-4Qf0MN6QYIyYR6nBrtIrGshi")
 LOG_DIR = Path(getenv("LOG_DIR", Path(__file__).parent.parent / "responses"))
 
-
-client = AsyncOpenAI(api_key=getenv("OPENAI_API_KEY"), organization=ORG_ID)
+# request params for a JSON object response, the prompt must ask for JSON as well
+JSON_OUTPUT = {"response_format": {"type": "json_object"}}
 
 
 class AIModel(ABC):
@@ -29,6 +43,9 @@ class AIModel(ABC):
     ):
         pass
 
+    def stats(self) -> dict:
+        return {}
+
 
 class Question(ABC):
     @abstractmethod
@@ -44,15 +61,78 @@ class Question(ABC):
         pass
 
 
+class CacheMode:
+    USE = "use"
+    REFRESH = "refresh"
+    BYPASS = "bypass"
+
+
 class OpenAIModel(AIModel):
-    def __init__(self, name: str, model: str = None, log_dir: str = None) -> None:
+    def __init__(
+        self,
+        name: str,
+        model: str = None,
+        log_dir: str = None,
+        cache: ResponseCache = None,
+        cache_mode: str = CacheMode.USE,
+        params: dict = None,
+        rate_limiter: RateLimiter = None,
+        concurrency: AdaptiveConcurrency = None,
+        retry_policy: RetryPolicy = None,
+        retry_budget: RetryBudget = None,
+        circuit_breaker: CircuitBreaker = None,
+        stream: bool = False,
+        stream_cutoff: str = None,
+        hedging: HedgePolicy = None,
+        settings: ClientSettings = None,
+        json_output: bool = False,
+    ) -> None:
         super().__init__()
         self.name = name
         self.model = model or MODEL
         self.log_dir = Path(log_dir or LOG_DIR)
+        self.cache = cache or ResponseCache()
+        self.cache_mode = cache_mode
+        self.params = {**(params or {}), **(JSON_OUTPUT if json_output else {})}
+        self.inflight = SingleFlight()
+        self.rate_limiter = rate_limiter or RateLimiter()
+        self.concurrency = concurrency or AdaptiveConcurrency()
+        self.retry_policy = retry_policy or RetryPolicy()
+        self.retry_budget = retry_budget or RetryBudget()
+        self.circuit_breaker = circuit_breaker or CircuitBreaker()
+        self.retries = 0
+        self.stream = stream or bool(stream_cutoff)
+        self.stream_cutoff = stream_cutoff
+        self.streams_cut = 0
+        self.hedging = hedging
+        self.settings = settings or ClientSettings()
+        self._client = None
+
+    @property
+    def client(self) -> AsyncOpenAI:
+        # built on first use so a model can be configured without credentials
+        if self._client is None:
+            self._client = self.settings.build()
+
+        return self._client
+
+    async def open(self) -> "OpenAIModel":
+        self.client
+        return self
+
+    async def close(self):
+        if self._client is not None:
+            await self._client.close()
+            self._client = None
+
+    async def __aenter__(self) -> "OpenAIModel":
+        return await self.open()
+
+    async def __aexit__(self, *exc_info):
+        await self.close()
 
     async def list_models(self, list_all=False):
-        response = await client.models.list()
+        response = await self.client.models.list()
         models = sorted(response.data, key=attrgetter("id"))
         for model in models:
             if list_all or "gpt" in model.id:
@@ -62,30 +142,161 @@ class OpenAIModel(AIModel):
         self,
         messages: [dict],
         question: Question = None,
-        trys: int = 3,
+        trys: int = None,
         print_output=False,
+        variant: int = 0,
     ) -> (str, Question):
-        while trys:
+        # variants are independent samples of the same prompt, each cached on its own
+        key = self.cache.key(self.model, messages, {**self.params, "variant": variant} if variant else self.params)
+
+        if self.cache_mode == CacheMode.USE:
+            results = await self.cache.get_async(key)
+            if results is not None:
+                if print_output:
+                    print(results)
+                return results, question
+
+        # identical requests already in flight share a single API call
+        results = await self.inflight.do(
+            key, lambda: self.complete(key, messages, trys, print_output, question)
+        )
+
+        self.log(question, results)
+
+        return results, question
+
+    async def complete(
+        self, key: str, messages: [dict], trys: int, print_output: bool, question: Question = None
+    ) -> str:
+        prompt_tokens = estimate_message_tokens(messages)
+        estimated_tokens = prompt_tokens + self.params.get(
+            "max_tokens", self.rate_limiter.expected_output_tokens
+        )
+
+        trys = trys or self.retry_policy.attempts
+        self.retry_budget.deposit()
+        attempt = 0
+
+        while True:
+            # hold new submissions while the provider looks to be down
+            await self.circuit_breaker.wait_ready()
+
+            async def send():
+                await self.rate_limiter.acquire(estimated_tokens)
+                return await self.create_completion(messages, question, print_output)
+
             try:
-                response = await client.chat.completions.create(
-                    model=MODEL,
-                    # response_format={ "type": "json_object" },
-                    messages=messages,
-                )
+                if self.hedging:
+                    results, usage = await self.hedging.run(send)
+                else:
+                    results, usage = await send()
+                self.circuit_breaker.record_success()
                 break
-            except BadRequestError as err:
-                print(err)
-                raise err
-
             except Exception as err:
                 print(err)
-                sleep(1)
 
-            trys -= 1
+                # bad requests, auth errors and bugs will fail the same way again
+                if not is_overloaded(err):
+                    self.circuit_breaker.release()
+                    raise
+
+                self.circuit_breaker.record_failure()
+
+                attempt += 1
+                if attempt >= trys or not self.retry_budget.withdraw():
+                    raise
+
+                self.retries += 1
+                await asyncio.sleep(self.retry_policy.delay(attempt, err))
+            except BaseException:
+                self.circuit_breaker.release()
+                raise
 
-        return self.extract_results(response, print_output, question)
+        self.rate_limiter.reconcile(
+            estimated_tokens, usage.total_tokens if usage else prompt_tokens + estimate_tokens(results)
+        )
 
-    def extract_results(self, response, print_output, question) -> (str, Question):
+        if self.cache_mode != CacheMode.BYPASS:
+            await self.cache.put_async(key, self.model, results)
+
+        return results
+
+    async def create_completion(self, messages: [dict], question: Question, print_output: bool):
+        """
+        Send one request, holding a slot in the adaptive concurrency window while it
+        runs, and return the content and reported usage.
+        """
+        await self.concurrency.acquire()
+        start = monotonic()
+
+        try:
+            if self.stream:
+                results, usage = await self.stream_completion(messages, question)
+                if print_output:
+                    print(results)
+            else:
+                response = await self.client.chat.completions.create(
+                    model=self.model,
+                    messages=messages,
+                    **self.params,
+                )
+                results, usage = self.extract_results(response, print_output), getattr(response, "usage", None)
+        except BaseException as err:
+            # cancelled hedges release their slot too
+            await self.concurrency.release(overloaded=is_overloaded(err))
+            raise
+
+        await self.concurrency.release(latency=monotonic() - start)
+
+        return results, usage
+
+    async def stream_completion(self, messages: [dict], question: Question):
+        """
+        Stream the response, looking at each code block in the stream_cutoff language
+        as it closes. The stream is closed once a block declares the item being
+        converted, so the explanation that usually follows is never generated.
+        """
+        from gen.parsers import BLOCK_PARSERS
+        from gen.parsers.common import CodeBlockExtractor, run_parser
+
+        stream = await self.client.chat.completions.create(
+            model=self.model,
+            messages=messages,
+            stream=True,
+            **self.params,
+        )
+
+        parser = BLOCK_PARSERS.get(self.stream_cutoff)
+        extractor = CodeBlockExtractor(self.stream_cutoff) if parser else None
+        results = []
+        usage = None
+
+        try:
+            async for chunk in stream:
+                usage = getattr(chunk, "usage", None) or usage
+                if not chunk.choices or not chunk.choices[0].delta.content:
+                    continue
+
+                content = chunk.choices[0].delta.content
+                results.append(content)
+
+                if extractor is None:
+                    continue
+
+                cut = False
+                for block in extractor.feed(content):
+                    if not cut and await run_parser(is_wanted_block, block, question, parser):
+                        cut = True
+
+                if cut:
+                    self.streams_cut += 1
+                    break
+        finally:
+            await stream.close()
+
+        return "".join(results), usage
+
+    def extract_results(self, response, print_output) -> str:
         results = []
         for choice in response.choices or []:
             try:
@@ -98,11 +309,20 @@ class OpenAIModel(AIModel):
                 print(choice)
                 raise err
 
-        results = "\n".join(results)
-
-        self.log(question, results)
-
-        return results, question
+        return "\n".join(results)
+
+    def stats(self) -> dict:
+        return {
+            **self.cache.stats(),
+            **self.inflight.stats(),
+            **self.rate_limiter.stats(),
+            **self.concurrency.stats(),
+            "retries": self.retries,
+            "retries refused by budget": self.retry_budget.exhausted,
+            "circuit breaker opened": self.circuit_breaker.opened,
+            "streams cut off early": self.streams_cut,
+            **(self.hedging.stats() if self.hedging else {}),
+        }
 
     def log(self, question: Question, message: str):
         now = datetime.now()
@@ -119,6 +339,29 @@ class OpenAIModel(AIModel):
             f.write(message)
 
 
+def is_wanted_block(code_block: str, question: Question, parser) -> bool:
+    """
+    True if code_block declares the item question asks for, matched by name the
+    way parser matches items when the code is assembled.
+    """
+    # a struct with its impls, or a whole file, can be answered over several
+    # blocks, so no single block is enough to stop on
+    if question is None or getattr(question, "type_name", None) in ("impl_group", "file"):
+        return False
+
+    return parser.declares(code_block, question)
+
+
+def is_overloaded(err: Exception) -> bool:
+    """
+    True for errors that mean the provider wants less traffic.
+    """
+    if isinstance(err, (RateLimitError, APITimeoutError, APIConnectionError)):
+        return True
+
+    return isinstance(err, APIStatusError) and err.status_code >= 500
+
+
 def system_message(content: str) -> dict:
     return {"role": "system", "content": content}
 
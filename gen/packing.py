@@ -0,0 +1,169 @@
+import json
+import re
+
+from gen.openapi_adaptor import Question, ok, user_message
+from gen.tokens import estimate_tokens
+
+MARKER = re.compile(r"^\s*=== ITEM (\d+)\b[^\n]*===\s*$", re.M)
+
+# starts the message listing the imports an item uses, it is followed by an Ok
+LIBRARIES = "Please use this following libraries if applicable: "
+
+
+class PackedQuestion(Question):
+    """
+    The questions answered by one packed request. Routing sees the largest item
+    so the pack goes to a tier able to handle all of it.
+    """
+
+    def __init__(self, questions: list[Question]) -> None:
+        self.questions = questions
+
+    def get_text(self) -> str:
+        return "\n".join(question.get_text() for question in self.questions)
+
+    def get_name(self) -> str:
+        return "+".join(question.get_name() for question in self.questions)
+
+    def get_filename(self) -> str:
+        return self.questions[0].get_filename()
+
+    @property
+    def item(self):
+        items = [getattr(question, "item", None) for question in self.questions]
+        items = [item for item in items if item is not None]
+        return max(items, key=lambda item: len(item.source), default=None)
+
+    def __repr__(self) -> str:
+        return self.get_name()
+
+
+class PromptPacker:
+    """
+    Groups small items that share the same instructions into one request with a
+    numbered section per item, and splits the answer back into one response per
+    item. Items whose section is missing or has no code block are returned as None
+    so the caller can send them on their own. The imports each item uses are not
+    part of the instructions compared, a pack lists the imports of all its items.
+    """
+
+    def __init__(self, max_items: int = 8, max_item_tokens: int = 200, max_tokens: int = 1500) -> None:
+        self.max_items = max_items
+        self.max_item_tokens = max_item_tokens
+        self.max_tokens = max_tokens
+        self.packs = 0
+        self.packed_items = 0
+        self.split_failures = 0
+
+    def pack(
+        self, requests: list[tuple[list[dict], Question]], source_name: str, target_name: str
+    ) -> list[tuple[list[int], tuple[list[dict], Question]]]:
+        """
+        Returns the index of every request covered by each new request. Requests too
+        big to pack are passed through unchanged.
+        """
+        packed = []
+        groups = {}
+
+        for idx, (messages, question) in enumerate(requests):
+            tokens = estimate_tokens(messages[-1]["content"])
+            if tokens > self.max_item_tokens:
+                packed.append(([idx], (messages, question)))
+                continue
+
+            before, _, after = split_context(messages)
+            key = json.dumps([before, after], sort_keys=True)
+            group = groups.setdefault(key, [])
+
+            if (
+                not group
+                or len(group[-1]) >= self.max_items
+                or sum(size for _, size in group[-1]) + tokens > self.max_tokens
+            ):
+                group.append([])
+
+            group[-1].append((idx, tokens))
+
+        for group in groups.values():
+            for members in group:
+                indices = [idx for idx, _ in members]
+                if len(indices) == 1:
+                    packed.append((indices, requests[indices[0]]))
+                    continue
+
+                self.packs += 1
+                self.packed_items += len(indices)
+                packed.append(
+                    (indices, self.make_request([requests[idx] for idx in indices], source_name, target_name))
+                )
+
+        return packed
+
+    def make_request(
+        self, requests: list[tuple[list[dict], Question]], source_name: str, target_name: str
+    ) -> tuple[list[dict], Question]:
+        sections = [
+            f"The following {len(requests)} items are independent, convert each one separately. "
+            f"Start the answer for each item with its marker line, exactly as given, followed by "
+            f"the converted code in a ```{target_name} block."
+        ]
+
+        for number, (messages, question) in enumerate(requests, 1):
+            sections.append(
+                f"=== ITEM {number}: {question.get_name()} ===\n```{source_name}\n{messages[-1]['content']}\n```"
+            )
+
+        libs = {}
+        for messages, _ in requests:
+            libs.update(dict.fromkeys(split_context(messages)[1]))
+
+        before, _, after = split_context(requests[0][0])
+        messages = with_context(before, list(libs), after) + [user_message("\n\n".join(sections))]
+
+        return messages, PackedQuestion([question for _, question in requests])
+
+    def split(self, response: str, count: int, target_name: str) -> list[str | None]:
+        sections = {}
+        matches = list(MARKER.finditer(response))
+
+        for match, following in zip(matches, matches[1:] + [None]):
+            end = following.start() if following else len(response)
+            sections.setdefault(int(match.group(1)), response[match.end() : end])
+
+        results = []
+        for number in range(1, count + 1):
+            section = sections.get(number)
+            if section is None or f"```{target_name}" not in section:
+                self.split_failures += 1
+                section = None
+            results.append(section)
+
+        return results
+
+    def stats(self) -> dict:
+        return {
+            "packed requests": self.packs,
+            "requests saved by packing": self.packed_items - self.packs,
+            "packed items sent again on their own": self.split_failures,
+        }
+
+
+def split_context(messages: list[dict]) -> tuple[list[dict], list[str], list[dict]]:
+    """
+    The messages before the code split around the import context, the messages
+    before it, the imports it lists and the messages after it.
+    """
+    preamble = messages[:-1]
+
+    for idx, message in enumerate(preamble):
+        content = message.get("content") or ""
+        if message["role"] == "user" and content.startswith(LIBRARIES):
+            libs = [lib for lib in content[len(LIBRARIES) :].split(", ") if lib]
+            return preamble[:idx], libs, preamble[idx + 2 :]
+
+    return preamble, [], []
+
+
+def with_context(before: list[dict], libs: list[str], after: list[dict]) -> list[dict]:
+    context = [user_message(LIBRARIES + ", ".join(libs)), ok()] if libs else []
+    return before + context + after
@@ -2,3 +2,6 @@ from .common import Parser, ParsedItem
 from .go import GoParser
 from .python import extract_implementation
 from .rust import RustParser
+
+# parsers that can tell whether a streamed code block, by its markdown name, answers a question
+BLOCK_PARSERS = {"go": GoParser}
@@ -0,0 +1,220 @@
+from collections import OrderedDict
+from functools import wraps
+from hashlib import sha256
+import json
+from os import getenv, replace, utime
+from pathlib import Path
+from threading import Lock
+from typing import Callable
+from uuid import uuid4
+
+from .common import ParsedItem
+
+PARSE_CACHE_DIR = Path(getenv("PARSE_CACHE_DIR", Path.home() / ".cache" / "code_generator" / "parse"))
+PARSE_CACHE_MAX_BYTES = int(getenv("PARSE_CACHE_MAX_BYTES", 256 * 1024 * 1024))
+PARSE_CACHE_ENABLED = getenv("PARSE_CACHE", "1") not in ("0", "off", "false")
+
+# bumped when the items built from the helpers' output change, so older entries are not used
+CACHE_FORMAT = "2"
+
+
+class ParseCache:
+    """
+    Parse results keyed by language, helper binary version and a hash of the source.
+    Recent results are kept in an in-process LRU, everything is also written to disk
+    where the least recently used files are evicted once the store exceeds max_bytes.
+    """
+
+    def __init__(
+        self,
+        directory: Path = None,
+        max_entries: int = 1024,
+        max_bytes: int = PARSE_CACHE_MAX_BYTES,
+        enabled: bool = True,
+    ) -> None:
+        self.directory = Path(directory) if directory else None
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.enabled = enabled
+        self.memory = OrderedDict()
+        self.disk_bytes = None
+        self.lock = Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def key(self, language: str, helper: Path, code: str) -> str:
+        digest = sha256()
+        for part in (language, CACHE_FORMAT, helper_version(helper), code):
+            digest.update(part.encode())
+            digest.update(b"\0")
+
+        return digest.hexdigest()
+
+    def get(self, key: str) -> list[ParsedItem] | None:
+        if not self.enabled:
+            return None
+
+        with self.lock:
+            items = self.memory.get(key)
+            if items is not None:
+                self.memory.move_to_end(key)
+                self.hits += 1
+                return list(items)
+
+        items = self.read(key)
+
+        with self.lock:
+            if items is None:
+                self.misses += 1
+                return None
+
+            self.hits += 1
+            self.remember(key, items)
+
+        return list(items)
+
+    def put(self, key: str, items: list[ParsedItem]):
+        if not self.enabled:
+            return
+
+        with self.lock:
+            self.remember(key, items)
+
+        self.write(key, items)
+
+    def remember(self, key: str, items: list[ParsedItem]):
+        self.memory[key] = tuple(items)
+        self.memory.move_to_end(key)
+
+        while len(self.memory) > self.max_entries:
+            self.memory.popitem(last=False)
+
+    def path(self, key: str) -> Path:
+        return self.directory / key[:2] / f"{key}.json"
+
+    def read(self, key: str) -> list[ParsedItem] | None:
+        if self.directory is None:
+            return None
+
+        path = self.path(key)
+        try:
+            data = json.loads(path.read_text())
+            utime(path)
+        except (OSError, ValueError):
+            return None
+
+        return [ParsedItem(**item) for item in data]
+
+    def write(self, key: str, items: list[ParsedItem]):
+        if self.directory is None:
+            return
+
+        path = self.path(key)
+        data = json.dumps([item.to_dict() for item in items])
+
+        try:
+            path.parent.mkdir(parents=True, exist_ok=True)
+            tmp_path = path.with_name(f"{key}.{uuid4().hex}.tmp")
+            tmp_path.write_text(data)
+            replace(tmp_path, path)
+        except OSError as err:
+            print("ParseCache Error:", err)
+            return
+
+        with self.lock:
+            if self.disk_bytes is None:
+                self.disk_bytes = sum(f.stat().st_size for f in self.directory.glob("*/*.json"))
+            else:
+                self.disk_bytes += len(data)
+
+            if self.disk_bytes > self.max_bytes:
+                self.evict()
+
+    def stats(self) -> dict:
+        return {"parse cache hits": self.hits, "parse cache misses": self.misses}
+
+    def evict(self):
+        """
+        Delete the least recently used files until the store is back under 3/4 of max_bytes.
+        """
+        files = []
+        for f in self.directory.glob("*/*.json"):
+            try:
+                stat = f.stat()
+            except OSError:
+                continue
+            files.append((stat.st_mtime, stat.st_size, f))
+
+        files.sort()
+        total = sum(size for _, size, _ in files)
+
+        for _, size, f in files:
+            if total <= self.max_bytes * 3 // 4:
+                break
+
+            f.unlink(missing_ok=True)
+            total -= size
+
+        self.disk_bytes = total
+
+
+def helper_version(helper: Path) -> str:
+    try:
+        stat = Path(helper).stat()
+    except OSError:
+        return "missing"
+
+    return f"{stat.st_size}:{stat.st_mtime_ns}"
+
+
+parse_cache = ParseCache(PARSE_CACHE_DIR, enabled=PARSE_CACHE_ENABLED)
+
+
+def cached_parse_many(language: str, helper: Path) -> Callable:
+    """
+    Decorates a parse_many implementation so only sources missing from the cache are parsed.
+    """
+
+    def decorator(parse_many):
+        @wraps(parse_many)
+        def wrapper(cls, codes: list[str]) -> list[list[ParsedItem]]:
+            keys = [parse_cache.key(language, helper, code) for code in codes]
+            results = [parse_cache.get(key) for key in keys]
+
+            missing = [idx for idx, items in enumerate(results) if items is None]
+            if missing:
+                parsed = parse_many(cls, [codes[idx] for idx in missing])
+
+                for idx, items in zip(missing, parsed):
+                    results[idx] = items
+                    if items is not None:
+                        parse_cache.put(keys[idx], items)
+
+            return results
+
+        return wrapper
+
+    return decorator
+
+
+def cached_parse(language: str, helper: Path) -> Callable:
+    """
+    Decorates a single source parse implementation with the parse cache.
+    """
+
+    def decorator(parse):
+        @wraps(parse)
+        def wrapper(cls, code: str) -> list[ParsedItem]:
+            key = parse_cache.key(language, helper, code)
+
+            items = parse_cache.get(key)
+            if items is None:
+                items = parse(cls, code)
+                if items is not None:
+                    parse_cache.put(key, items)
+
+            return items
+
+        return wrapper
+
+    return decorator
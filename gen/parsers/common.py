@@ -1,21 +1,137 @@
 from abc import ABC, abstractmethod
-from dataclasses import dataclass
-from typing import Iterable
+from asyncio import get_running_loop
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from mmap import ACCESS_READ, mmap
+from os import fstat, getenv
+from typing import Callable, Iterable
 
 from gen.openapi_adaptor import Question
 
+from .pool import default_pool_size
+
+PARSER_CONCURRENCY = int(getenv("PARSER_CONCURRENCY", default_pool_size()))
+
+# parsing blocks on helper processes, so it is kept off the event loop in a
+# bounded set of threads, which also caps how many parses run at once
+_parser_executor = ThreadPoolExecutor(max_workers=PARSER_CONCURRENCY, thread_name_prefix="parser")
+
+
+async def run_parser(func: Callable, *args):
+    return await get_running_loop().run_in_executor(_parser_executor, partial(func, *args))
+
+
+class SourceBuffer:
+    """
+    The text items were parsed from, items keep byte offsets into it and only
+    decode their source when asked. Files are memory mapped rather than read.
+    """
+
+    __slots__ = ("data",)
+
+    def __init__(self, data: bytes | mmap) -> None:
+        self.data = data
+
+    @classmethod
+    def from_text(cls, text: str) -> "SourceBuffer":
+        return cls(text.encode())
+
+    @classmethod
+    def from_file(cls, file_path: str) -> "SourceBuffer":
+        with open(file_path, "rb") as f:
+            if fstat(f.fileno()).st_size == 0:
+                return cls(b"")
+
+            return cls(mmap(f.fileno(), 0, access=ACCESS_READ))
+
+    def slice(self, start: int, end: int) -> str:
+        return self.data[start:end].decode()
+
 
-@dataclass(frozen=True)
 class ParsedItem:
-    name: str
-    type: str
-    source: str
-    receiver: str | None = None
+    """
+    A declaration found by a parser. The source is either held as a string or,
+    for items straight from a helper, as a (start, end) span into a SourceBuffer
+    that is sliced each time source is read. prefix is literal text placed in
+    front of the span, go_parser uses it for keywords outside the declaration.
+    """
+
+    __slots__ = ("name", "type", "receiver", "_source", "_buffer", "_start", "_end", "_prefix")
+
+    def __init__(
+        self,
+        name: str,
+        type: str,
+        source: str = None,
+        receiver: str | None = None,
+        *,
+        buffer: SourceBuffer = None,
+        span: tuple[int, int] = (0, 0),
+        prefix: str = "",
+    ) -> None:
+        set_attr = super().__setattr__
+        set_attr("name", name)
+        set_attr("type", type)
+        set_attr("receiver", receiver)
+        set_attr("_source", source)
+        set_attr("_buffer", buffer)
+        set_attr("_start", span[0])
+        set_attr("_end", span[1])
+        set_attr("_prefix", prefix)
+
+    @classmethod
+    def from_row(cls, buffer: SourceBuffer, row: list) -> "ParsedItem":
+        """
+        Build an item from a helper's compact [name, type, start, end, receiver, prefix] row.
+        """
+        name, type, start, end, receiver, prefix = row
+        return cls(name, type, receiver=receiver or None, buffer=buffer, span=(start, end), prefix=prefix)
+
+    @property
+    def source(self) -> str:
+        if self._source is not None:
+            return self._source
+
+        if self._buffer is None:
+            return self._prefix
+
+        return self._prefix + self._buffer.slice(self._start, self._end)
 
     @property
     def key(self) -> str:
         return "{}||{}||".format(self.name, self.type, self.receiver)
 
+    def to_dict(self) -> dict:
+        return {"name": self.name, "type": self.type, "source": self.source, "receiver": self.receiver}
+
+    def __setattr__(self, name, value):
+        raise AttributeError(f"cannot assign to field '{name}'")
+
+    def __eq__(self, other) -> bool:
+        if not isinstance(other, ParsedItem):
+            return NotImplemented
+
+        return self.to_dict() == other.to_dict()
+
+    def __hash__(self) -> int:
+        return hash((self.name, self.type, self.receiver, self.source))
+
+    def __repr__(self) -> str:
+        return f"ParsedItem(name={self.name!r}, type={self.type!r}, receiver={self.receiver!r})"
+
+
+class ConvertedCode(str):
+    """
+    Target code produced without a model, or read from a structured response.
+    Parsers assemble it as is rather than extracting and validating a code block
+    from a response.
+    """
+
+    def __new__(cls, code: str, imports: Iterable[str] = ()) -> "ConvertedCode":
+        converted = super().__new__(cls, code)
+        converted.imports = tuple(imports)
+        return converted
+
 
 class Parser(ABC):
     @classmethod
@@ -23,6 +139,18 @@ class Parser(ABC):
     def parse(cls, code: str) -> list[ParsedItem]:
         pass
 
+    @classmethod
+    def parse_many(cls, codes: list[str]) -> list[list[ParsedItem]]:
+        return [cls.parse(code) for code in codes]
+
+    @classmethod
+    async def parse_async(cls, code: str) -> list[ParsedItem]:
+        return await run_parser(cls.parse, code)
+
+    @classmethod
+    async def parse_many_async(cls, codes: list[str]) -> list[list[ParsedItem]]:
+        return await run_parser(cls.parse_many, codes)
+
     @classmethod
     @abstractmethod
     def extract_source_and_tests(cls, source: str) -> tuple[str, str]:
@@ -40,9 +168,22 @@ class Parser(ABC):
     ) -> str:
         pass
 
+    @classmethod
+    def join_code_blocks(cls, code_blocks: list[str]) -> str:
+        """
+        Join code blocks converted from consecutive fragments of one item.
+        """
+        return "\n".join(code_blocks)
+
+    @classmethod
+    async def assemble_new_code_async(
+        cls, package_name: str, responses: Iterable[tuple[str, Question]]
+    ) -> str:
+        return await run_parser(cls.assemble_new_code, package_name, responses)
+
     @classmethod
     @abstractmethod
-    def enumerate_code(cls, code: list[ParsedItem]) -> list[str]:
+    def enumerate_code(cls, code: list[ParsedItem], granularity: str = "method", max_tokens: int = None) -> list[str]:
         pass
 
 
@@ -71,4 +212,60 @@ def extract_code_blocks(new_source: str, markdown_name: str) -> Iterable[str]:
         code_block = code_block[end_pos + 3: ]
 
 
+class CodeBlockExtractor:
+    """
+    An incremental extract_code_blocks for streamed responses, feed it chunks as
+    they arrive and it returns each code block as soon as its closing fence is seen.
+    """
+
+    def __init__(self, markdown_name: str) -> None:
+        self.start_marker = f"```{markdown_name}"
+        self.buffer = ""
+        self.in_block = False
+        self.scanned = 0
+
+    def feed(self, chunk: str) -> list[str]:
+        self.buffer += chunk
+        completed = []
+
+        while True:
+            if not self.in_block:
+                start_pos = self.buffer.find(self.start_marker)
+                if start_pos == -1:
+                    # keep enough to spot a marker split across chunks
+                    self.buffer = self.buffer[-len(self.start_marker) :]
+                    break
+
+                line_end = self.buffer.find("\n", start_pos)
+                if line_end == -1:
+                    self.buffer = self.buffer[start_pos:]
+                    break
+
+                self.buffer = self.buffer[line_end + 1 :]
+                self.in_block = True
+                self.scanned = 0
+
+            # only rescan the tail in case a fence was split across chunks
+            end_pos = self.buffer.find("```", max(0, self.scanned - 2))
+            if end_pos == -1:
+                self.scanned = len(self.buffer)
+                break
+
+            completed.append(self.buffer[:end_pos])
+            self.buffer = self.buffer[end_pos + 3 :]
+            self.in_block = False
+
+        return completed
+
+    def close(self) -> list[str]:
+        """
+        Flush an unterminated block left by a truncated response.
+        """
+        if not self.in_block:
+            return []
+
+        block, self.buffer, self.in_block = self.buffer, "", False
+        return [block]
+
+
 TAB = "    "
@@ -1,39 +1,66 @@
 from functools import partial
 from pathlib import Path
-import subprocess
 import json
-from tempfile import NamedTemporaryFile
+import re
+from threading import Lock
 from typing import Iterable, Set
 
 from gen.openapi_adaptor import Question
 
-from .common import TAB, Parser, ParsedItem, extract_code_block, extract_code_blocks
+from .cache import cached_parse
+from .common import (
+    TAB,
+    ConvertedCode,
+    Parser,
+    ParsedItem,
+    SourceBuffer,
+    extract_code_block,
+    extract_code_blocks,
+)
+from .pool import HelperError, HelperPool
 
 GO_PARSER = Path(__file__).parent.parent.parent / "bin" / "go_parser"
 
+PACKAGE = re.compile(r"^package\s+\w+\s*$", re.M)
+IMPORT_GROUP = re.compile(r"^import\s*(\((?:.|\n)*?\)|(?:\w+\s+)?\"[^\"]*\")\s*$", re.M)
+IMPORT_PATH = re.compile(r'"([^"]+)"')
+DECLARATION = re.compile(r"^(?:func\s+(?:\([^)]*\)\s*)?|type\s+|const\s+|var\s+)(\w+)")
+
 
 class GoParser(Parser):
+    _pool: HelperPool = None
+    _pool_lock = Lock()
+
     @classmethod
+    @cached_parse("go", GO_PARSER)
     def parse(cls, code: str) -> list[ParsedItem]:
+        if "package" not in code:
+            code = f"package main\n\n{code}"
 
-        with NamedTemporaryFile("w") as f:
-            if "package" not in code:
-                code = f"package main\n\n{code}"
+        buffer = SourceBuffer.from_text(code)
 
-            f.write(code)
-            f.flush()
+        try:
+            output = cls.pool().request(buffer.data)
+        except HelperError as err:
+            print("GoParser Error:", err)
+            return None
 
-            # Call the Go executable
-            result = subprocess.run([GO_PARSER, f.name], capture_output=True, text=True)
+        json_result = json.loads(output)
 
-            if result.returncode != 0:
-                print("GoParser Error:", result.stdout)
-                return None
+        if isinstance(json_result, dict):
+            print("GoParser Error:", json_result.get("error"))
+            return None
 
-            # Parse the JSON output
-            json_result = json.loads(result.stdout)
+        return [ParsedItem.from_row(buffer, row) for row in json_result]
 
-            return [ParsedItem(**item) for item in json_result]
+    @classmethod
+    def pool(cls) -> HelperPool:
+        if cls._pool is None:
+            with cls._pool_lock:
+                if cls._pool is None:
+                    cls._pool = HelperPool([str(GO_PARSER), "-server", "-spans"])
+
+        return cls._pool
 
     @classmethod
     def extract_source_and_tests(cls, source: str) -> tuple[str, str]:
@@ -48,6 +75,11 @@ class GoParser(Parser):
         already_added = set()
 
         for response, question in responses:
+            if isinstance(response, ConvertedCode):
+                new_code.append(str(response))
+                imports.update(response.imports)
+                continue
+
             found = False
             code_blocks = []
 
@@ -58,6 +90,11 @@ class GoParser(Parser):
                     continue
 
                 found = True
+
+                docs = getattr(question, "docs", None)
+                if docs:
+                    _code = cls.attach_docs(_code, docs)
+
                 new_code.append(_code)
 
                 if _imports:
@@ -101,7 +138,7 @@ class GoParser(Parser):
                 if item.key in already_added:
                     continue
 
-                if _match_name(item.name):
+                if _match_name(item.name) or cls.in_group(item, question, _match_name):
                     code_item.append(item.source)
                     already_added.add(item.key)
 
@@ -135,6 +172,47 @@ class GoParser(Parser):
 
         return None, None
 
+    @classmethod
+    def in_group(cls, item: ParsedItem, question: Question, match_name) -> bool:
+        """
+        True if item is part of the answer to a grouped question, every declaration
+        for a whole file and the methods of the struct for an impl group.
+        """
+        if question.type_name == "file":
+            return item.name not in ("import", "main")
+
+        return question.type_name == "impl_group" and bool(item.receiver) and match_name(item.receiver)
+
+    @classmethod
+    def attach_docs(cls, code: str, docs: dict[str, list[str]]) -> str:
+        """
+        Put doc comments kept aside by the prompt compressor back above the
+        declarations with the same name, ignoring case and underscores. Declarations
+        the model already commented are left alone.
+        """
+        docs = {name.replace("_", "").lower(): lines for name, lines in docs.items()}
+        lines = []
+
+        for line in code.split("\n"):
+            declaration = DECLARATION.match(line)
+            if declaration and not (lines and lines[-1].lstrip().startswith("//")):
+                lines.extend(docs.get(declaration.group(1).replace("_", "").lower(), []))
+
+            lines.append(line)
+
+        return "\n".join(lines)
+
+    @classmethod
+    def declares(cls, code_block: str, question: Question) -> bool:
+        """
+        True if code_block has a declaration get_code_and_imports would match by
+        name for question.
+        """
+        name = question.get_name()
+        items = cls.parse(code_block) or []
+
+        return any(cls.match_name(name, name.lower(), item.name) for item in items)
+
     @classmethod
     def match_name(cls, name, lname, item_name):
         if not item_name:
@@ -177,6 +255,24 @@ class GoParser(Parser):
 
         return "\n".join(code)
 
+    @classmethod
+    def join_code_blocks(cls, code_blocks: list[str]) -> str:
+        """
+        Fragments each come back as a small file, keep one package clause and move
+        every import to the top so the joined code parses.
+        """
+        imports = set()
+        bodies = []
+
+        for code_block in code_blocks:
+            for group in IMPORT_GROUP.findall(code_block):
+                imports.update(IMPORT_PATH.findall(group))
+
+            code_block = IMPORT_GROUP.sub("", code_block)
+            bodies.append(PACKAGE.sub("", code_block).strip("\n"))
+
+        return "\n".join(["package main", "", cls.make_imports(imports), *bodies]) + "\n"
+
     @classmethod
     def make_imports(cls, imports):
         _imports = "\n".join([f'{TAB}"{i}"' for i in sorted(imports)])
@@ -0,0 +1,213 @@
+import atexit
+from os import cpu_count, getenv, read
+from queue import Empty, LifoQueue
+from select import select
+import subprocess
+from threading import Lock
+from time import monotonic
+from typing import BinaryIO
+
+# seconds a helper has to answer a request before it is killed
+HELPER_TIMEOUT = float(getenv("HELPER_TIMEOUT", 30))
+
+
+class HelperError(Exception):
+    pass
+
+
+class HelperTimeout(HelperError):
+    pass
+
+
+def write_frame(stream: BinaryIO, payload: bytes):
+    stream.write(b"%d\n" % len(payload))
+    stream.write(payload)
+    stream.flush()
+
+
+def read_frame(stream: BinaryIO) -> bytes:
+    header = stream.readline()
+    if not header:
+        raise HelperError("helper closed its output")
+
+    try:
+        size = int(header)
+    except ValueError:
+        raise HelperError(f"invalid frame header {header!r}")
+
+    payload = stream.read(size)
+    if len(payload) != size:
+        raise HelperError("helper closed its output mid frame")
+
+    return payload
+
+
+class DeadlineReader:
+    """
+    Reads a helper's output, raising HelperTimeout when nothing arrives before the deadline.
+    """
+
+    def __init__(self, stream: BinaryIO) -> None:
+        self.fd = stream.fileno()
+        self.buffer = bytearray()
+        self.deadline = None
+
+    def fill(self) -> bool:
+        remaining = None if self.deadline is None else self.deadline - monotonic()
+        if remaining is not None and (remaining <= 0 or not select([self.fd], [], [], remaining)[0]):
+            raise HelperTimeout("helper did not answer in time")
+
+        chunk = read(self.fd, 65536)
+        self.buffer += chunk
+
+        return bool(chunk)
+
+    def readline(self) -> bytes:
+        while b"\n" not in self.buffer and self.fill():
+            pass
+
+        end = self.buffer.find(b"\n") + 1 or len(self.buffer)
+        return self.take(end)
+
+    def read(self, size: int) -> bytes:
+        while len(self.buffer) < size and self.fill():
+            pass
+
+        return self.take(size)
+
+    def take(self, size: int) -> bytes:
+        data = bytes(self.buffer[:size])
+        del self.buffer[:size]
+        return data
+
+
+class HelperProcess:
+    """
+    A long running parser helper that answers length framed requests on stdin/stdout.
+    A helper that takes longer than timeout seconds to answer is killed, the next
+    request starts a new one.
+    """
+
+    def __init__(self, command: list[str], timeout: float = HELPER_TIMEOUT) -> None:
+        self.command = command
+        self.timeout = timeout
+        self.process = None
+        self.output = None
+
+    def start(self):
+        self.process = subprocess.Popen(
+            self.command,
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.DEVNULL,
+            bufsize=0,
+        )
+        self.output = DeadlineReader(self.process.stdout)
+
+    @property
+    def alive(self) -> bool:
+        return self.process is not None and self.process.poll() is None
+
+    def request(self, payload: bytes) -> bytes:
+        if not self.alive:
+            # release the pipes of a helper that died before starting its replacement
+            self.close()
+            self.start()
+
+        self.output.deadline = monotonic() + self.timeout if self.timeout else None
+
+        try:
+            write_frame(self.process.stdin, payload)
+            return read_frame(self.output)
+        except HelperTimeout:
+            self.kill()
+            raise
+        except (BrokenPipeError, OSError) as err:
+            raise HelperError(f"helper failed: {err}") from err
+
+    def close(self):
+        if self.process is None:
+            return
+
+        try:
+            self.process.stdin.close()
+            self.process.wait(timeout=1)
+        except (OSError, subprocess.TimeoutExpired):
+            self.process.kill()
+            self.process.wait()
+
+        self.process.stdout.close()
+        self.process = None
+        self.output = None
+
+    def kill(self):
+        if self.process is None:
+            return
+
+        self.process.kill()
+        self.close()
+
+
+class HelperPool:
+    """
+    A bounded pool of helper processes. Workers are started lazily, reused between
+    requests and replaced when they crash or time out.
+    """
+
+    def __init__(self, command: list[str], size: int = None, timeout: float = HELPER_TIMEOUT) -> None:
+        self.command = command
+        self.size = size or default_pool_size()
+        self.timeout = timeout
+        self.idle = LifoQueue()
+        self.started = 0
+        self.lock = Lock()
+
+        atexit.register(self.close)
+
+    def request(self, payload: bytes) -> bytes:
+        worker = self.acquire()
+
+        try:
+            try:
+                return worker.request(payload)
+            except HelperTimeout:
+                # the input would most likely hang the new helper too
+                raise
+            except HelperError:
+                # the helper died, most likely on this input, restart it and try once more
+                worker.close()
+                return worker.request(payload)
+        except HelperError:
+            worker.close()
+            raise
+        finally:
+            self.idle.put(worker)
+
+    def acquire(self) -> HelperProcess:
+        try:
+            return self.idle.get_nowait()
+        except Empty:
+            pass
+
+        with self.lock:
+            if self.started < self.size:
+                self.started += 1
+                return HelperProcess(self.command, self.timeout)
+
+        return self.idle.get()
+
+    def close(self):
+        while True:
+            try:
+                worker = self.idle.get_nowait()
+            except Empty:
+                break
+
+            worker.close()
+
+            with self.lock:
+                self.started -= 1
+
+
+def default_pool_size() -> int:
+    return int(getenv("PARSER_POOL_SIZE", min(4, cpu_count() or 1)))
@@ -1,24 +1,55 @@
 import itertools
+from os import getenv
+from pathlib import Path
 import re
 import subprocess
 import json
 import sys
-from tempfile import NamedTemporaryFile
 from typing import Iterable
 
 from gen.openapi_adaptor import Question
+from gen.tokens import estimate_tokens
 
-from .common import Parser, ParsedItem
+from .cache import cached_parse_many
+from .common import Parser, ParsedItem, SourceBuffer
+
+RUST_PARSER = Path(getenv("RUST_PARSER", Path(__file__).parent.parent.parent / "bin" / "rust_parser"))
+CARGO_MANIFEST = Path(__file__).parent.parent.parent / "Cargo.toml"
+
+GRANULARITIES = ("method", "impl", "file", "auto")
+
+# the estimated tokens under which auto converts a whole file, or a struct and its impls, at once
+FILE_TOKENS = 1500
+IMPL_TOKENS = 2000
 
 
 class RustParser(Parser):
     @classmethod
     def parse(cls, code) -> list[ParsedItem]:
-        with NamedTemporaryFile("w") as f:
-            f.write(code)
-            f.flush()
+        return cls.parse_many([code])[0]
 
-            return parse_rust_file(f.name)
+    @classmethod
+    @cached_parse_many("rust", RUST_PARSER)
+    def parse_many(cls, codes: list[str]) -> list[list[ParsedItem]]:
+        """
+        Parse several sources with a single rust_parser process using its NDJSON mode.
+        """
+        requests = "".join(
+            json.dumps({"id": idx, "source": code}) + "\n" for idx, code in enumerate(codes)
+        )
+
+        result = subprocess.run(
+            rust_parser_command("--ndjson", "--spans"), input=requests, capture_output=True, text=True
+        )
+        if result.returncode != 0:
+            print("Error in parsing:", result.stderr)
+            return [None] * len(codes)
+
+        responses = read_responses(result.stdout, range(len(codes)))
+
+        return [
+            to_parsed_items(SourceBuffer.from_text(code), response) for code, response in zip(codes, responses)
+        ]
 
     @classmethod
     def extract_source_and_tests(cls, source: str) -> tuple[str, str]:
@@ -63,23 +94,55 @@ class RustParser(Parser):
         raise NotImplementedError()
     
     @classmethod
-    def enumerate_code(cls, code: list[ParsedItem]) -> Iterable[ParsedItem]:
+    def enumerate_code(
+        cls,
+        code: list[ParsedItem],
+        granularity: str = "method",
+        file_tokens: int = FILE_TOKENS,
+        impl_tokens: int = IMPL_TOKENS,
+        summarize: bool = True,
+        max_tokens: int = None,
+    ) -> Iterable[ParsedItem]:
+        """
+        Yields the items to convert one request at a time. granularity is one of
+        GRANULARITIES:
+
+        method: each method on its own, after a summary of its struct's fields, or the
+        full struct source when summarize is False.
+        impl: each struct with all of its impl blocks as a single "impl_group" item.
+        file: every item in one "file" item.
+        auto: file when the whole file is under file_tokens, otherwise impl for the
+        structs whose source and impls are under impl_tokens and method for the rest.
+
+        A file or struct group over max_tokens is not grouped, its members are
+        yielded as they would be without it, so they can be split on their own.
+        """
+        if granularity not in GRANULARITIES:
+            raise ValueError(f"granularity must be one of {', '.join(GRANULARITIES)}")
+
+        whole_file = file_items(code, granularity, file_tokens, max_tokens)
+        if whole_file:
+            yield from whole_file
+            return
+
         impls = [item for item in code if item.type == "impl"]
 
         impls = sorted(impls, key=lambda x: x.name)
 
-        processed = set()
+        groups = [(name.split(" ")[0], list(group)) for name, group in itertools.groupby(impls, key=lambda x: x.name)]
+
+        structs = {item.name: item for item in code if item.type == "struct"}
 
-        template = "{}\n\n{} {{\n\n{}\n\n}}"
+        grouped = grouped_structs(groups, structs, granularity, impl_tokens, max_tokens)
+
+        processed = set()
 
         for item in code:
-            if item.type == "struct":
+            if item.type == "struct" and item.name not in grouped:
                 processed.add(item.key)
                 yield item
 
-        for _, impl_group in itertools.groupby(impls, key=lambda x: x.name):
-
-            impl_group = list(impl_group)
+        for name, impl_group in groups:
 
             for item in impl_group:
                 processed.add(item.key)
@@ -92,63 +155,148 @@ class RustParser(Parser):
                 impl = impl_group[0]
 
             first_line = impl.source[: impl.source.find("{")].strip()
-            name = impl.name.split(" ")[0]
 
-            struct = [item for item in code if item.name == name and item.type == "struct"]
-            if not struct:
+            struct = structs.get(name)
+            if struct is None:
                 continue
-            
-            struct = struct[0]
-        
-            for item in code:
-                if item.type == "impl" or item.receiver != impl.name:
-                    continue
 
-                if item.key in processed:
-                    continue
+            if name in grouped:
+                processed.add(struct.key)
+                processed.update(item.key for item in code if item.type != "impl" and item.receiver == impl.name)
 
-                processed.add(item.key)
+                yield ParsedItem(name=struct.name, type="impl_group", source=group_source(struct, impl_group))
+                continue
 
-                if item.receiver == impl.name:
-                    yield ParsedItem(
-                        name=item.name,
-                        type=item.type,
-                        source=template.format(
-                            struct.source,
-                            first_line,
-                            item.source,
-                        )
-                    )
+            context = summarize_struct(struct.source) if summarize else struct.source
 
-                else:
-                    yield impl
+            yield from method_items(code, impl.name, f"{context}\n\n{first_line}", processed)
 
         for item in code:
             if item.key not in processed:
-                yield item  
-            
+                yield item
+
+
+def method_items(code: list[ParsedItem], receiver: str, context: str, processed: set) -> Iterable[ParsedItem]:
+    """
+    Each method of receiver on its own, wrapped in its impl block after the struct context.
+    """
+    template = "{} {{\n\n{}\n\n}}"
+
+    for item in code:
+        if item.type == "impl" or item.receiver != receiver or item.key in processed:
+            continue
+
+        processed.add(item.key)
+
+        yield ParsedItem(name=item.name, type=item.type, source=template.format(context, item.source))
+
+
+def file_items(
+    code: list[ParsedItem], granularity: str, file_tokens: int, max_tokens: int = None
+) -> list[ParsedItem] | None:
+    """
+    The whole file as a single "file" item followed by its imports, or None when
+    granularity does not convert this file in one request.
+    """
+    if granularity not in ("file", "auto"):
+        return None
+
+    source = "\n\n".join(item.source for item in code if not item.receiver and item.type != "imports")
+    tokens = estimate_tokens(source)
+    if (granularity == "auto" and tokens > file_tokens) or (max_tokens and tokens > max_tokens):
+        return None
+
+    return [ParsedItem(name="file", type="file", source=source)] + [item for item in code if item.type == "imports"]
+
+
+def grouped_structs(
+    groups: list[tuple[str, list[ParsedItem]]],
+    structs: dict[str, ParsedItem],
+    granularity: str,
+    impl_tokens: int,
+    max_tokens: int = None,
+) -> set[str]:
+    """
+    The names of the structs converted together with their impls as one "impl_group" item.
+    """
+    if granularity == "method":
+        return set()
+
+    limit = impl_tokens if granularity != "impl" else None
+    if max_tokens:
+        limit = min(limit, max_tokens) if limit else max_tokens
+
+    return {
+        name
+        for name, impl_group in groups
+        if name in structs and (limit is None or estimate_tokens(group_source(structs[name], impl_group)) <= limit)
+    }
+
+
+def group_source(struct: ParsedItem, impl_group: list[ParsedItem]) -> str:
+    return "\n\n".join([struct.source] + [impl.source for impl in impl_group])
+
+
+def summarize_struct(source: str) -> str:
+    """
+    A struct cut down to what a method needs to know about it, its declaration and
+    field names and types. Doc comments, attributes and blank lines are dropped.
+    """
+    lines = []
+    for line in source.splitlines():
+        stripped = line.strip()
+        if not stripped or stripped.startswith(("//", "#[")):
+            continue
+
+        lines.append(line.split(" //")[0].rstrip())
+
+    return "\n".join(lines)
+
+
+def rust_parser_command(*args: str) -> list[str]:
+    if RUST_PARSER.exists():
+        return [str(RUST_PARSER), *args]
+
+    # fall back to building the helper, see `make rust_parser`
+    return ["cargo", "run", "-q", "-r", "--manifest-path", str(CARGO_MANIFEST), "--bin", "rust_parser", "--", *args]
+
 
 def parse_rust_file(file_path):
     result = subprocess.run(
-        ["cargo", "run", "--", file_path], capture_output=True, text=True
+        rust_parser_command("--spans", str(file_path)), capture_output=True, text=True
     )
     if result.returncode != 0:
-        print("{}Error in parsing:", result.stderr)
+        print("Error in parsing:", result.stderr)
         return None
 
-    json_results = json.loads(result.stdout)
+    return to_parsed_items(SourceBuffer.from_file(file_path), {"items": json.loads(result.stdout)})
+
+
+def read_responses(output: str, ids: Iterable) -> list[dict]:
+    responses = {}
+    for line in output.splitlines():
+        if line.strip():
+            response = json.loads(line)
+            responses[response["id"]] = response
+
+    return [responses.get(_id, {"error": "missing response"}) for _id in ids]
+
+
+def to_parsed_items(buffer: SourceBuffer, response: dict) -> list[ParsedItem]:
+    if "error" in response:
+        print("Error in parsing:", response["error"])
+        return None
 
     imports = []
     clean_results = []
 
-    for item in json_results:
-        if item["type"] == "use":
-            imports.extend(extract_imports(item["source"]))
+    for row in response["items"]:
+        item = ParsedItem.from_row(buffer, row)
+        if item.type == "use":
+            imports.extend(expand_use(item.source))
         else:
             clean_results.append(item)
 
-    clean_results = [ParsedItem(**item) for item in clean_results]
-
     clean_results.append(
         ParsedItem(name="imports", type="imports", source=",".join(imports))
     )
@@ -156,6 +304,63 @@ def parse_rust_file(file_path):
     return clean_results
 
 
+def expand_use(statement: str) -> list[str]:
+    """
+    The full path of everything a use statement imports, with nested groups
+    expanded. `use std::{io::{self, Read}, fmt::Write as _};` gives std::io,
+    std::io::Read and std::fmt::Write as _.
+    """
+    tree = re.sub(r"^\s*(?:pub(?:\([^)]*\))?\s+)?use\s+", "", statement.strip()).rstrip(";")
+
+    return expand_use_tree("", " ".join(tree.split()))
+
+
+def expand_use_tree(prefix: str, tree: str) -> list[str]:
+    paths = []
+    depth = 0
+    start = 0
+    parts = []
+
+    for idx, c in enumerate(tree):
+        if c == "{":
+            depth += 1
+        elif c == "}":
+            depth -= 1
+        elif c == "," and depth == 0:
+            parts.append(tree[start:idx])
+            start = idx + 1
+
+    parts.append(tree[start:])
+
+    for part in parts:
+        part = part.strip()
+        if not part:
+            continue
+
+        brace = part.find("{")
+        if brace != -1 and part.endswith("}"):
+            head = part[:brace].strip().rstrip(":")
+            paths.extend(expand_use_tree(join_path(prefix, head), part[brace + 1 : -1]))
+        elif part == "self" or part.startswith("self "):
+            paths.append(prefix + part[len("self") :])
+        else:
+            paths.append(join_path(prefix, part.replace(" :: ", "::")))
+
+    return paths
+
+
+def join_path(prefix: str, path: str) -> str:
+    return f"{prefix}::{path}" if prefix and path else prefix or path
+
+
+def imported_name(path: str) -> str:
+    """
+    The name an import is used by, its alias or the last segment of its path.
+    """
+    path, _, alias = path.partition(" as ")
+    return alias.strip() or path.split("::")[-1]
+
+
 def extract_imports(code):
     # Regular expression pattern to match Rust use statements
     pattern = r"use\s+[\w:]*::\{([^}]*)\};|use\s+[\w:]*::(\w+);"
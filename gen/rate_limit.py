@@ -0,0 +1,85 @@
+from asyncio import Lock, sleep
+from time import monotonic
+
+
+class TokenBucket:
+    """
+    Refills continuously at per_minute / 60 units a second up to a burst of per_minute.
+    """
+
+    def __init__(self, per_minute: float) -> None:
+        self.capacity = per_minute
+        self.rate = per_minute / 60
+        self.level = per_minute
+        self.updated = monotonic()
+
+    def refill(self):
+        now = monotonic()
+        self.level = min(self.capacity, self.level + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def wait_time(self, amount: float) -> float:
+        self.refill()
+
+        # a request bigger than the whole bucket only waits for a full bucket
+        amount = min(amount, self.capacity)
+        if self.level >= amount:
+            return 0
+
+        return (amount - self.level) / self.rate
+
+    def take(self, amount: float):
+        self.level -= amount
+
+    def give(self, amount: float):
+        self.level = min(self.capacity, self.level + amount)
+
+
+class RateLimiter:
+    """
+    Keeps requests under requests-per-minute and tokens-per-minute quotas. Callers
+    are served in arrival order, each reserving its estimated tokens up front,
+    and the estimate is corrected from the usage reported with the response.
+    """
+
+    def __init__(self, rpm: float = None, tpm: float = None, expected_output_tokens: int = 512) -> None:
+        self.rpm = rpm
+        self.tpm = tpm
+        self.expected_output_tokens = expected_output_tokens
+        self.requests = TokenBucket(rpm) if rpm else None
+        self.tokens = TokenBucket(tpm) if tpm else None
+        self.lock = Lock()
+        self.waited = 0.0
+
+    async def acquire(self, tokens: int):
+        if not (self.requests or self.tokens):
+            return
+
+        # the lock queues callers fairly, the head of the queue waits for capacity
+        async with self.lock:
+            while True:
+                wait = max(
+                    self.requests.wait_time(1) if self.requests else 0,
+                    self.tokens.wait_time(tokens) if self.tokens else 0,
+                )
+                if wait <= 0:
+                    break
+
+                self.waited += wait
+                await sleep(wait)
+
+            if self.requests:
+                self.requests.take(1)
+            if self.tokens:
+                self.tokens.take(tokens)
+
+    def reconcile(self, estimated: int, actual: int):
+        if self.tokens and actual is not None:
+            self.tokens.give(estimated - actual)
+
+    def stats(self) -> dict:
+        return {
+            "rate limit rpm": self.rpm,
+            "rate limit tpm": self.tpm,
+            "rate limit wait seconds": round(self.waited, 2),
+        }
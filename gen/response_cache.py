@@ -0,0 +1,163 @@
+from asyncio import get_running_loop
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from hashlib import sha256
+import json
+from os import getenv
+from pathlib import Path
+import sqlite3
+from time import time
+
+RESPONSE_CACHE_PATH = Path(
+    getenv("RESPONSE_CACHE_PATH", Path(__file__).parent.parent / "responses" / "cache.sqlite")
+)
+RESPONSE_CACHE_TTL = float(getenv("RESPONSE_CACHE_TTL", 30 * 24 * 60 * 60))
+RESPONSE_CACHE_MAX_BYTES = int(getenv("RESPONSE_CACHE_MAX_BYTES", 512 * 1024 * 1024))
+# seconds between sweeps for expired entries, the size limit is checked on every put
+RESPONSE_CACHE_SWEEP_INTERVAL = 60.0
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS responses (
+    key TEXT PRIMARY KEY,
+    model TEXT NOT NULL,
+    content TEXT NOT NULL,
+    size INTEGER NOT NULL,
+    created REAL NOT NULL,
+    accessed REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS responses_accessed ON responses (accessed);
+CREATE INDEX IF NOT EXISTS responses_created ON responses (created);
+"""
+
+
+class ResponseCache:
+    """
+    Chat completions stored in SQLite, keyed by a hash of the model, messages and
+    sampling parameters. The database runs in WAL mode so several processes can
+    share it. Entries expire after ttl seconds and the least recently used are
+    evicted once the stored content exceeds max_bytes. Expired entries are swept
+    at most once every sweep_interval seconds, and the stored size is tracked as
+    entries are added so a put does not scan the table. The async methods run the
+    queries on a thread of their own, off the event loop.
+    """
+
+    def __init__(
+        self,
+        path: Path = RESPONSE_CACHE_PATH,
+        ttl: float = RESPONSE_CACHE_TTL,
+        max_bytes: int = RESPONSE_CACHE_MAX_BYTES,
+        sweep_interval: float = RESPONSE_CACHE_SWEEP_INTERVAL,
+    ) -> None:
+        self.path = Path(path)
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self.sweep_interval = sweep_interval
+        self.hits = 0
+        self.misses = 0
+        self.stored = None
+        self.next_sweep = 0.0
+        self._connection = None
+        self._executor = None
+
+    @property
+    def connection(self) -> sqlite3.Connection:
+        if self._connection is None:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            self._connection = sqlite3.connect(
+                self.path, timeout=30, isolation_level=None, check_same_thread=False
+            )
+            self._connection.execute("PRAGMA journal_mode=WAL")
+            self._connection.executescript(SCHEMA)
+
+        return self._connection
+
+    @staticmethod
+    def key(model: str, messages: list[dict], params: dict = None) -> str:
+        request = json.dumps(
+            {"model": model, "messages": messages, "params": params or {}}, sort_keys=True
+        )
+        return sha256(request.encode()).hexdigest()
+
+    def get(self, key: str) -> str | None:
+        now = time()
+        row = self.connection.execute(
+            "SELECT content, created FROM responses WHERE key = ?", (key,)
+        ).fetchone()
+
+        if row is None or now - row[1] > self.ttl:
+            self.misses += 1
+            return None
+
+        self.connection.execute("UPDATE responses SET accessed = ? WHERE key = ?", (now, key))
+        self.hits += 1
+
+        return row[0]
+
+    async def get_async(self, key: str) -> str | None:
+        return await self.run(self.get, key)
+
+    def put(self, key: str, model: str, content: str):
+        now = time()
+        size = len(content.encode())
+
+        if self.stored is None:
+            self.stored = self.total_size()
+
+        self.connection.execute(
+            "INSERT OR REPLACE INTO responses (key, model, content, size, created, accessed) "
+            "VALUES (?, ?, ?, ?, ?, ?)",
+            (key, model, content, size, now, now),
+        )
+        self.stored += size
+
+        if self.stored > self.max_bytes or now >= self.next_sweep:
+            self.evict()
+
+    async def put_async(self, key: str, model: str, content: str):
+        await self.run(self.put, key, model, content)
+
+    async def run(self, func, *args):
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="response-cache")
+
+        return await get_running_loop().run_in_executor(self._executor, partial(func, *args))
+
+    def total_size(self) -> int:
+        (total,) = self.connection.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()
+        return total
+
+    def evict(self):
+        now = time()
+        connection = self.connection
+        connection.execute("DELETE FROM responses WHERE created < ?", (now - self.ttl,))
+        self.next_sweep = now + self.sweep_interval
+
+        # other processes sharing the database add to it too
+        total = self.stored = self.total_size()
+        if total <= self.max_bytes:
+            return
+
+        rows = connection.execute("SELECT key, size FROM responses ORDER BY accessed, rowid").fetchall()
+
+        evicted = []
+        for key, size in rows:
+            if total <= self.max_bytes:
+                break
+
+            evicted.append((key,))
+            total -= size
+
+        connection.executemany("DELETE FROM responses WHERE key = ?", evicted)
+        self.stored = total
+
+    def stats(self) -> dict:
+        return {"response cache hits": self.hits, "response cache misses": self.misses}
+
+    def close(self):
+        if self._executor is not None:
+            self._executor.shutdown()
+            self._executor = None
+
+        if self._connection is not None:
+            self._connection.close()
+            self._connection = None
@@ -0,0 +1,134 @@
+from asyncio import Event, sleep
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+from random import uniform
+from time import monotonic
+
+
+def retry_after(err: Exception) -> float | None:
+    """
+    The delay the server asked for in Retry-After / retry-after-ms, if any.
+    """
+    response = getattr(err, "response", None)
+    headers = getattr(response, "headers", None)
+    if not headers:
+        return None
+
+    try:
+        if "retry-after-ms" in headers:
+            return float(headers["retry-after-ms"]) / 1000
+
+        value = headers.get("retry-after")
+        if value is None:
+            return None
+
+        try:
+            return float(value)
+        except ValueError:
+            when = parsedate_to_datetime(value)
+            return max(0.0, (when - datetime.now(timezone.utc)).total_seconds())
+    except (TypeError, ValueError):
+        return None
+
+
+class RetryPolicy:
+    """
+    Exponential backoff with full jitter, a server supplied Retry-After wins.
+    """
+
+    def __init__(self, attempts: int = 3, base: float = 0.5, cap: float = 30.0) -> None:
+        self.attempts = attempts
+        self.base = base
+        self.cap = cap
+
+    def delay(self, attempt: int, err: Exception = None) -> float:
+        requested = retry_after(err) if err is not None else None
+        if requested is not None:
+            return min(requested, self.cap)
+
+        return uniform(0, min(self.cap, self.base * 2**attempt))
+
+
+class RetryBudget:
+    """
+    Limits retries to a fraction of requests so an outage doesn't multiply traffic.
+    Every request deposits ratio of a token, every retry spends a whole one.
+    """
+
+    def __init__(self, ratio: float = 0.2, minimum: float = 10.0) -> None:
+        self.ratio = ratio
+        self.balance = minimum
+        self.exhausted = 0
+
+    def deposit(self):
+        self.balance += self.ratio
+
+    def withdraw(self) -> bool:
+        if self.balance < 1:
+            self.exhausted += 1
+            return False
+
+        self.balance -= 1
+        return True
+
+
+class CircuitBreaker:
+    """
+    Opens after failure_threshold consecutive failures and holds new submissions
+    for reset_timeout seconds. After that a single probe request is let through
+    while the rest keep waiting, its success closes the breaker and its failure
+    re-opens it.
+    """
+
+    def __init__(self, failure_threshold: int = 5, reset_timeout: float = 30.0) -> None:
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened_at = None
+        self.opened = 0
+        self.probing = False
+        self.probe_done = Event()
+
+    @property
+    def is_open(self) -> bool:
+        return self.opened_at is not None and monotonic() - self.opened_at < self.reset_timeout
+
+    async def wait_ready(self):
+        while True:
+            if self.is_open:
+                await sleep(self.opened_at + self.reset_timeout - monotonic())
+            elif self.opened_at is None:
+                return
+            elif not self.probing:
+                # half open, this caller is the probe
+                self.probing = True
+                self.probe_done.clear()
+                return
+            else:
+                await self.probe_done.wait()
+
+    def release(self):
+        """
+        End a probe that neither succeeded nor failed in a way that says anything
+        about the provider, letting the next waiter probe instead.
+        """
+        if self.probing:
+            self.probing = False
+            self.probe_done.set()
+
+    def record_success(self):
+        self.failures = 0
+        self.opened_at = None
+        self.release()
+
+    def record_failure(self):
+        self.failures += 1
+
+        half_open = self.opened_at is not None
+        if self.failures >= self.failure_threshold or half_open:
+            if not self.is_open:
+                self.opened += 1
+                print(f"circuit breaker open for {self.reset_timeout}s")
+            self.opened_at = monotonic()
+
+        self.release()
@@ -0,0 +1,171 @@
+from collections import deque
+from dataclasses import dataclass, field
+import re
+from time import monotonic
+
+from gen.compression import strip_comments
+from gen.hedging import percentile
+from gen.openapi_adaptor import AIModel, Question
+from gen.parsers.common import ParsedItem
+
+TYPE_SCORES = {
+    "const": 0,
+    "static": 0,
+    "use": 0,
+    "type": 1,
+    "enum": 2,
+    "struct": 2,
+    "macro": 8,
+    "function": 4,
+    "method": 4,
+    "trait": 6,
+    "impl": 8,
+}
+
+FEATURES = {
+    "generics": (re.compile(r"\b(?:fn|struct|enum|trait|type)\s+\w+\s*<|\bimpl\s*<|\bwhere\b"), 4),
+    "lifetimes": (re.compile(r"'[a-z_]\w*\b(?!')"), 4),
+    "traits": (re.compile(r"\bdyn\b|\bimpl\s+\w+|\btrait\b|\bfor\s+\w+\s*\{"), 3),
+    "async": (re.compile(r"\basync\b|\.await\b"), 4),
+    "unsafe": (re.compile(r"\bunsafe\b"), 6),
+    "macros": (re.compile(r"\bmacro_rules!"), 6),
+}
+
+
+def nesting(source: str) -> int:
+    depth = deepest = 0
+    for c in source:
+        if c == "{":
+            depth += 1
+            deepest = max(deepest, depth)
+        elif c == "}":
+            depth -= 1
+
+    return deepest
+
+
+def score_item(item: ParsedItem) -> float:
+    """
+    A rough measure of how hard an item is to convert. Size and nesting count for
+    most, language features that rarely map one to one onto the target add to it.
+    Comments and literals are left out, so a char like 'a' or an apostrophe in a
+    string is not taken for a lifetime.
+    """
+    source = item.source
+    lines = sum(1 for line in source.splitlines() if line.strip())
+    code = strip_comments(source, literals=True)
+
+    score = TYPE_SCORES.get(item.type, 4) + lines / 5 + 2 * max(nesting(code) - 1, 0)
+
+    for pattern, weight in FEATURES.values():
+        if pattern.search(code):
+            score += weight
+
+    return round(score, 1)
+
+
+@dataclass
+class Tier:
+    """
+    Items scoring up to max_score are sent to model. A tier without a max_score
+    takes everything the tiers before it did not.
+    """
+
+    name: str
+    model: AIModel
+    max_score: float = None
+    requests: int = field(default=0, init=False)
+    scores: float = field(default=0, init=False)
+    latencies: deque = field(default_factory=lambda: deque(maxlen=500), init=False, repr=False)
+
+    def accepts(self, score: float) -> bool:
+        return self.max_score is None or score <= self.max_score
+
+    def stats(self) -> dict:
+        prefix = f"tier {self.name}"
+
+        return {
+            f"{prefix} requests": self.requests,
+            f"{prefix} mean score": round(self.scores / self.requests, 1) if self.requests else None,
+            f"{prefix} p50 latency": percentile(self.latencies, 0.5),
+            f"{prefix} p95 latency": percentile(self.latencies, 0.95),
+        }
+
+
+class ModelRouter(AIModel):
+    """
+    Sends each request to the cheapest tier whose max_score covers the item being
+    converted. Requests without an item, and items above every threshold, go to
+    the last tier.
+    """
+
+    def __init__(self, tiers: list[Tier]) -> None:
+        super().__init__()
+        if not tiers:
+            raise ValueError("at least one tier is required")
+
+        limited = sorted((tier for tier in tiers if tier.max_score is not None), key=lambda tier: tier.max_score)
+        self.tiers = limited + [tier for tier in tiers if tier.max_score is None]
+
+    def route(self, question: Question = None) -> tuple[Tier, float | None]:
+        item = getattr(question, "item", None)
+        if item is None:
+            return self.tiers[-1], None
+
+        score = score_item(item)
+        for tier in self.tiers:
+            if tier.accepts(score):
+                return tier, score
+
+        return self.tiers[-1], score
+
+    async def call_chat(
+        self,
+        messages: [dict],
+        question: Question = None,
+        trys: int = None,
+        print_output=False,
+        variant: int = 0,
+    ) -> (str, Question):
+        tier, score = self.route(question)
+        tier.requests += 1
+        tier.scores += score or 0
+        start = monotonic()
+
+        result = await tier.model.call_chat(
+            messages, question, trys=trys, print_output=print_output, variant=variant
+        )
+
+        tier.latencies.append(monotonic() - start)
+
+        return result
+
+    async def list_models(self, list_all=False):
+        for tier in self.tiers:
+            await tier.model.list_models(list_all)
+
+    async def open(self) -> "ModelRouter":
+        for tier in self.tiers:
+            await tier.model.open()
+        return self
+
+    async def close(self):
+        for tier in self.tiers:
+            await tier.model.close()
+
+    async def __aenter__(self) -> "ModelRouter":
+        return await self.open()
+
+    async def __aexit__(self, *exc_info):
+        await self.close()
+
+    def stats(self) -> dict:
+        stats = {}
+        for tier in self.tiers:
+            stats.update(tier.stats())
+
+        for tier in self.tiers:
+            for name, value in tier.model.stats().items():
+                stats[f"{tier.name} {name}"] = value
+
+        return stats
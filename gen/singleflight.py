@@ -0,0 +1,51 @@
+from asyncio import CancelledError, Future, ensure_future, shield
+from typing import Awaitable, Callable, TypeVar
+
+T = TypeVar("T")
+
+
+class SingleFlight:
+    """
+    Coalesces concurrent calls that share a key, the first caller starts the work
+    and everyone arriving while it is in flight awaits the same result. A
+    cancelled caller leaves the work running for the others, the work itself is
+    only cancelled once every caller waiting on it has been.
+    """
+
+    def __init__(self) -> None:
+        self.calls: dict[str, Future] = {}
+        self.waiters: dict[Future, int] = {}
+        self.started = 0
+        self.shared = 0
+
+    async def do(self, key: str, func: Callable[[], Awaitable[T]]) -> T:
+        future = self.calls.get(key)
+
+        if future is None:
+            future = ensure_future(func())
+            self.calls[key] = future
+            self.started += 1
+            future.add_done_callback(lambda _: self.forget(key, future))
+        else:
+            self.shared += 1
+
+        self.waiters[future] = self.waiters.get(future, 0) + 1
+
+        try:
+            # a cancelled caller must not cancel the call for everyone else
+            return await shield(future)
+        except CancelledError:
+            if self.waiters[future] == 1:
+                future.cancel()
+            raise
+        finally:
+            self.waiters[future] -= 1
+            if not self.waiters[future]:
+                del self.waiters[future]
+
+    def forget(self, key: str, future: Future):
+        if self.calls.get(key) is future:
+            del self.calls[key]
+
+    def stats(self) -> dict:
+        return {"requests started": self.started, "requests shared in flight": self.shared}
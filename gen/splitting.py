@@ -0,0 +1,257 @@
+import re
+
+from gen.parsers.common import ParsedItem
+from gen.tokens import estimate_tokens
+
+CONTAINERS = ("impl", "trait", "module")
+
+# items made of several top level items by RustParser.enumerate_code, not split again,
+# enumerate_code leaves a group over the limit as its members instead
+GROUPS = ("impl_group", "file")
+
+INNER_ITEM = re.compile(r"\b(fn|const|static|type|struct|enum|trait|mod)\s+(\w+)")
+
+CHAR = re.compile(r"'(?:\\u\{[0-9A-Fa-f]{1,6}\}|\\.|[^\\'])'")
+
+# tokens after a closing brace that continue the same statement
+CONTINUATIONS = ("else", ".", "?", ")", "]", ",", ";", "as ")
+
+
+def scan(source: str, start: int = 0, end: int = None) -> list[int]:
+    """
+    Offsets just past each top level statement or item between start and end.
+    Strings, chars, lifetimes and comments are skipped so braces inside them are
+    not counted.
+    """
+    end = len(source) if end is None else end
+    boundaries = []
+    depth = 0
+    idx = start
+
+    while idx < end:
+        c = source[idx]
+
+        skipped = skip_literal(source, idx, end)
+        if skipped is not None:
+            idx = skipped
+            continue
+
+        if c in "{([":
+            depth += 1
+        elif c in "})]":
+            depth -= 1
+            if depth == 0 and c == "}":
+                rest = source[idx + 1 : end].lstrip()
+                if not rest.startswith(CONTINUATIONS):
+                    boundaries.append(idx + 1)
+        elif c == ";" and depth == 0:
+            boundaries.append(idx + 1)
+
+        idx += 1
+
+    return boundaries
+
+
+def skip_literal(source: str, idx: int, end: int) -> int | None:
+    """
+    The offset past the comment, string, char or lifetime starting at idx, or None
+    if there is none.
+    """
+    if source.startswith("//", idx):
+        newline = source.find("\n", idx)
+        return end if newline == -1 else newline
+
+    if source.startswith("/*", idx):
+        close = source.find("*/", idx + 2)
+        return end if close == -1 else close + 2
+
+    if source[idx] == '"' or source.startswith('r"', idx) or source.startswith('r#"', idx):
+        return skip_string(source, idx)
+
+    if source[idx] == "'":
+        char = CHAR.match(source, idx)
+        return idx + (len(char.group()) if char else 1)
+
+    return None
+
+
+def skip_string(source: str, idx: int) -> int:
+    raw = re.match(r'r(#*)"', source[idx:])
+    if raw:
+        close = source.find('"' + raw.group(1), idx + len(raw.group()))
+        return len(source) if close == -1 else close + 1 + len(raw.group(1))
+
+    idx += 1
+    while idx < len(source):
+        if source[idx] == "\\":
+            idx += 2
+            continue
+        if source[idx] == '"':
+            return idx + 1
+        idx += 1
+
+    return idx
+
+
+def segments(source: str, start: int, end: int) -> list[str]:
+    pieces = []
+    previous = start
+
+    for boundary in scan(source, start, end):
+        pieces.append(source[previous:boundary])
+        previous = boundary
+
+    # a trailing expression is a piece of its own, trailing comments stay with the last piece
+    tail = source[previous:end]
+    code = [line for line in tail.splitlines() if line.strip() and not line.strip().startswith("//")]
+    if code or not pieces:
+        pieces.append(tail)
+    else:
+        pieces[-1] += tail
+
+    return [piece for piece in pieces if piece.strip()]
+
+
+def body_span(source: str) -> tuple[int, int] | None:
+    """
+    The span inside the outermost braces of an item, after its header.
+    """
+    for boundary in scan(source):
+        if source[boundary - 1] == "}":
+            open_brace = header_end(source, boundary)
+            if open_brace is not None:
+                return open_brace, boundary - 1
+
+    return None
+
+
+def header_end(source: str, end: int) -> int | None:
+    depth = 0
+    for idx, c in enumerate(source[:end]):
+        if c in "(<[":
+            depth += 1
+        elif c in ")>]":
+            depth -= 1
+        elif c == "{" and depth <= 0:
+            return idx + 1
+
+    return None
+
+
+class ItemSplitter:
+    """
+    Breaks items whose source is estimated to be over max_tokens into pieces that
+    can be converted concurrently. impl, trait and mod blocks are split into their
+    inner items, each wrapped in the block's header. Long functions are split
+    between top level statements into fragments that are converted in order and
+    joined back into one function. A single statement bigger than max_tokens, such
+    as one huge match, is not split further.
+    """
+
+    def __init__(self, max_tokens: int = 3000) -> None:
+        self.max_tokens = max_tokens
+        self.split_items = 0
+        self.pieces = 0
+
+    def oversized(self, source: str) -> bool:
+        return estimate_tokens(source) > self.max_tokens
+
+    def split(self, item: ParsedItem) -> list[ParsedItem]:
+        if item.type in GROUPS or not self.oversized(item.source):
+            return [item]
+
+        if item.type in CONTAINERS:
+            pieces = self.split_container(item)
+        else:
+            pieces = self.split_function(item)
+
+        if len(pieces) <= 1:
+            return [item]
+
+        self.split_items += 1
+        self.pieces += len(pieces)
+
+        return pieces
+
+    def split_container(self, item: ParsedItem) -> list[ParsedItem]:
+        source = item.source
+        span = body_span(source)
+        if span is None:
+            return [item]
+
+        header = source[: span[0]].strip()
+        context = []
+        pieces = []
+
+        for segment in segments(source, *span):
+            code = "\n".join(
+                line for line in segment.splitlines() if not line.strip().startswith(("//", "#"))
+            )
+            match = INNER_ITEM.search(code)
+            if match is None:
+                # use statements and the like are context for every piece
+                context.append(segment.strip())
+                continue
+
+            kind, name = match.groups()
+            if kind != "fn":
+                piece_type = kind
+            elif item.type == "module":
+                piece_type = "function"
+            else:
+                piece_type = "method"
+
+            piece = ParsedItem(
+                name=name,
+                type=piece_type,
+                source="\n".join([header, *context, segment.strip("\n"), "}"]),
+                receiver=None if item.type == "module" else item.name,
+            )
+
+            if kind == "fn" and self.oversized(segment):
+                pieces.extend(self.split_function(piece, segment.strip("\n"), f"// from {header} ... }}\n"))
+            else:
+                pieces.append(piece)
+
+        return pieces
+
+    def split_function(self, item: ParsedItem, source: str = None, context: str = "") -> list[ParsedItem]:
+        """
+        Fragments of a function, each a run of top level statements under
+        max_tokens. The first keeps the signature, after any context, and the last
+        the closing brace.
+        """
+        source = (source or item.source).strip("\n")
+        span = body_span(source)
+        if span is None:
+            return [item]
+
+        statements = segments(source, *span)
+        if len(statements) <= 1:
+            return [item]
+
+        chunks = [[]]
+        for statement in statements:
+            if chunks[-1] and self.oversized("".join(chunks[-1] + [statement])):
+                chunks.append([])
+            chunks[-1].append(statement)
+
+        if len(chunks) == 1:
+            return [item]
+
+        header = source[: span[0]]
+        fragments = []
+
+        for number, chunk in enumerate(chunks):
+            body = "".join(chunk).strip("\n")
+            if number == 0:
+                body = f"{context}{header}\n{body}"
+            if number == len(chunks) - 1:
+                body = f"{body}\n}}"
+
+            fragments.append(ParsedItem(name=item.name, type="fragment", source=body, receiver=item.receiver))
+
+        return fragments
+
+    def stats(self) -> dict:
+        return {"items split": self.split_items, "pieces from split items": self.pieces}
@@ -0,0 +1,127 @@
+from dataclasses import dataclass
+from functools import partial
+import json
+import re
+
+from gen.openapi_adaptor import Question
+from gen.parsers.common import ConvertedCode
+from gen.parsers.go import GoParser
+
+KINDS = ("func", "method", "type", "const", "var")
+
+JSON_BLOCK = re.compile(r"```(?:json)?[^\n]*\n(.*?)```", re.S)
+
+INSTRUCTIONS = (
+    "Answer with a JSON object only, no markdown, of the form "
+    '{"decls": [{"name": ..., "kind": ..., "receiver": ..., "source": ...}], "imports": [...]}. '
+    "Each converted top level declaration is one entry in decls: name is its name, kind is one of "
+    f"{', '.join(KINDS)}, receiver is the receiver type of a method without the * or null, and "
+    "source is the complete declaration including its doc comment. imports lists the import paths "
+    "the declarations need. Do not include a package clause, import statements or a main function."
+)
+
+
+@dataclass
+class Decl:
+    name: str
+    kind: str
+    source: str
+    receiver: str = None
+
+
+@dataclass
+class StructuredResponse:
+    decls: list[Decl]
+    imports: list[str]
+
+
+def parse_structured(response: str) -> StructuredResponse | None:
+    """
+    Read a response in the JSON format asked for by INSTRUCTIONS, a JSON object in
+    a code block is accepted too. Returns None if the response is not JSON or does
+    not match the schema, so the caller can fall back to reading it as markdown.
+    """
+    data = load_json(response)
+    if not isinstance(data, dict) or not isinstance(data.get("decls"), list):
+        return None
+
+    imports = data.get("imports") or []
+    if not isinstance(imports, list) or not all(isinstance(path, str) for path in imports):
+        return None
+
+    decls = [read_decl(decl) for decl in data["decls"]]
+    if not decls or None in decls:
+        return None
+
+    return StructuredResponse(decls, [path.strip() for path in imports if path.strip()])
+
+
+def load_json(response: str):
+    """
+    The response parsed as JSON, or the first JSON code block in it, None if neither parses.
+    """
+    try:
+        return json.loads(response)
+    except (TypeError, ValueError):
+        pass
+
+    block = JSON_BLOCK.search(response or "")
+    if block is None:
+        return None
+
+    try:
+        return json.loads(block.group(1))
+    except ValueError:
+        return None
+
+
+def read_decl(decl) -> Decl | None:
+    if not isinstance(decl, dict):
+        return None
+
+    name, kind, source = decl.get("name"), decl.get("kind"), decl.get("source")
+    receiver = decl.get("receiver") or None
+
+    if not isinstance(name, str) or kind not in KINDS or not isinstance(source, str) or not source.strip():
+        return None
+
+    if receiver is not None and not isinstance(receiver, str):
+        return None
+
+    return Decl(name, kind, source.strip("\n"), receiver and receiver.lstrip("*"))
+
+
+def select_decls(structured: StructuredResponse, question: Question) -> list[Decl]:
+    """
+    The declarations that answer the question, picked the same way
+    GoParser.get_code_and_imports picks items from a code block.
+    """
+    name = question.get_name()
+    _match_name = partial(GoParser.match_name, name, name.lower())
+    type_name = getattr(question, "type_name", None)
+
+    decls = [decl for decl in structured.decls if decl.name != "main"]
+
+    if type_name == "file":
+        return decls
+
+    selected = [
+        decl
+        for decl in decls
+        if _match_name(decl.name) or (type_name == "impl_group" and _match_name(decl.receiver))
+    ]
+
+    if not selected:
+        functions = [decl for decl in decls if decl.kind in ("func", "method")]
+        if len(functions) == 1:
+            selected = functions
+
+    return selected
+
+
+def to_converted_code(structured: StructuredResponse, question: Question) -> ConvertedCode | None:
+    decls = select_decls(structured, question)
+    if not decls:
+        return None
+
+    return ConvertedCode("\n\n".join(decl.source for decl in decls), structured.imports)
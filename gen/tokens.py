@@ -0,0 +1,15 @@
+CHARS_PER_TOKEN = 4
+
+# per message overhead of the chat format, role markers and separators
+MESSAGE_OVERHEAD = 4
+
+
+def estimate_tokens(text: str) -> int:
+    """
+    A rough token count, good enough for budgeting without a tokenizer dependency.
+    """
+    return len(text or "") // CHARS_PER_TOKEN + 1
+
+
+def estimate_message_tokens(messages: list[dict]) -> int:
+    return sum(estimate_tokens(message.get("content")) + MESSAGE_OVERHEAD for message in messages)
@@ -0,0 +1,46 @@
+from dataclasses import dataclass
+from os import getenv
+
+import httpx
+from openai import AsyncOpenAI
+
+ORG_ID = getenv("OPENAI_ORG_ID")
+
+
+@dataclass
+class ClientSettings:
+    """
+    How an OpenAIModel connects to its endpoint. Connections are pooled and kept
+    alive so a run with hundreds of concurrent completions reuses warm ones.
+    HTTP/2 needs the h2 package (httpx[http2]).
+    """
+
+    api_key: str = None
+    organization: str = ORG_ID
+    base_url: str = None
+    max_connections: int = 256
+    max_keepalive_connections: int = 64
+    keepalive_expiry: float = 30.0
+    http2: bool = False
+    connect_timeout: float = 10.0
+    read_timeout: float = 600.0
+
+    def build(self) -> AsyncOpenAI:
+        http_client = httpx.AsyncClient(
+            limits=httpx.Limits(
+                max_connections=self.max_connections,
+                max_keepalive_connections=self.max_keepalive_connections,
+                keepalive_expiry=self.keepalive_expiry,
+            ),
+            timeout=httpx.Timeout(self.read_timeout, connect=self.connect_timeout),
+            http2=self.http2,
+        )
+
+        return AsyncOpenAI(
+            api_key=self.api_key or getenv("OPENAI_API_KEY"),
+            organization=self.organization,
+            base_url=self.base_url or getenv("OPENAI_BASE_URL"),
+            http_client=http_client,
+            # OpenAIModel has its own retry policy, don't retry twice
+            max_retries=0,
+        )
@@ -1,13 +1,17 @@
 package main
 
 import (
+	"bufio"
 	"encoding/json"
+	"flag"
 	"fmt"
 	"go/ast"
 	"go/parser"
 	"go/token"
 	"log"
+	"io"
 	"os"
+	"strconv"
 	"strings"
 )
 
@@ -16,30 +20,158 @@ type Item struct {
     ItemType string `json:"type"`
     Source   string `json:"source"`
     Receiver string `json:"receiver,omitempty"`
+    Span     Span   `json:"-"`
+}
+
+// Span locates an item's source as byte offsets into the parsed file, Prefix
+// is literal text that goes in front of it, e.g. the "type " keyword of a
+// type spec declared inside a group.
+type Span struct {
+    Prefix string
+    Start  int
+    End    int
+}
+
+func (s Span) text(source []byte) string {
+    return s.Prefix + string(source[s.Start:s.End])
+}
+
+// compact encodes an item as [name, type, start, end, receiver, prefix].
+func (item Item) compact() []interface{} {
+    return []interface{}{item.Name, item.ItemType, item.Span.Start, item.Span.End, item.Receiver, item.Span.Prefix}
+}
+
+// withSources copies each item's source text out of the file.
+func withSources(items []Item, source []byte) []Item {
+    for idx := range items {
+        items[idx].Source = items[idx].Span.text(source)
+    }
+    return items
+}
+
+func marshalItems(items []Item, source []byte, spans bool) ([]byte, error) {
+    if !spans {
+        return json.Marshal(withSources(items, source))
+    }
+
+    rows := make([][]interface{}, len(items))
+    for idx, item := range items {
+        rows[idx] = item.compact()
+    }
+    return json.Marshal(rows)
 }
 
 func main() {
-    if len(os.Args) < 2 {
-        fmt.Println("Usage: go run main.go <filename>")
+    server := flag.Bool("server", false, "read length-framed sources from stdin and write length-framed JSON to stdout")
+    spans := flag.Bool("spans", false, "emit compact [name, type, start, end, receiver, prefix] rows instead of sources")
+    flag.Parse()
+
+    if *server {
+        serve(os.Stdin, os.Stdout, *spans)
+        return
+    }
+
+    if flag.NArg() < 1 {
+        fmt.Println("Usage: go run main.go [-server] [-spans] <filename>")
         os.Exit(1)
     }
 
-    filename := os.Args[1]
+    filename := flag.Arg(0)
     source, err := os.ReadFile(filename)
     if err != nil {
         log.Fatal(err)
     }
 
-    fset := token.NewFileSet()
-    node, err := parser.ParseFile(fset, filename, nil, parser.ParseComments)
+    items, err := parseSource(filename, source)
     if err != nil {
         fmt.Println("Error parsing file:", err)
         os.Exit(1)
     }
 
-    var items []Item
+    var jsonOutput []byte
+    if *spans {
+        jsonOutput, err = marshalItems(items, source, true)
+    } else {
+        jsonOutput, err = json.MarshalIndent(withSources(items, source), "", "  ")
+    }
+    if err != nil {
+        fmt.Println("Error marshalling to JSON:", err)
+        os.Exit(1)
+    }
+
+    fmt.Println(string(jsonOutput))
+}
+
+// serve handles requests until stdin is closed. Every frame is a decimal byte
+// count on its own line followed by that many bytes. Requests carry Go source,
+// responses carry either the JSON item list or {"error": "..."}.
+func serve(in io.Reader, out io.Writer, spans bool) {
+    reader := bufio.NewReader(in)
+    writer := bufio.NewWriter(out)
+
+    for {
+        source, err := readFrame(reader)
+        if err == io.EOF {
+            return
+        }
+        if err != nil {
+            log.Fatal(err)
+        }
+
+        var response []byte
+        items, err := parseSource("source.go", source)
+        if err == nil {
+            response, err = marshalItems(items, source, spans)
+        }
+        if err != nil {
+            response, _ = json.Marshal(map[string]string{"error": err.Error()})
+        }
+
+        if err := writeFrame(writer, response); err != nil {
+            log.Fatal(err)
+        }
+    }
+}
+
+func readFrame(reader *bufio.Reader) ([]byte, error) {
+    header, err := reader.ReadString('\n')
+    if err != nil {
+        return nil, err
+    }
+
+    size, err := strconv.Atoi(strings.TrimSpace(header))
+    if err != nil {
+        return nil, fmt.Errorf("invalid frame header %q", header)
+    }
+
+    payload := make([]byte, size)
+    if _, err := io.ReadFull(reader, payload); err != nil {
+        return nil, err
+    }
+
+    return payload, nil
+}
+
+func writeFrame(writer *bufio.Writer, payload []byte) error {
+    if _, err := fmt.Fprintf(writer, "%d\n", len(payload)); err != nil {
+        return err
+    }
+    if _, err := writer.Write(payload); err != nil {
+        return err
+    }
+    return writer.Flush()
+}
+
+func parseSource(filename string, source []byte) ([]Item, error) {
+    fset := token.NewFileSet()
+    node, err := parser.ParseFile(fset, filename, source, parser.ParseComments)
+    if err != nil {
+        return nil, err
+    }
+
+    items := []Item{}
     seenNames := map[string]bool{}
-    var imports []string
+    imports := []string{}
 
     for _, decl := range node.Decls {
         var item Item
@@ -50,7 +182,7 @@ func main() {
                 case *ast.TypeSpec:
                     item.Name = s.Name.Name
                     item.ItemType = "Type"
-                    item.Source = getTypeSource(source, spec, fset)
+                    item.Span = getTypeSpan(spec, fset)
                 case *ast.ValueSpec:
                     for _, name := range s.Names {
                         if seenNames[name.Name] {
@@ -59,7 +191,7 @@ func main() {
                         seenNames[name.Name] = true
                         item.Name = name.Name
                         item.ItemType = "Value"
-                        item.Source = getValueSource(source, spec, fset)
+                        item.Span = getValueSpan(spec, fset)
                         items = append(items, item)
                     }
                     continue
@@ -79,7 +211,7 @@ func main() {
         case *ast.FuncDecl:
             item.Name = d.Name.Name
             item.ItemType = "Function"
-            item.Source, item.Receiver = getFunctionSource(source, decl, fset)
+            item.Span, item.Receiver = getFunctionSpan(decl, fset)
         default:
             println("Unknown decl type")
         }
@@ -94,19 +226,14 @@ func main() {
         }
     }
 
-    items = append(items, Item{Name: "import", ItemType: "import", Source: strings.Join(imports, ",")})
+    joined := strings.Join(imports, ",")
+    items = append(items, Item{Name: "import", ItemType: "import", Span: Span{Prefix: joined}})
 
-    jsonOutput, err := json.MarshalIndent(items, "", "  ")
-    if err != nil {
-        fmt.Println("Error marshalling to JSON:", err)
-        os.Exit(1)
-    }
-
-    fmt.Println(string(jsonOutput))
+    return items, nil
 }
 
 
-func getFunctionSource(source []uint8, decl ast.Decl, fset *token.FileSet) (string, string) {
+func getFunctionSpan(decl ast.Decl, fset *token.FileSet) (Span, string) {
     if fn, isFn := decl.(*ast.FuncDecl); isFn {
         // Check if the function has a receiver
         var receiver string
@@ -129,10 +256,10 @@ func getFunctionSource(source []uint8, decl ast.Decl, fset *token.FileSet) (stri
 
         endPos := fset.Position(fn.End())
 
-        // Extract the source code for the function
-        return string(source[startPos:endPos.Offset]), receiver
+        // Locate the source code for the function
+        return Span{Start: startPos, End: endPos.Offset}, receiver
     }
-    return "", ""
+    return Span{}, ""
 }
 
 /*
@@ -160,7 +287,7 @@ func getSource(source []byte, spec ast.Spec, fset *token.FileSet) string {
     return string(source[startOffset:endOffset])
 }*/
 
-func getValueSource(source []uint8, spec ast.Spec, fset *token.FileSet) string {
+func getValueSpan(spec ast.Spec, fset *token.FileSet) Span {
     if valueSpec, isValueSpec := spec.(*ast.ValueSpec); isValueSpec {
         startPos := fset.Position(valueSpec.Pos()).Offset
         var prefix string
@@ -181,14 +308,14 @@ func getValueSource(source []uint8, spec ast.Spec, fset *token.FileSet) string {
 
         endPos := fset.Position(valueSpec.End())
 
-        // Extract the source code for the type definition
-        return prefix + string(source[startPos:endPos.Offset])
+        // Locate the source code for the type definition
+        return Span{Prefix: prefix, Start: startPos, End: endPos.Offset}
     }
     
-    return ""
+    return Span{}
 }
 
-func getTypeSource(source []uint8, spec ast.Spec, fset *token.FileSet) string {
+func getTypeSpan(spec ast.Spec, fset *token.FileSet) Span {
     if typeSpec, isTypeSpec := spec.(*ast.TypeSpec); isTypeSpec {
         startPos := fset.Position(typeSpec.Pos()).Offset
         var prefix string
@@ -207,11 +334,11 @@ func getTypeSource(source []uint8, spec ast.Spec, fset *token.FileSet) string {
 
         endPos := fset.Position(typeSpec.End())
 
-        // Extract the source code for the type definition
-        return prefix + string(source[startPos:endPos.Offset])
+        // Locate the source code for the type definition
+        return Span{Prefix: prefix, Start: startPos, End: endPos.Offset}
     }
     
-    return ""
+    return Span{}
 }
 
 func exprToString(expr ast.Expr) string {
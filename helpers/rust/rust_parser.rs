@@ -5,137 +5,258 @@ use proc_macro2::Span;
 use std::env;
 use std::fs;
 use std::fmt;
+use std::io::{self, BufRead, Write};
 use std::path::Path;
-use serde::Serialize;
+use serde::{Deserialize, Serialize};
 use serde_json;
 
-#[derive(Serialize)]
 struct ModuleObject {
     name: String,
-    #[serde(rename = "type")]
     kind: String,
-    source: String,
+    span: (usize, usize),
     receiver: Option<String>,
 }
 
-#[derive(Serialize)]
-struct ImplDetails {
-    impl_for: String,
-    methods: Vec<ModuleObject>,
+impl ModuleObject {
+    // Either the full {"name", "type", "source", "receiver"} object or, when
+    // spans is set, a compact [name, type, start, end, receiver, prefix] row
+    // with byte offsets into the parsed source.
+    fn to_json(&self, content: &str, spans: bool) -> serde_json::Value {
+        if spans {
+            serde_json::json!([self.name, self.kind, self.span.0, self.span.1, self.receiver, ""])
+        } else {
+            serde_json::json!({
+                "name": self.name,
+                "type": self.kind,
+                "source": &content[self.span.0..self.span.1],
+                "receiver": self.receiver,
+            })
+        }
+    }
 }
 
-fn extract_source_code(span: Span, file_content: &str) -> String {
-    let start = span.start().line - 1; // Line numbers in Span are 1-indexed
-    let end = span.end().line;
+// Maps a syntax span to the byte range of the whole lines it covers.
+struct LineIndex {
+    starts: Vec<usize>,
+    len: usize,
+}
+
+impl LineIndex {
+    fn new(content: &str) -> Self {
+        let mut starts = vec![0];
+        starts.extend(content.match_indices('\n').map(|(idx, _)| idx + 1));
+        LineIndex { starts, len: content.len() }
+    }
+
+    fn span(&self, span: Span) -> (usize, usize) {
+        let start = self.starts[span.start().line - 1]; // Line numbers in Span are 1-indexed
+        let end = match self.starts.get(span.end().line) {
+            Some(next_line) => next_line - 1,
+            None => self.len,
+        };
 
-    file_content.lines()
-        .skip(start)
-        .take(end - start)
-        .collect::<Vec<&str>>()
-        .join("\n")
+        (start, end)
+    }
 }
 
 fn type_to_string(ty: &Box<Type>) -> String {
     ty.to_token_stream().to_string()
 }
 
-fn main() {
-    let args: Vec<String> = env::args().collect();
-    if args.len() != 2 {
-        eprintln!("Usage: rust_parser <file_path>");
-        std::process::exit(1);
+#[derive(Deserialize)]
+struct ParseRequest {
+    id: serde_json::Value,
+    source: Option<String>,
+    path: Option<String>,
+}
+
+#[derive(Serialize)]
+struct ParseResponse {
+    id: serde_json::Value,
+    #[serde(skip_serializing_if = "Option::is_none")]
+    items: Option<Vec<serde_json::Value>>,
+    #[serde(skip_serializing_if = "Option::is_none")]
+    error: Option<String>,
+}
+
+impl ParseResponse {
+    fn new(id: serde_json::Value, result: Result<Vec<serde_json::Value>, String>) -> Self {
+        match result {
+            Ok(items) => ParseResponse { id, items: Some(items), error: None },
+            Err(error) => ParseResponse { id, items: None, error: Some(error) },
+        }
     }
+}
 
-    let file_path = Path::new(&args[1]);
+fn print_response(response: &ParseResponse) {
+    let stdout = io::stdout();
+    let mut out = stdout.lock();
+    writeln!(out, "{}", serde_json::to_string(response).unwrap()).unwrap();
+    out.flush().unwrap();
+}
+
+fn parse_path(path: &str, spans: bool) -> Result<Vec<serde_json::Value>, String> {
+    let file_path = Path::new(path);
     if !file_path.exists() {
-        eprintln!("File does not exist: {}", file_path.display());
+        return Err(format!("File does not exist: {}", file_path.display()));
+    }
+
+    let content = fs::read_to_string(file_path).map_err(|err| err.to_string())?;
+    parse_source(&content, spans)
+}
+
+// Reads one JSON request per line from stdin, {"id": .., "source": ..} or
+// {"id": .., "path": ..}, and writes one JSON response per line.
+fn serve_ndjson(spans: bool) {
+    let stdin = io::stdin();
+
+    for line in stdin.lock().lines() {
+        let line = line.expect("Error reading stdin");
+        if line.trim().is_empty() {
+            continue;
+        }
+
+        let response = match serde_json::from_str::<ParseRequest>(&line) {
+            Ok(request) => {
+                let result = match (request.source, request.path) {
+                    (Some(source), _) => parse_source(&source, spans),
+                    (None, Some(path)) => parse_path(&path, spans),
+                    (None, None) => Err("Request has neither source nor path".to_string()),
+                };
+                ParseResponse::new(request.id, result)
+            },
+            Err(err) => ParseResponse::new(serde_json::Value::Null, Err(err.to_string())),
+        };
+
+        print_response(&response);
+    }
+}
+
+fn main() {
+    let mut args: Vec<String> = env::args().skip(1).collect();
+
+    let spans = args.iter().any(|arg| arg == "--spans");
+    args.retain(|arg| arg != "--spans");
+
+    if args.is_empty() {
+        eprintln!("Usage: rust_parser [--spans] <file_path>... | rust_parser [--spans] --ndjson");
         std::process::exit(1);
     }
 
-    let content = fs::read_to_string(file_path).expect("Error reading file");
-    let syntax_tree = parse_file(&content).expect("Error parsing file");
+    if args[0] == "--ndjson" {
+        serve_ndjson(spans);
+        return;
+    }
+
+    // a single file keeps the original output, a plain JSON array of items
+    if args.len() == 1 {
+        match parse_path(&args[0], spans) {
+            Ok(module_objects) => println!("{}", serde_json::to_string(&module_objects).unwrap()),
+            Err(err) => {
+                eprintln!("{}", err);
+                std::process::exit(1);
+            }
+        }
+        return;
+    }
+
+    for path in args {
+        let id = serde_json::Value::String(path.clone());
+        print_response(&ParseResponse::new(id, parse_path(&path, spans)));
+    }
+}
+
+fn parse_source(content: &str, spans: bool) -> Result<Vec<serde_json::Value>, String> {
+    let module_objects = parse_items(content)?;
+
+    Ok(module_objects.iter().map(|item| item.to_json(content, spans)).collect())
+}
+
+fn parse_items(content: &str) -> Result<Vec<ModuleObject>, String> {
+    let syntax_tree = parse_file(content).map_err(|err| format!("Error parsing file: {}", err))?;
+    let lines = LineIndex::new(content);
 
     let mut module_objects = Vec::new();
 
     for item in syntax_tree.items {
-        let (name, kind, source) = match item {
+        let (name, kind, span) = match item {
             Item::Use(item_use) => {
-                let source_code = extract_source_code(item_use.span(), &content);
-                (item_use.tree.into_token_stream().to_string(), "use".to_string(), source_code)
+                let source_span = lines.span(item_use.span());
+                (item_use.tree.into_token_stream().to_string(), "use".to_string(), source_span)
             },
             Item::Struct(item_struct) => {
-                let source_code = extract_source_code(item_struct.span(), &content);
-                (item_struct.ident.to_string(), "struct".to_string(), source_code)
+                let source_span = lines.span(item_struct.span());
+                (item_struct.ident.to_string(), "struct".to_string(), source_span)
             },
             Item::Fn(item_fn) => {
-                let source_code = extract_source_code(item_fn.span(), &content);
-                (item_fn.sig.ident.to_string(), "function".to_string(), source_code)
+                let source_span = lines.span(item_fn.span());
+                (item_fn.sig.ident.to_string(), "function".to_string(), source_span)
             },
             Item::Mod(item_mod) => {
-                let source_code = extract_source_code(item_mod.span(), &content);
-                (item_mod.ident.to_string(), "module".to_string(), source_code)
+                let source_span = lines.span(item_mod.span());
+                (item_mod.ident.to_string(), "module".to_string(), source_span)
             },
             Item::Const(item_const) => {
-                let source_code = extract_source_code(item_const.span(), &content);
-                (item_const.ident.to_string(), "const".to_string(), source_code)
+                let source_span = lines.span(item_const.span());
+                (item_const.ident.to_string(), "const".to_string(), source_span)
             },
             Item::Trait(item_trait) => {
-                let source_code = extract_source_code(item_trait.span(), &content);
-                (item_trait.ident.to_string(), "trait".to_string(), source_code)
+                let source_span = lines.span(item_trait.span());
+                (item_trait.ident.to_string(), "trait".to_string(), source_span)
             },
             Item::Enum(item_enum) => {
-                let source_code = extract_source_code(item_enum.span(), &content);
-                (item_enum.ident.to_string(), "enum".to_string(), source_code)
+                let source_span = lines.span(item_enum.span());
+                (item_enum.ident.to_string(), "enum".to_string(), source_span)
             },
             Item::Macro(item_macro) => {
-                let source_code = extract_source_code(item_macro.span(), &content);
+                let source_span = lines.span(item_macro.span());
                 match item_macro.ident {
-                    Some(ident) => (ident.to_string(), "macro".to_string(), source_code),
-                    None => ("unknown macro".to_string(), "macro".to_string(), source_code)
+                    Some(ident) => (ident.to_string(), "macro".to_string(), source_span),
+                    None => ("unknown macro".to_string(), "macro".to_string(), source_span)
                 }
             },
             Item::Static(item_static) => {
-                let source_code = extract_source_code(item_static.span(), &content);
-                (item_static.ident.to_string(), "static".to_string(), source_code)
+                let source_span = lines.span(item_static.span());
+                (item_static.ident.to_string(), "static".to_string(), source_span)
             },
             Item::Union(item_union) => {
-                let source_code = extract_source_code(item_union.span(), &content);
-                (item_union.ident.to_string(), "union".to_string(), source_code)
+                let source_span = lines.span(item_union.span());
+                (item_union.ident.to_string(), "union".to_string(), source_span)
             },
             Item::Type(item_type) => {
-                let source_code = extract_source_code(item_type.span(), &content);
-                (item_type.ident.to_string(), "type".to_string(), source_code)
+                let source_span = lines.span(item_type.span());
+                (item_type.ident.to_string(), "type".to_string(), source_span)
             },
             Item::Impl(item_impl) => {
                 let impl_name = type_to_string(&item_impl.self_ty);
-                let source_code = extract_source_code(item_impl.span(), &content);
+                let source_span = lines.span(item_impl.span());
 
                 //let mut methods = Vec::new();
 
                 for impl_item in item_impl.items {
                     if let ImplItem::Method(method) = impl_item {
                         let method_name = method.sig.ident.to_string();
-                        let source_code = extract_source_code(method.span(), &content);
+                        let source_span = lines.span(method.span());
                         module_objects.push(ModuleObject {
                             name: method_name,
                             kind: "method".to_string(),
-                            source: source_code,
+                            span: source_span,
                             receiver: Some(impl_name.clone()),
                         });
                     }
                 }
 
-                (impl_name, "impl".to_string(), source_code)
+                (impl_name, "impl".to_string(), source_span)
             },
             _ => {
-                let source_code = extract_source_code(item.span(), &content);
+                let source_span = lines.span(item.span());
                 let name = fmt::format(format_args!("{:?}", item));
-                (name.to_string(), "item".to_string(), source_code)
+                (name.to_string(), "item".to_string(), source_span)
             }
         };
 
-        module_objects.push(ModuleObject { name, kind, source, receiver: None });
+        module_objects.push(ModuleObject { name, kind, span, receiver: None });
     }
 
-    println!("{}", serde_json::to_string(&module_objects).unwrap());
+    Ok(module_objects)
 }
\ No newline at end of file
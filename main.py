@@ -1,9 +1,24 @@
 import argparse
 from asyncio import run
+import json
+from os import getenv
+from pathlib import Path
 
-from gen.convert_source_language import LanguageConverter
+from gen.backends import Backend, MultiBackendModel
+from gen.batch import BatchRunner, OpenAIBatchClient
+from gen.compression import PromptCompressor
+from gen.concurrency import AdaptiveConcurrency
+from gen.convert_source_language import LanguageConverter, markdown_names
 from gen.enums import Language
-from gen.openapi_adaptor import OpenAIModel
+from gen.hedging import HedgePolicy
+from gen.memory import TranslationMemory
+from gen.packing import PromptPacker
+from gen.parsers.rust import GRANULARITIES
+from gen.openapi_adaptor import JSON_OUTPUT, CacheMode, OpenAIModel
+from gen.rate_limit import RateLimiter
+from gen.routing import ModelRouter, Tier
+from gen.splitting import ItemSplitter
+from gen.transport import ClientSettings
 
 
 async def main():
@@ -35,6 +50,191 @@ async def main():
         default="gpt-4-0125-preview",
         help="OpenAI model to use (default: gpt-4-0125-preview)",
     )
+    parser.add_argument(
+        "--no-cache",
+        action="store_const",
+        dest="cache_mode",
+        const=CacheMode.BYPASS,
+        default=CacheMode.USE,
+        help="Neither read nor write the response cache",
+    )
+    parser.add_argument(
+        "--refresh-cache",
+        action="store_const",
+        dest="cache_mode",
+        const=CacheMode.REFRESH,
+        help="Ignore cached responses but store the new ones",
+    )
+    parser.add_argument(
+        "--rpm",
+        type=float,
+        default=None,
+        help="Requests per minute allowed for the model (default: unlimited)",
+    )
+    parser.add_argument(
+        "--tpm",
+        type=float,
+        default=None,
+        help="Tokens per minute allowed for the model (default: unlimited)",
+    )
+    parser.add_argument(
+        "--max-concurrency",
+        type=int,
+        default=256,
+        help="Upper bound for the adaptive number of requests in flight (default: 256)",
+    )
+    parser.add_argument(
+        "--stream",
+        action="store_true",
+        help="Stream completions instead of waiting for the whole response",
+    )
+    parser.add_argument(
+        "--stream-cutoff",
+        action="store_true",
+        help="Stop streaming once the code block for the item has been received",
+    )
+    parser.add_argument(
+        "--hedge",
+        action="store_true",
+        help="Send a duplicate request when a completion runs unusually long",
+    )
+    parser.add_argument(
+        "--hedge-percentile",
+        type=float,
+        default=0.95,
+        help="Latency percentile after which a request is hedged (default: 0.95)",
+    )
+    parser.add_argument(
+        "--hedge-budget",
+        type=float,
+        default=0.05,
+        help="Maximum fraction of requests that may be hedged (default: 0.05)",
+    )
+    parser.add_argument(
+        "--candidates",
+        type=int,
+        default=1,
+        help="Candidates requested per item, the first that parses is used (default: 1)",
+    )
+    parser.add_argument(
+        "--base-url",
+        default=None,
+        help="Base URL of an OpenAI compatible API (default: OPENAI_BASE_URL or OpenAI)",
+    )
+    parser.add_argument(
+        "--max-connections",
+        type=int,
+        default=256,
+        help="Size of the HTTP connection pool (default: 256)",
+    )
+    parser.add_argument(
+        "--keepalive",
+        type=float,
+        default=30.0,
+        help="Seconds an idle connection is kept open (default: 30)",
+    )
+    parser.add_argument(
+        "--http2",
+        action="store_true",
+        help="Use HTTP/2, requires httpx[http2]",
+    )
+    parser.add_argument(
+        "--connect-timeout",
+        type=float,
+        default=10.0,
+        help="Connect timeout in seconds (default: 10)",
+    )
+    parser.add_argument(
+        "--read-timeout",
+        type=float,
+        default=600.0,
+        help="Read timeout in seconds (default: 600)",
+    )
+    parser.add_argument(
+        "--backends",
+        default=None,
+        help="JSON file listing OpenAI compatible endpoints to spread requests over, each with "
+        "name, base_url, model and optionally api_key_env, weight, rpm, tpm and max_concurrency",
+    )
+    parser.add_argument(
+        "--batch",
+        action="store_true",
+        help="Submit every item through the batch API instead of live calls and wait for the results",
+    )
+    parser.add_argument(
+        "--batch-file",
+        default=None,
+        help="Base name of the batch request files, each set of requests gets its own file beside it (default: DEST/batch/requests.jsonl)",
+    )
+    parser.add_argument(
+        "--batch-poll-interval",
+        type=float,
+        default=60.0,
+        help="Seconds between checks on a submitted batch (default: 60)",
+    )
+    parser.add_argument(
+        "--tier",
+        action="append",
+        type=parse_tier,
+        default=[],
+        metavar="MODEL:MAX_SCORE[:RPM:TPM]",
+        help="Send items scoring up to MAX_SCORE to MODEL, may be repeated. "
+        "Items above every tier go to --model. RPM and TPM are the tier's own limits, tiers without them "
+        "share --rpm and --tpm evenly with --model",
+    )
+    parser.add_argument(
+        "--no-fast-path",
+        action="store_false",
+        dest="fast_path",
+        help="Send consts, plain structs and C-like enums to the model instead of translating them directly",
+    )
+    parser.add_argument(
+        "--memory",
+        action="append",
+        default=[],
+        metavar="DIR",
+        help="Folder of logged conversions to reuse near duplicates from, may be repeated. Needs numpy",
+    )
+    parser.add_argument(
+        "--pack",
+        type=int,
+        default=0,
+        metavar="N",
+        help="Send up to N small items in a single request (default: off)",
+    )
+    parser.add_argument(
+        "--max-item-tokens",
+        type=int,
+        default=None,
+        help="Split items estimated to be larger than this many tokens into pieces, structs and files over "
+        "it are not grouped (default: off)",
+    )
+    parser.add_argument(
+        "--granularity",
+        choices=GRANULARITIES,
+        default="method",
+        help="Convert each method, each struct with its impls, or each file in one request, "
+        "auto picks by size. The fast path, translation memory and packing do not apply to grouped items "
+        "(default: method)",
+    )
+    parser.add_argument(
+        "--compress",
+        action="store_true",
+        help="Strip comments, blank lines and attribute noise from the source sent to the model, "
+        "doc comments are put back on the converted code",
+    )
+    parser.add_argument(
+        "--no-import-context",
+        action="store_false",
+        dest="import_context",
+        help="Do not tell the model which of the file's imports each item uses",
+    )
+    parser.add_argument(
+        "--structured",
+        action="store_true",
+        help="Ask for JSON responses listing each declaration, assembled without parsing them, "
+        "responses that are not valid JSON are read as markdown",
+    )
     parser.add_argument(
         "--exclude",
         nargs="+",
@@ -44,13 +244,131 @@ async def main():
 
     args = parser.parse_args()
 
+    # tiers without limits of their own share the global budget with --model
+    shared = 1 + sum(1 for *_, rpm, tpm in args.tier if rpm is None)
+    limits = {
+        "rpm": args.rpm / shared if args.rpm else None,
+        "tpm": args.tpm / shared if args.tpm else None,
+    }
+
+    if args.backends:
+        with open(args.backends) as f:
+            backends = [
+                Backend(make_model(args, **config), weight=config.get("weight", 1.0))
+                for config in json.load(f)
+            ]
+        model = MultiBackendModel(backends)
+    else:
+        model = make_model(args, **limits)
+
+    if args.tier:
+        tiers = [
+            Tier(
+                name,
+                make_model(
+                    args,
+                    name=f"{args.model_name}-{name}",
+                    model=name,
+                    **(limits if rpm is None else {"rpm": rpm, "tpm": tpm}),
+                ),
+                max_score,
+            )
+            for name, max_score, rpm, tpm in args.tier
+        ]
+        model = ModelRouter(tiers + [Tier(args.model, model)])
+
+    batch = None
+    if args.batch:
+        batch = BatchRunner(
+            OpenAIBatchClient(make_settings(args).build()),
+            args.model,
+            args.batch_file or Path(args.dest) / "batch" / "requests.jsonl",
+            params=JSON_OUTPUT if args.structured else None,
+            poll_interval=args.batch_poll_interval,
+        )
+
+    memory = None
+    if args.memory:
+        memory = TranslationMemory()
+        for directory in args.memory:
+            print(f"loaded {memory.load(directory)} conversions from {directory}")
+
     converter = LanguageConverter(
         args.src_lang,
         args.dest_lang,
-        OpenAIModel(args.model_name, model=args.model),
+        model,
+        candidates=args.candidates,
+        batch=batch,
+        fast_path=args.fast_path,
+        memory=memory,
+        packer=PromptPacker(max_items=args.pack) if args.pack > 1 else None,
+        splitter=ItemSplitter(args.max_item_tokens) if args.max_item_tokens else None,
+        granularity=args.granularity,
+        compressor=PromptCompressor() if args.compress else None,
+        import_context=args.import_context,
+        structured=args.structured,
+    )
+
+    async with model:
+        await converter.convert_directory(args.src, args.dest, set(args.exclude))
+
+    if batch:
+        await batch.client.close()
+
+    for name, value in {**model.stats(), **converter.stats()}.items():
+        print(f"{name}: {value}")
+
+
+def parse_tier(value: str) -> tuple[str, float, float | None, float | None]:
+    """
+    MODEL:MAX_SCORE or MODEL:MAX_SCORE:RPM:TPM, the model name may itself contain colons.
+    """
+    parts = value.split(":")
+
+    try:
+        if len(parts) >= 4 and parts[-4]:
+            return ":".join(parts[:-3]), float(parts[-3]), float(parts[-2]), float(parts[-1])
+    except ValueError:
+        pass
+
+    model, _, max_score = value.rpartition(":")
+    try:
+        if model:
+            return model, float(max_score), None, None
+    except ValueError:
+        pass
+
+    raise argparse.ArgumentTypeError(f"expected MODEL:MAX_SCORE[:RPM:TPM], got {value}")
+
+
+def make_model(args, name: str = None, model: str = None, base_url: str = None, **config) -> OpenAIModel:
+    api_key_env = config.get("api_key_env")
+
+    return OpenAIModel(
+        name or args.model_name,
+        model=model or args.model,
+        cache_mode=args.cache_mode,
+        rate_limiter=RateLimiter(rpm=config.get("rpm", args.rpm), tpm=config.get("tpm", args.tpm)),
+        concurrency=AdaptiveConcurrency(maximum=config.get("max_concurrency", args.max_concurrency)),
+        stream=args.stream,
+        stream_cutoff=markdown_names[args.dest_lang] if args.stream_cutoff else None,
+        hedging=HedgePolicy(args.hedge_percentile, args.hedge_budget) if args.hedge else None,
+        settings=make_settings(args, getenv(api_key_env) if api_key_env else None, base_url),
+        json_output=args.structured,
     )
 
-    await converter.convert_directory(args.src, args.dest, set(args.exclude))
+
+def make_settings(args, api_key: str = None, base_url: str = None) -> ClientSettings:
+    return ClientSettings(
+        api_key=api_key,
+        base_url=base_url or args.base_url,
+        max_connections=args.max_connections,
+        max_keepalive_connections=args.max_connections,
+        keepalive_expiry=args.keepalive,
+        http2=args.http2,
+        connect_timeout=args.connect_timeout,
+        read_timeout=args.read_timeout,
+    )
 
 
 if __name__ == "__main__":
@@ -0,0 +1,35 @@
+from collections import OrderedDict
+from types import SimpleNamespace
+from unittest.mock import AsyncMock
+
+import pytest
+from gen.parsers.cache import parse_cache
+from gen.transport import ClientSettings
+
+
+@pytest.fixture(autouse=True)
+def isolated_parse_cache(tmp_path, monkeypatch):
+    """
+    Keep the shared parse cache inside the test's tmp_path instead of ~/.cache,
+    and start every test with an empty in-process cache and fresh counts.
+    """
+    monkeypatch.setattr(parse_cache, "directory", tmp_path / "parse-cache")
+    monkeypatch.setattr(parse_cache, "memory", OrderedDict())
+    monkeypatch.setattr(parse_cache, "disk_bytes", None)
+    monkeypatch.setattr(parse_cache, "hits", 0)
+    monkeypatch.setattr(parse_cache, "misses", 0)
+
+
+@pytest.fixture
+def fake_client(monkeypatch):
+    """
+    Call with a create function and every OpenAIModel built in the test gets a
+    stub client whose chat completions are answered by it.
+    """
+
+    def use(create) -> SimpleNamespace:
+        client = SimpleNamespace(chat=SimpleNamespace(completions=SimpleNamespace(create=create)), close=AsyncMock())
+        monkeypatch.setattr(ClientSettings, "build", lambda self: client)
+        return client
+
+    return use
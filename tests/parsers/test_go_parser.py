@@ -1,7 +1,10 @@
 from pathlib import Path
+
+import pytest
 from gen.convert_source_language import ParsedCode, RustQuestion
-from gen.parsers.common import TAB, extract_code_block, extract_code_blocks
+from gen.parsers.common import TAB, CodeBlockExtractor, ParsedItem, extract_code_block, extract_code_blocks
 
+from gen.parsers.cache import parse_cache
 from gen.parsers.go import GoParser
 
 
@@ -35,7 +38,29 @@ def test_make_imports():
 
 
 def test_extract_code_blocks():
-    code = """
+    blocks = list(extract_code_blocks(RESPONSE, "go"))
+
+    assert len(blocks) == 3
+
+
+def test_code_block_extractor():
+    for chunk_size in (1, 7, 64, len(RESPONSE)):
+        extractor = CodeBlockExtractor("go")
+        blocks = []
+
+        for pos in range(0, len(RESPONSE), chunk_size):
+            blocks.extend(extractor.feed(RESPONSE[pos : pos + chunk_size]))
+
+        assert blocks == list(extract_code_blocks(RESPONSE, "go"))
+        assert extractor.close() == []
+
+    extractor = CodeBlockExtractor("go")
+
+    assert extractor.feed("```go\nfunc A() {}\n") == []
+    assert extractor.close() == ["func A() {}\n"]
+
+
+RESPONSE = """
 To convert the given Rust struct to Go, we'll need to follow Go's conventions for defining types and manage...
 
 ```go
@@ -95,6 +120,48 @@ This code defines a `Monitor` struct that holds interfaces for storage and downl
     
     """
 
-    blocks = list(extract_code_blocks(code, "go"))
 
-    assert len(blocks) == 3
+def test_parse_go_code_survives_helper_crash(monkeypatch):
+    monkeypatch.setattr(parse_cache, "enabled", False)
+
+    code = "func Add(a, b int) int {\n    return a + b\n}\n"
+
+    assert GoParser.parse("func broken(") is None
+
+    results = GoParser.parse(code)
+    assert [item.name for item in results] == ["Add", "import"]
+
+    for worker in list(GoParser.pool().idle.queue):
+        worker.process.kill()
+        worker.process.wait()
+
+    results = GoParser.parse(code)
+    assert [item.name for item in results] == ["Add", "import"]
+
+
+@pytest.mark.asyncio
+async def test_parse_go_code_async():
+    go_code = FIXTURES / "rust-to-go.go"
+
+    results = await GoParser.parse_async(go_code.read_text())
+
+    assert results == GoParser.parse(go_code.read_text())
+
+
+def test_assemble_impl_group():
+    item = ParsedItem(name="Counter", type="impl_group", source="")
+    question = RustQuestion(item, ParsedCode([item]), "counter.rs")
+
+    response = (
+        "```go\npackage main\n\nimport \"fmt\"\n\ntype Counter struct {\n    count int\n}\n\n"
+        "func NewCounter() *Counter {\n    return &Counter{}\n}\n\n"
+        "func (c *Counter) Print() {\n    fmt.Println(c.count)\n}\n\nfunc main() {\n}\n```"
+    )
+
+    code = GoParser.assemble_new_code("counter", [(response, question)])
+
+    assert "type Counter struct" in code
+    assert "func NewCounter()" in code
+    assert "func (c *Counter) Print()" in code
+    assert "func main" not in code
+    assert '"fmt"' in code
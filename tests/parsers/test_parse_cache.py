@@ -0,0 +1,42 @@
+from pathlib import Path
+
+from gen.parsers.cache import ParseCache
+from gen.parsers.common import ParsedItem
+
+
+HELPER = Path(__file__)
+
+
+def make_items(count: int) -> list[ParsedItem]:
+    return [ParsedItem(name=f"item{idx}", type="function", source="x" * 100) for idx in range(count)]
+
+
+def test_parse_cache_round_trip(tmp_path):
+    cache = ParseCache(tmp_path)
+    key = cache.key("rust", HELPER, "fn a() {}")
+
+    assert cache.get(key) is None
+
+    cache.put(key, make_items(2))
+
+    assert cache.get(key) == make_items(2)
+
+    # a fresh cache only has the disk store to go on
+    assert ParseCache(tmp_path).get(key) == make_items(2)
+
+    assert cache.key("go", HELPER, "fn a() {}") != key
+    assert (cache.hits, cache.misses) == (1, 1)
+
+
+def test_parse_cache_evicts_least_recently_used(tmp_path):
+    cache = ParseCache(tmp_path, max_entries=1, max_bytes=2000)
+
+    keys = [cache.key("rust", HELPER, str(idx)) for idx in range(6)]
+    for key in keys:
+        cache.put(key, make_items(5))
+
+    files = list(tmp_path.glob("*/*.json"))
+
+    assert 0 < len(files) < len(keys)
+    assert cache.path(keys[-1]) in files
+    assert sum(f.stat().st_size for f in files) <= 2000
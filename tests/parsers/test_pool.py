@@ -0,0 +1,59 @@
+import sys
+from time import monotonic
+
+import pytest
+from gen.parsers.pool import HelperPool, HelperTimeout
+
+# echoes each frame back, a "hang" request never gets an answer
+ECHO_HELPER = """
+import sys
+
+while True:
+    header = sys.stdin.buffer.readline()
+    if not header:
+        break
+
+    payload = sys.stdin.buffer.read(int(header))
+    if payload == b"hang":
+        sys.stdin.buffer.readline()
+
+    sys.stdout.buffer.write(b"%d\\n" % len(payload) + payload)
+    sys.stdout.buffer.flush()
+"""
+
+
+def test_helper_that_does_not_answer_is_killed_and_restarted():
+    pool = HelperPool([sys.executable, "-c", ECHO_HELPER], size=1, timeout=0.5)
+
+    assert pool.request(b"first") == b"first"
+    [worker] = pool.idle.queue
+    process = worker.process
+
+    start = monotonic()
+    with pytest.raises(HelperTimeout):
+        pool.request(b"hang")
+
+    assert monotonic() - start < 5
+    assert process.poll() is not None
+    assert process.stdin.closed and process.stdout.closed
+
+    assert pool.request(b"second") == b"second"
+    assert worker.process is not process
+
+    pool.close()
+
+
+def test_crashed_helper_pipes_are_closed_on_restart():
+    pool = HelperPool([sys.executable, "-c", ECHO_HELPER], size=1)
+
+    assert pool.request(b"first") == b"first"
+    [worker] = pool.idle.queue
+    process = worker.process
+
+    process.kill()
+    process.wait()
+
+    assert pool.request(b"second") == b"second"
+    assert process.stdin.closed and process.stdout.closed
+
+    pool.close()
@@ -1,7 +1,7 @@
 from pathlib import Path
 
 import pytest
-from gen.parsers.rust import extract_imports, RustParser
+from gen.parsers.rust import expand_use, extract_imports, parse_rust_file, RustParser
 
 
 FIXTURES = Path(__file__).parent.parent / "fixtures"
@@ -122,6 +122,21 @@ def test_extract_imports():
     assert extract_imports(rust_code) == expected_output
 
 
+def test_expand_use():
+    assert expand_use("use std::path;") == ["std::path"]
+    assert expand_use("pub use std::{io::{self, Read}, fmt::Write as _};") == [
+        "std::io",
+        "std::io::Read",
+        "std::fmt::Write as _",
+    ]
+    assert expand_use("use axum::{\n    extract::State,\n    http::{header, StatusCode},\n};") == [
+        "axum::extract::State",
+        "axum::http::header",
+        "axum::http::StatusCode",
+    ]
+    assert expand_use("use super::*;") == ["super::*"]
+
+
 def test_rust_parser():
     rust_file = FIXTURES / "services"
 
@@ -136,6 +151,21 @@ def test_rust_parser():
         assert len(results) > 0
 
 
+def test_parse_many():
+    rust_files = [FIXTURES / "rust_code.rs", FIXTURES / "video_metadata.rs"]
+
+    results = RustParser.parse_many([rust_file.read_text() for rust_file in rust_files])
+
+    for rust_file, items in zip(rust_files, results):
+        assert items == parse_rust_file(rust_file)
+        assert items == RustParser.parse(rust_file.read_text())
+
+    const = results[0][0]
+
+    assert const.name == "ACCESS_DENIED_MSG"
+    assert const.source.startswith("const ACCESS_DENIED_MSG: &str")
+
+
 def test_extract_source_and_tests():
     rust_code = FIXTURES / "rust_code.rs"
 
@@ -171,10 +201,55 @@ def test_deconstruction():
 
         for method in methods:
             question = template.format(
+                struct.source,
                 first_line,
                 method.source,
             )
 
             questions.append({"question": question, "struct": struct.source})
     
-    print(questions)
\ No newline at end of file
+    print(questions)
+
+    assert questions and all(item["struct"] in item["question"] for item in questions)
+
+
+def test_enumerate_code_granularity():
+    rust_code = FIXTURES / "services" / "media_store.rs"
+
+    source, _ = RustParser.extract_source_and_tests(rust_code.read_text())
+
+    results = RustParser.parse(source)
+    struct = next(item for item in results if item.type == "struct")
+
+    methods = [item for item in RustParser.enumerate_code(results) if item.type == "method"]
+    full = [item for item in RustParser.enumerate_code(results, summarize=False) if item.type == "method"]
+
+    assert [item.name for item in methods] == [item.name for item in full]
+    assert struct.source in full[0].source
+    assert sum(len(item.source) for item in methods) < sum(len(item.source) for item in full)
+
+    (group,) = [item for item in RustParser.enumerate_code(results, "impl") if item.type == "impl_group"]
+    assert group.name == "MediaStore"
+    assert "fn as_local_path" in group.source and "fn new" in group.source
+
+    (whole, _) = RustParser.enumerate_code(results, "file")
+    assert whole.type == "file" and struct.source in whole.source
+
+    assert [item.type for item in RustParser.enumerate_code(results, "auto", file_tokens=10, impl_tokens=10)].count(
+        "method"
+    ) == len(methods)
+
+
+def test_enumerate_code_leaves_oversized_groups_as_members():
+    rust_code = FIXTURES / "services" / "media_store.rs"
+
+    source, _ = RustParser.extract_source_and_tests(rust_code.read_text())
+    results = RustParser.parse(source)
+
+    methods = [item.name for item in RustParser.enumerate_code(results) if item.type == "method"]
+
+    for granularity in ("impl", "file"):
+        items = list(RustParser.enumerate_code(results, granularity, max_tokens=10))
+
+        assert not [item for item in items if item.type in ("impl_group", "file")]
+        assert [item.name for item in items if item.type == "method"] == methods
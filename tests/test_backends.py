@@ -0,0 +1,81 @@
+import asyncio
+from unittest.mock import AsyncMock, MagicMock
+
+import pytest
+from gen.backends import Backend, MultiBackendModel
+from gen.openapi_adaptor import OpenAIModel, user_message
+
+
+def make_backend(tmp_path, name: str, call_chat, weight: float = 1.0) -> Backend:
+    model = OpenAIModel(name, log_dir=tmp_path)
+    model.call_chat = call_chat
+    return Backend(model, weight=weight)
+
+
+@pytest.mark.asyncio
+async def test_routes_by_outstanding_and_weight(tmp_path):
+    release = asyncio.Event()
+
+    async def slow(messages, question, **kwargs):
+        await release.wait()
+        return "answer", question
+
+    heavy = make_backend(tmp_path, "heavy", AsyncMock(side_effect=slow), weight=3)
+    light = make_backend(tmp_path, "light", AsyncMock(side_effect=slow))
+    model = MultiBackendModel([heavy, light])
+
+    tasks = [asyncio.ensure_future(model.call_chat([user_message(str(idx))])) for idx in range(8)]
+    for _ in range(3):
+        await asyncio.sleep(0)
+
+    assert (heavy.outstanding, light.outstanding) == (6, 2)
+
+    release.set()
+    await asyncio.gather(*tasks)
+
+    assert heavy.outstanding == light.outstanding == 0
+    assert model.stats()["backend heavy requests"] == 6
+
+
+@pytest.mark.asyncio
+async def test_fails_over_and_ejects_unhealthy_backends(tmp_path):
+    question = MagicMock()
+    broken = make_backend(tmp_path, "broken", AsyncMock(side_effect=Exception("down")), weight=10)
+    working = make_backend(tmp_path, "working", AsyncMock(return_value=("answer", question)))
+    model = MultiBackendModel([broken, working], failure_threshold=2, cooldown=60)
+
+    for idx in range(4):
+        assert await model.call_chat([user_message(str(idx))], question) == ("answer", question)
+
+    # ejected after two failures, later requests skip it
+    assert broken.requests == 2 and not broken.healthy
+    assert working.requests == 4
+    assert model.stats()["backend failovers"] == 2
+    assert model.stats()["backend broken ejected"] == 1
+
+    working.model.call_chat.side_effect = Exception("also down")
+    with pytest.raises(Exception, match="down"):
+        await model.call_chat([user_message("last")], question)
+
+
+@pytest.mark.asyncio
+async def test_coalesced_callers_keep_their_question(tmp_path):
+    release = asyncio.Event()
+
+    async def slow(messages, question, **kwargs):
+        await release.wait()
+        return "answer", question
+
+    backend = make_backend(tmp_path, "only", AsyncMock(side_effect=slow))
+    backend.model.log = MagicMock()
+    model = MultiBackendModel([backend])
+
+    first, second = MagicMock(), MagicMock()
+    tasks = [asyncio.ensure_future(model.call_chat([user_message("same")], question)) for question in (first, second)]
+    await asyncio.sleep(0)
+
+    release.set()
+
+    assert await asyncio.gather(*tasks) == [("answer", first), ("answer", second)]
+    assert backend.model.call_chat.call_count == 1
+    backend.model.log.assert_called_once_with(second, "answer")
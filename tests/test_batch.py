@@ -0,0 +1,72 @@
+import pytest
+from gen.batch import BatchRunner, LocalBatchClient
+from gen.openapi_adaptor import Question
+
+
+class NamedQuestion(Question):
+    def __init__(self, name: str) -> None:
+        self.name = name
+
+    def get_text(self) -> str:
+        return f"convert {self.name}"
+
+    def get_name(self) -> str:
+        return self.name
+
+    def get_filename(self) -> str:
+        return "maths.rs"
+
+
+def requests_for(*names: str) -> list:
+    return [([{"role": "user", "content": f"convert {name}"}], NamedQuestion(name)) for name in names]
+
+
+class ExpiredBatchClient(LocalBatchClient):
+    """
+    Answers only the first request before the batch expires.
+    """
+
+    async def status(self, batch_id: str) -> str:
+        return "expired"
+
+    async def results(self, batch_id: str) -> dict[str, str]:
+        results = await super().results(batch_id)
+        return dict(list(results.items())[:1])
+
+
+@pytest.mark.asyncio
+async def test_each_set_of_requests_gets_its_own_batch(tmp_path):
+    bodies = []
+
+    def respond(body):
+        bodies.append(body)
+        return body["messages"][0]["content"]
+
+    batch = BatchRunner(LocalBatchClient(respond), "test-model", tmp_path / "requests.jsonl", poll_interval=0)
+
+    first = await batch.call_chat_all(requests_for("add", "sub"))
+    second = await batch.call_chat_all(requests_for("mul"))
+
+    assert [response for response, _ in first] == ["convert add", "convert sub"]
+    assert [response for response, _ in second] == ["convert mul"]
+    assert len(list(tmp_path.glob("requests-*.jsonl"))) == 2
+    assert len(list(tmp_path.glob("requests-*.batch"))) == 2
+
+    # both batches are resumed rather than submitted again
+    await batch.call_chat_all(requests_for("add", "sub"))
+    await batch.call_chat_all(requests_for("mul"))
+
+    assert len(bodies) == 3
+    assert batch.submitted == 3
+
+
+@pytest.mark.asyncio
+async def test_expired_batch_keeps_its_partial_results(tmp_path):
+    client = ExpiredBatchClient(lambda body: body["messages"][0]["content"])
+    batch = BatchRunner(client, "test-model", tmp_path / "requests.jsonl", poll_interval=0)
+
+    requests = requests_for("add", "sub")
+    responses = await batch.call_chat_all(requests)
+
+    assert [response for response, _ in responses] == ["convert add", ""]
+    assert batch.failed == 1
@@ -0,0 +1,63 @@
+from gen.compression import PromptCompressor, strip_comments
+from gen.parsers.go import GoParser
+
+SOURCE = """
+/// A store of videos.
+///
+/// Keeps track of the files on disk.
+#[derive(Debug, Clone, Serialize)]
+#[allow(dead_code)]
+pub struct MediaStore {
+    // where the videos live
+    root: String,   
+}
+
+impl MediaStore {
+    /// Moves a video into the store.
+    #[inline]
+    pub fn add_file(&self, name: &str) -> String {
+        /* not checked */
+        format!("{}//{}", self.root, name) // joined
+    }
+}
+"""
+
+
+def test_compress():
+    compressor = PromptCompressor()
+
+    code, docs = compressor.compress(SOURCE)
+
+    assert code == (
+        "#[derive(Serialize)]\n"
+        "pub struct MediaStore {\n"
+        "    root: String,\n"
+        "}\n"
+        "impl MediaStore {\n"
+        "    pub fn add_file(&self, name: &str) -> String {\n"
+        '        format!("{}//{}", self.root, name)\n'
+        "    }\n"
+        "}"
+    )
+    assert docs == {
+        "MediaStore": ["// A store of videos.", "//", "// Keeps track of the files on disk."],
+        "add_file": ["// Moves a video into the store."],
+    }
+    assert compressor.stats()["prompt compression ratio"] < 0.6
+
+
+def test_strip_comments_keeps_strings():
+    assert strip_comments("let a = '/'; // gone\nlet b = \"/* kept */\"; /* gone */") == (
+        "let a = '/'; \nlet b = \"/* kept */\"; "
+    )
+
+
+def test_attach_docs():
+    code = (
+        "type MediaStore struct {\n    root string\n}\n\n"
+        "// AddFile already documented.\nfunc (m *MediaStore) AddFile(name string) string {\n    return name\n}"
+    )
+
+    docs = {"MediaStore": ["// A store of videos."], "add_file": ["// Moves a video into the store."]}
+
+    assert GoParser.attach_docs(code, docs) == "// A store of videos.\n" + code
@@ -0,0 +1,60 @@
+from asyncio import gather, sleep
+
+import pytest
+from gen.concurrency import AdaptiveConcurrency
+
+
+def test_window_grows_additively_and_shrinks_multiplicatively():
+    concurrency = AdaptiveConcurrency(initial=4)
+
+    for _ in range(8):
+        concurrency.on_success(0.1)
+
+    assert concurrency.window == 5
+
+    concurrency.on_overload()
+    assert concurrency.window == 2
+
+    # a second failure from the same window doesn't cut again
+    concurrency.on_overload()
+    assert concurrency.window == 2
+
+    concurrency.on_success(1.0)
+    assert concurrency.stats()["concurrency window decreases"] == 1
+
+
+@pytest.mark.asyncio
+async def test_window_limits_requests_in_flight():
+    concurrency = AdaptiveConcurrency(initial=2)
+    peak = 0
+
+    async def request():
+        nonlocal peak
+        await concurrency.acquire()
+        peak = max(peak, concurrency.in_flight)
+        await sleep(0.01)
+        await concurrency.release(latency=0.01)
+
+    await gather(*[request() for _ in range(6)])
+
+    assert peak == 2
+    assert concurrency.in_flight == 0
+
+
+def test_varied_latency_is_not_overload():
+    concurrency = AdaptiveConcurrency(initial=16)
+
+    for idx in range(300):
+        concurrency.on_success(1.0 + (idx * 7) % 20)
+
+    assert concurrency.stats()["concurrency window decreases"] == 0
+    assert concurrency.window >= 16
+
+    concurrency = AdaptiveConcurrency(initial=16, latency_factor=3.0)
+    for idx in range(100):
+        concurrency.on_success(1.0 + (idx * 7) % 20)
+
+    assert concurrency.stats()["concurrency window decreases"] == 0
+
+    concurrency.on_success(500.0)
+    assert concurrency.stats()["concurrency window decreases"] == 1
@@ -1,10 +1,14 @@
+import asyncio
 from pathlib import Path
+from types import SimpleNamespace
 from unittest.mock import patch
 
 import pytest
+from gen.batch import BatchRunner, LocalBatchClient
 from gen.convert_source_language import LanguageConverter, ParsedCode, RustQuestion
 from gen.enums import Language
 from gen.openapi_adaptor import OpenAIModel
+from gen.response_cache import ResponseCache
 from gen.parsers import RustParser
 
 
@@ -157,3 +161,109 @@ def read_response_file(f):
             original.append(line)
 
     return name, "\n".join(original), "\n".join(response)
+
+
+@pytest.mark.asyncio
+async def test_best_of_candidates():
+    code = "pub fn add(a: i32, b: i32) -> i32 {\n    a + b\n}\n"
+    item = RustParser.parse(code)[0]
+    question = RustQuestion(item, ParsedCode([item]), Path("maths.go"))
+
+    responses = [
+        "I can't convert that.",
+        "```go\nfunc add(a, b int32) int32 {\n    return a + b\n}\n```",
+        "```go\nfunc add(a, b int) int {\n    return a + b\n}\n```",
+    ]
+
+    async def fake_chat_gpt(messages, question, variant=0):
+        return responses[variant], question
+
+    with patch("gen.openapi_adaptor.OpenAIModel.call_chat", side_effect=fake_chat_gpt) as call_chat:
+        converter = LanguageConverter(
+            Language.Rust, Language.Golang, OpenAIModel("rust-go"), candidates=3
+        )
+
+        response, _ = await converter.call_chat(converter.make_source_conversion_messages(code), question)
+
+    assert "func add" in response
+    assert call_chat.call_count == 3
+    assert converter.stats()["items with no usable candidate"] == 0
+
+
+@pytest.mark.asyncio
+async def test_best_of_cancels_losing_candidates(tmp_path, fake_client):
+    code = "pub fn add(a: i32, b: i32) -> i32 {\n    a + b\n}\n"
+    item = RustParser.parse(code)[0]
+    question = RustQuestion(item, ParsedCode([item]), Path("maths.go"))
+
+    calls = []
+    cancelled = []
+
+    async def create(**kwargs):
+        calls.append(kwargs)
+        if len(calls) > 1:
+            try:
+                await asyncio.sleep(1)
+            except asyncio.CancelledError:
+                cancelled.append(len(calls))
+                raise
+        content = "```go\nfunc add(a, b int32) int32 {\n    return a + b\n}\n```"
+        return SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content=content))], usage=None)
+
+    fake_client(create)
+
+    model = OpenAIModel("rust-go", log_dir=tmp_path, cache=ResponseCache(tmp_path / "cache.sqlite"))
+    converter = LanguageConverter(Language.Rust, Language.Golang, model, candidates=2)
+
+    response, _ = await converter.call_chat_best_of(converter.make_source_conversion_messages(code), question)
+    await asyncio.sleep(0.01)
+
+    assert "func add" in response
+    assert len(calls) == 2 and cancelled == [2]
+    assert converter.stats()["items rescued by a later candidate"] == 0
+
+
+@pytest.mark.asyncio
+async def test_convert_directory_batch(tmp_path):
+    src = tmp_path / "src" / "maths"
+    src.mkdir(parents=True)
+    (src / "maths.rs").write_text("pub fn add(a: i32, b: i32) -> i32 {\n    a + b\n}\n")
+    dest = tmp_path / "dest"
+
+    bodies = []
+
+    def respond(body):
+        bodies.append(body)
+        return "```go\nfunc Add(a, b int32) int32 {\n    return a + b\n}\n```"
+
+    batch = BatchRunner(LocalBatchClient(respond), "test-model", dest / "batch" / "requests.jsonl")
+    converter = LanguageConverter(Language.Rust, Language.Golang, OpenAIModel("rust-go"), batch=batch)
+
+    await converter.convert_directory(str(tmp_path / "src"), str(dest))
+
+    assert "func Add(a, b int32) int32" in (dest / "maths" / "maths.go").read_text()
+    assert len(bodies) == 1 and bodies[0]["model"] == "test-model"
+    assert converter.stats() == {
+        "parse cache hits": 0,
+        "parse cache misses": 2,
+        "calls avoided by the fast path": 0,
+        "prompt tokens saved by granularity": 0,
+        "batch requests submitted": 1,
+        "batch requests failed": 0,
+        "imports passed to prompts": 0,
+        "imports left out as unused": 0,
+    }
+
+    # a restarted run with the same requests resumes the submitted batch
+    await converter.convert_directory(str(tmp_path / "src"), str(dest))
+
+    assert len(bodies) == 1
+    assert converter.stats()["parse cache hits"] == 2
+
+
+def test_grouped_granularity_warns_about_skipped_features(capsys):
+    LanguageConverter(Language.Rust, Language.Golang, OpenAIModel("rust-go"))
+    assert capsys.readouterr().out == ""
+
+    LanguageConverter(Language.Rust, Language.Golang, OpenAIModel("rust-go"), granularity="auto")
+    assert "the fast path only apply to single declarations" in capsys.readouterr().out
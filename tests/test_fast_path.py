@@ -0,0 +1,110 @@
+from gen.fast_path import go_name, translate_rust_to_go
+from gen.parsers import GoParser, ParsedItem, RustParser
+from gen.parsers.common import ConvertedCode
+
+SOURCE = """use std::collections::HashMap;
+
+/// Shown when the tokens are missing
+const ACCESS_DENIED_MSG: &str = "Access denied, ensure access tokens have been set";
+pub const MAX_RETRIES: u32 = 1_000u32;
+
+#[derive(Debug, Clone, PartialEq)]
+pub enum MetaDataErrorCode {
+    Exception = 10,
+    ZeroFileSize = 1,
+    NoVideoSize,
+}
+
+#[repr(u8)]
+pub enum Level {
+    Low,
+    High,
+}
+
+pub struct Marker;
+
+#[derive(Debug)]
+pub struct MetaDataError {
+    /// what went wrong
+    pub code: MetaDataErrorCode,
+    pub counts: HashMap<String, Vec<u64>>,
+    message: [u8; 16],
+}
+
+pub struct Unsupported {
+    pub message: Option<String>,
+}
+
+pub enum Tagged {
+    Value(i32),
+}
+"""
+
+
+def translate(name: str) -> ConvertedCode | None:
+    items = RustParser.parse(SOURCE)
+    item = next(item for item in items if item.name == name)
+    return translate_rust_to_go(item, {"MetaDataErrorCode", "Level", "MetaDataError"})
+
+
+def test_translate_consts():
+    assert translate("ACCESS_DENIED_MSG") == (
+        "// Shown when the tokens are missing\n"
+        'const accessDeniedMsg string = "Access denied, ensure access tokens have been set"'
+    )
+    assert translate("MAX_RETRIES") == "const MaxRetries uint32 = 1_000"
+
+
+def test_translate_enums():
+    assert translate("MetaDataErrorCode") == (
+        "type MetaDataErrorCode int\n\nconst (\n"
+        "\tMetaDataErrorCodeException    MetaDataErrorCode = 10\n"
+        "\tMetaDataErrorCodeZeroFileSize MetaDataErrorCode = 1\n"
+        "\tMetaDataErrorCodeNoVideoSize  MetaDataErrorCode = 2\n)"
+    )
+    assert translate("Level") == "type Level uint8\n\nconst (\n\tLevelLow Level = iota\n\tLevelHigh\n)"
+    assert translate("Tagged") is None
+
+
+def test_translate_structs():
+    assert translate("Marker") == "type Marker struct{}"
+    assert translate("MetaDataError") == (
+        "type MetaDataError struct {\n"
+        "\t// what went wrong\n"
+        "\tCode    MetaDataErrorCode\n"
+        "\tCounts  map[string][]uint64\n"
+        "\tmessage [16]uint8\n}"
+    )
+    assert translate("Unsupported") is None
+
+
+def test_private_types_keep_their_names():
+    source = (
+        "struct Inner {\n    size: u32,\n}\n\n"
+        "enum Kind {\n    Alpha,\n    Beta,\n}\n\n"
+        "struct HTTPServer {\n    inner: Inner,\n    kinds: Vec<Kind>,\n}\n"
+    )
+    items = {item.name: item for item in RustParser.parse(source)}
+    known_types = {"Inner", "Kind", "HTTPServer"}
+
+    assert translate_rust_to_go(items["Inner"], known_types) == "type Inner struct {\n\tsize uint32\n}"
+    assert translate_rust_to_go(items["Kind"], known_types) == (
+        "type Kind int\n\nconst (\n\tKindAlpha Kind = iota\n\tKindBeta\n)"
+    )
+    assert translate_rust_to_go(items["HTTPServer"], known_types) == (
+        "type HTTPServer struct {\n\tinner Inner\n\tkinds []Kind\n}"
+    )
+
+
+def test_assemble_converted_code():
+    item = ParsedItem("Marker", "struct", "pub struct Marker;")
+    code = GoParser.assemble_new_code("markers", [(translate_rust_to_go(item), None)])
+
+    assert code.startswith("package markers")
+    assert code.endswith("\n\ntype Marker struct{}\n")
+
+
+def test_go_name():
+    assert go_name("video_details", True) == "VideoDetails"
+    assert go_name("HTTPClient", True) == "HTTPClient"
+    assert go_name("SEARCH_URL", False) == "searchUrl"
@@ -0,0 +1,58 @@
+from asyncio import CancelledError, sleep
+
+import pytest
+from gen.hedging import HedgePolicy
+
+
+@pytest.mark.asyncio
+async def test_hedge_wins_when_primary_is_slow():
+    policy = HedgePolicy(percentile=0.5, budget=1, min_samples=2)
+    policy.primary_latencies.extend([0.01, 0.01])
+
+    delays = [1.0, 0.0]
+    cancelled = []
+
+    async def request():
+        delay = delays.pop(0)
+        try:
+            await sleep(delay)
+        except CancelledError:
+            cancelled.append(delay)
+            raise
+        return delay
+
+    assert await policy.run(request) == 0.0
+
+    # let the cancelled primary unwind
+    await sleep(0)
+
+    assert cancelled == [1.0]
+    assert (policy.hedges, policy.hedge_wins) == (1, 1)
+    assert policy.stats()["hedge rate"] == 1
+
+
+@pytest.mark.asyncio
+async def test_hedging_respects_budget_and_failures():
+    policy = HedgePolicy(percentile=0.5, budget=0.5, min_samples=1)
+    policy.primary_latencies.append(0.001)
+
+    calls = 0
+
+    async def failing_then_ok():
+        nonlocal calls
+        calls += 1
+        await sleep(0.01)
+        if calls == 1:
+            raise ValueError("primary failed")
+        return "hedge"
+
+    # the primary fails, the hedge is still waited on
+    assert await policy.run(failing_then_ok) == "hedge"
+
+    async def slow():
+        await sleep(0.01)
+        return "primary"
+
+    # one hedge in two requests uses up the budget
+    assert await policy.run(slow) == "primary"
+    assert policy.hedges == 1
@@ -0,0 +1,34 @@
+from gen.convert_source_language import ParsedCode
+from gen.imports import ImportIndex
+from gen.parsers.common import ParsedItem
+
+
+def test_relevant_imports():
+    code = ParsedCode(
+        [
+            ParsedItem(name="add_file", type="function", source="fn add_file() {}"),
+            ParsedItem(
+                name="imports",
+                type="imports",
+                source="std::collections::HashMap,std::path::PathBuf,crate::domain::models::VideoDetails,tokio::fs as tfs",
+            ),
+        ]
+    )
+
+    assert code.imports == [
+        "std::collections::HashMap",
+        "std::path::PathBuf",
+        "crate::domain::models::VideoDetails",
+        "tokio::fs as tfs",
+    ]
+
+    index = ImportIndex()
+    index.add_symbols([ParsedItem(name="VideoDetails", type="struct", source="struct VideoDetails;")], "models")
+
+    source = "fn add(video: VideoDetails) {\n    // PathBuf is not used\n    tfs::write(video.path);\n}"
+
+    assert index.relevant("store.go", code.imports, source) == [
+        "crate::domain::models::VideoDetails (converted in package models)",
+        "tokio::fs as tfs",
+    ]
+    assert index.stats() == {"imports passed to prompts": 2, "imports left out as unused": 2}
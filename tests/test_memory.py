@@ -0,0 +1,99 @@
+from pathlib import Path
+from unittest.mock import patch
+
+import pytest
+
+pytest.importorskip("numpy")
+
+from gen.convert_source_language import LanguageConverter  # noqa: E402
+from gen.enums import Language  # noqa: E402
+from gen.memory import TranslationMemory, read_log, rename, tokenize  # noqa: E402
+from gen.openapi_adaptor import OpenAIModel  # noqa: E402
+
+FIXTURES = Path(__file__).parent / "fixtures"
+
+HANDLER = """pub async fn get_video(&self, id: i64) -> Result<Video> {
+    let video = self.store.get_video(id).await?;
+    Ok(video)
+}"""
+
+HANDLER_GO = """func (s *Service) GetVideo(id int64) (*Video, error) {
+\tvideo, err := s.store.GetVideo(id)
+\tif err != nil {
+\t\treturn nil, err
+\t}
+\treturn video, nil
+}"""
+
+
+def test_reuse_renamed_near_duplicate():
+    memory = TranslationMemory()
+    memory.add(HANDLER, HANDLER_GO)
+
+    code, examples = memory.lookup(HANDLER.replace("video", "episode").replace("Video", "Episode"))
+
+    assert code == HANDLER_GO.replace("video", "episode").replace("Video", "Episode")
+    assert examples == []
+
+
+def test_close_match_is_an_example():
+    memory = TranslationMemory()
+    memory.add(HANDLER, HANDLER_GO)
+
+    changed = HANDLER.replace("Ok(video)", "log::info!(\"found\");\n    Ok(video)")
+    code, examples = memory.lookup(changed)
+
+    assert code is None
+    assert examples == [(HANDLER, HANDLER_GO)]
+    assert memory.stats()["translation memory used as examples"] == 1
+
+
+def test_rename_refuses_what_it_cannot_carry_over():
+    old, _ = tokenize('const KIND: &str = "video";')
+    new, _ = tokenize('const KIND: &str = "channel";')
+
+    assert rename('const Kind = "video"', old, new) == 'const Kind = "channel"'
+    assert rename("const Kind = `video`", old, new) is None
+
+
+def test_rename_refuses_mappings_that_are_not_one_to_one():
+    target = "func add(a, b int32) int32 {\n\treturn a + b\n}"
+    old, _ = tokenize("fn add(a: i32, b: i32) -> i32 { a + b }")
+
+    same, _ = tokenize("fn add(a: i32, a: i32) -> i32 { a + a }")
+    assert rename(target, old, same) is None
+
+    swapped, _ = tokenize("fn add(a: i32, b: i32) -> i32 { b + a }")
+    assert rename(target, old, swapped) is None
+
+    renamed, _ = tokenize("fn sum(x: i32, y: i32) -> i32 { x + y }")
+    assert rename(target, old, renamed) == "func sum(x, y int32) int32 {\n\treturn x + y\n}"
+
+
+def test_load_fixture_logs():
+    memory = TranslationMemory()
+
+    assert memory.load(FIXTURES / "responses-services") > 0
+    assert read_log("no code here") is None
+
+
+@pytest.mark.asyncio
+async def test_converter_learns_only_usable_responses(tmp_path):
+    code = "pub fn add(a: i32, b: i32) -> i32 {\n    a + b\n}\n\npub fn sub(a: i32, b: i32) -> i32 {\n    a - b\n}\n"
+    responses = {
+        "add": "```go\nfunc Add(a, b int32) int32 {\n    return a + b\n}\n```",
+        "sub": "Sorry, I can't help with that.",
+    }
+
+    async def fake_chat_gpt(messages, question):
+        return responses[question.name], question
+
+    with patch("gen.openapi_adaptor.OpenAIModel.call_chat", side_effect=fake_chat_gpt):
+        memory = TranslationMemory()
+        converter = LanguageConverter(Language.Rust, Language.Golang, OpenAIModel("rust-go"), memory=memory)
+
+        requests = await converter.make_requests(code, tmp_path / "maths.go", converter.make_source_conversion_messages)
+        await converter.respond_all(requests)
+
+    assert len(memory) == 1
+    assert memory.entries[0][1].startswith("func Add")
@@ -0,0 +1,205 @@
+import asyncio
+from types import SimpleNamespace
+from unittest.mock import AsyncMock, MagicMock, patch
+
+import pytest
+from gen.openapi_adaptor import CacheMode, OpenAIModel, is_wanted_block, user_message
+from gen.parsers import GoParser
+from gen.response_cache import ResponseCache
+from gen.transport import ClientSettings
+
+
+def make_response(content: str):
+    return SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content=content))])
+
+
+def test_response_cache_round_trip(tmp_path):
+    cache = ResponseCache(tmp_path / "cache.sqlite")
+    key = cache.key("gpt", [user_message("hello")])
+
+    assert cache.get(key) is None
+
+    cache.put(key, "gpt", "world")
+
+    assert ResponseCache(tmp_path / "cache.sqlite").get(key) == "world"
+    assert cache.get(key) == "world"
+    assert cache.key("gpt", [user_message("hello")], {"temperature": 0}) != key
+    assert cache.stats() == {"response cache hits": 1, "response cache misses": 1}
+
+
+def test_response_cache_expires_and_evicts(tmp_path):
+    cache = ResponseCache(tmp_path / "cache.sqlite", ttl=-1)
+    cache.put("expired", "gpt", "content")
+
+    assert cache.get("expired") is None
+
+    cache = ResponseCache(tmp_path / "cache.sqlite", max_bytes=25)
+    for idx in range(5):
+        cache.put(str(idx), "gpt", "x" * 10)
+
+    assert [cache.get(str(idx)) for idx in range(5)] == [None, None, None, "x" * 10, "x" * 10]
+
+
+@pytest.mark.asyncio
+async def test_response_cache_sweeps_periodically_off_the_loop(tmp_path):
+    cache = ResponseCache(tmp_path / "cache.sqlite")
+
+    await cache.put_async("first", "gpt", "hello")
+    assert await cache.get_async("first") == "hello"
+
+    with patch.object(cache, "evict", wraps=cache.evict) as evict:
+        for idx in range(10):
+            await cache.put_async(str(idx), "gpt", "x" * 10)
+
+    assert evict.call_count == 0
+    assert cache.stored == 105
+
+    indexes = {row[0] for row in cache.connection.execute("SELECT name FROM sqlite_master WHERE type = 'index'")}
+    assert "responses_created" in indexes
+
+    cache.close()
+
+
+@pytest.mark.asyncio
+async def test_call_chat_uses_cache(tmp_path, fake_client):
+    question = MagicMock()
+    question.get_filename.return_value = "question"
+    question.get_text.return_value = "question"
+
+    create = AsyncMock(return_value=make_response("answer"))
+
+    fake_client(create)
+
+    model = OpenAIModel("test", log_dir=tmp_path, cache=ResponseCache(tmp_path / "cache.sqlite"))
+
+    assert await model.call_chat([user_message("hello")], question) == ("answer", question)
+    assert await model.call_chat([user_message("hello")], question) == ("answer", question)
+    assert create.call_count == 1
+
+    model.cache_mode = CacheMode.REFRESH
+    await model.call_chat([user_message("hello")], question)
+    assert create.call_count == 2
+
+    model.cache_mode = CacheMode.BYPASS
+    await model.call_chat([user_message("hello")], question)
+    assert create.call_count == 3
+
+
+@pytest.mark.asyncio
+async def test_call_chat_coalesces_identical_requests(tmp_path, fake_client):
+    question = MagicMock()
+    question.get_filename.return_value = "question"
+    question.get_text.return_value = "question"
+
+    async def slow_create(**kwargs):
+        await asyncio.sleep(0.01)
+        return make_response("answer")
+
+    create = AsyncMock(side_effect=slow_create)
+
+    fake_client(create)
+
+    model = OpenAIModel(
+        "test", log_dir=tmp_path, cache=ResponseCache(tmp_path / "cache.sqlite"), cache_mode=CacheMode.BYPASS
+    )
+
+    results = await asyncio.gather(
+        *[model.call_chat([user_message("hello")], question) for _ in range(5)]
+    )
+
+    assert results == [("answer", question)] * 5
+    assert create.call_count == 1
+    assert model.inflight.stats() == {"requests started": 1, "requests shared in flight": 4}
+
+
+class FakeStream:
+    def __init__(self, chunks: list[str]) -> None:
+        self.chunks = chunks
+        self.sent = 0
+        self.closed = False
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        if self.sent == len(self.chunks):
+            raise StopAsyncIteration
+
+        self.sent += 1
+        delta = SimpleNamespace(content=self.chunks[self.sent - 1])
+        return SimpleNamespace(choices=[SimpleNamespace(delta=delta)], usage=None)
+
+    async def close(self):
+        self.closed = True
+
+
+@pytest.mark.asyncio
+async def test_call_chat_stream_cutoff(tmp_path, fake_client):
+    question = MagicMock()
+    question.get_filename.return_value = "question"
+    question.get_name.return_value = "Add"
+
+    stream = FakeStream(
+        ["Here you go\n```go\nimport \"fmt\"\n``", "`\n", "```go\nfunc Add(a, b int) int {\n", "\treturn a + b\n}\n```", "\nThis works by...", "..."]
+    )
+
+    fake_client(AsyncMock(return_value=stream))
+
+    model = OpenAIModel("test", log_dir=tmp_path, cache_mode=CacheMode.BYPASS, stream_cutoff="go")
+
+    results, _ = await model.call_chat([user_message("hello")], question)
+
+    assert results.endswith("}\n```")
+    assert stream.sent == 4 and stream.closed
+    assert model.streams_cut == 1
+
+
+def wanted_question(type_name: str, name: str):
+    return SimpleNamespace(type_name=type_name, get_name=lambda: name)
+
+
+def test_grouped_items_are_not_cut_off():
+    block = "type MediaStore struct {\n}\n"
+
+    assert is_wanted_block(block, wanted_question("struct", "MediaStore"), GoParser)
+    assert not is_wanted_block(block, wanted_question("impl_group", "MediaStore"), GoParser)
+    assert not is_wanted_block("func OpenFile() {\n}\n", wanted_question("file", "File"), GoParser)
+
+
+def test_wanted_block_matches_declarations_by_name():
+    struct = "type Store struct {\n\ttarget string\n}\n"
+    method = "func (s *Store) GetVideo(id int) string {\n\treturn s.target\n}\n"
+
+    assert not is_wanted_block(struct, wanted_question("method", "get"), GoParser)
+    assert is_wanted_block(method, wanted_question("method", "getVideo"), GoParser)
+
+
+@pytest.mark.asyncio
+async def test_model_owns_its_client(tmp_path):
+    settings = ClientSettings(api_key="test", base_url="http://localhost:8000/v1", max_connections=8)
+    model = OpenAIModel("test", log_dir=tmp_path, settings=settings)
+
+    async with model:
+        client = model.client
+        assert client is model.client
+        assert str(client.base_url).startswith("http://localhost:8000/v1")
+        assert client.max_retries == 0
+
+    assert model._client is None
+
+
+@pytest.mark.asyncio
+async def test_json_output(tmp_path, fake_client):
+    question = MagicMock()
+    question.get_filename.return_value = "question"
+    question.get_text.return_value = "question"
+
+    create = AsyncMock(return_value=make_response('{"decls": []}'))
+
+    fake_client(create)
+
+    model = OpenAIModel("test", log_dir=tmp_path, cache=ResponseCache(tmp_path / "cache.sqlite"), json_output=True)
+
+    await model.call_chat([user_message("answer in JSON")], question)
+
+    assert create.call_args.kwargs["response_format"] == {"type": "json_object"}
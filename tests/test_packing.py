@@ -0,0 +1,81 @@
+import re
+from types import SimpleNamespace
+from unittest.mock import patch
+
+import pytest
+from gen.convert_source_language import LanguageConverter
+from gen.enums import Language
+from gen.openapi_adaptor import OpenAIModel
+from gen.packing import PackedQuestion, PromptPacker
+
+SOURCE = """pub fn add(a: i32, b: i32) -> i32 {
+    a + b
+}
+
+pub fn sub(a: i32, b: i32) -> i32 {
+    a - b
+}
+
+pub fn mul(a: i32, b: i32) -> i32 {
+    a * b
+}
+"""
+
+
+def test_split():
+    packer = PromptPacker()
+    response = "Sure.\n\n=== ITEM 2: sub ===\n```go\nfunc Sub() {}\n```\n=== ITEM 1: add ===\n```go\nfunc Add() {}\n```\n"
+
+    assert packer.split(response, 3, "go") == ["\n```go\nfunc Add() {}\n```\n", "\n```go\nfunc Sub() {}\n```\n", None]
+    assert packer.stats()["packed items sent again on their own"] == 1
+
+
+@pytest.mark.asyncio
+async def test_packed_conversion_falls_back_to_single_items(tmp_path):
+    sent = []
+
+    async def fake_chat_gpt(messages, question):
+        sent.append(question)
+        prompt = messages[-1]["content"]
+
+        if isinstance(question, PackedQuestion):
+            # answer every item but the last
+            names = re.findall(r"=== ITEM (\d+): (\w+) ===", prompt)[:-1]
+            return "".join(f"=== ITEM {n}: {name} ===\n```go\nfunc {name}() {{}}\n```\n" for n, name in names), question
+
+        return f"```go\nfunc {question.get_name()}() {{}}\n```", question
+
+    src = tmp_path / "maths.rs"
+    src.write_text(SOURCE)
+    dest = tmp_path / "maths.go"
+
+    with patch("gen.openapi_adaptor.OpenAIModel.call_chat", side_effect=fake_chat_gpt):
+        converter = LanguageConverter(
+            Language.Rust, Language.Golang, OpenAIModel("rust-go"), packer=PromptPacker()
+        )
+        await converter.convert_source("maths", SOURCE, dest, converter.make_source_conversion_messages)
+
+    assert [type(question).__name__ for question in sent] == ["PackedQuestion", "RustQuestion"]
+    code = dest.read_text()
+    assert "func add() {}" in code and "func sub() {}" in code and "func mul() {}" in code
+    assert converter.stats()["requests saved by packing"] == 2
+
+
+def test_items_with_different_imports_share_a_pack():
+    converter = LanguageConverter(Language.Rust, Language.Golang, OpenAIModel("rust-go"))
+
+    requests = [
+        (converter.make_source_conversion_messages(code, libs), SimpleNamespace(get_name=lambda name=name: name))
+        for name, code, libs in [
+            ("open", "fn open() {}", ["std::fs"]),
+            ("read", "fn read() {}", ["std::fs", "std::io"]),
+            ("add", "fn add() {}", []),
+        ]
+    ]
+
+    ((indices, (messages, question)),) = PromptPacker().pack(requests, "rust", "go")
+
+    assert indices == [0, 1, 2]
+    assert messages[:-3] == requests[2][0][:-1]
+    assert messages[-3]["content"] == "Please use this following libraries if applicable: std::fs, std::io"
+    assert question.get_name() == "open+read+add"
@@ -0,0 +1,39 @@
+from asyncio import gather
+from time import monotonic
+
+import pytest
+from gen.rate_limit import RateLimiter, TokenBucket
+
+
+def test_token_bucket_wait_time():
+    bucket = TokenBucket(60)
+
+    assert bucket.wait_time(60) == 0
+
+    bucket.take(60)
+
+    assert 0.9 < bucket.wait_time(1) <= 1
+    assert 59 < bucket.wait_time(1000) <= 60
+
+
+@pytest.mark.asyncio
+async def test_rate_limiter_waits_for_tokens():
+    limiter = RateLimiter(tpm=6000)
+
+    start = monotonic()
+    await limiter.acquire(6000)
+    assert monotonic() - start < 0.05
+
+    await limiter.acquire(10)
+    assert monotonic() - start >= 0.08
+
+
+@pytest.mark.asyncio
+async def test_rate_limiter_reconciles_usage():
+    limiter = RateLimiter(rpm=600, tpm=6000)
+
+    await gather(limiter.acquire(3000), limiter.acquire(3000))
+    limiter.reconcile(3000, 100)
+
+    assert limiter.tokens.wait_time(2900) == 0
+    assert limiter.requests.level < 599
@@ -0,0 +1,127 @@
+import asyncio
+from time import monotonic
+from types import SimpleNamespace
+from unittest.mock import AsyncMock, MagicMock
+
+import httpx
+import pytest
+from openai import APIConnectionError
+from gen.openapi_adaptor import CacheMode, OpenAIModel, user_message
+from gen.retry import CircuitBreaker, RetryBudget, RetryPolicy, retry_after
+
+
+def connection_error() -> APIConnectionError:
+    return APIConnectionError(request=httpx.Request("POST", "https://api.openai.com/v1/chat/completions"))
+
+
+def make_error(headers: dict) -> Exception:
+    err = Exception("rate limited")
+    err.response = SimpleNamespace(headers=headers)
+    return err
+
+
+def test_retry_after():
+    assert retry_after(make_error({"retry-after": "2"})) == 2
+    assert retry_after(make_error({"retry-after-ms": "250"})) == 0.25
+    assert retry_after(make_error({})) is None
+    assert retry_after(Exception()) is None
+
+
+def test_retry_policy_delay():
+    policy = RetryPolicy(base=1, cap=5)
+
+    assert all(0 <= policy.delay(1) <= 2 for _ in range(20))
+    assert all(0 <= policy.delay(10) <= 5 for _ in range(20))
+    assert policy.delay(1, make_error({"retry-after": "3"})) == 3
+
+
+def test_retry_budget():
+    budget = RetryBudget(ratio=0.5, minimum=1)
+
+    assert budget.withdraw()
+    assert not budget.withdraw()
+
+    budget.deposit()
+    budget.deposit()
+
+    assert budget.withdraw()
+    assert budget.exhausted == 1
+
+
+@pytest.mark.asyncio
+async def test_circuit_breaker_holds_submissions():
+    breaker = CircuitBreaker(failure_threshold=2, reset_timeout=0.05)
+
+    breaker.record_failure()
+    assert not breaker.is_open
+
+    breaker.record_failure()
+    assert breaker.is_open
+
+    start = monotonic()
+    await breaker.wait_ready()
+    assert monotonic() - start >= 0.04
+
+    # half open, the next failure opens it straight away
+    breaker.record_failure()
+    assert breaker.is_open
+
+    breaker.record_success()
+    assert not breaker.is_open
+
+
+@pytest.mark.asyncio
+async def test_call_chat_retries_then_raises(tmp_path, fake_client):
+    question = MagicMock()
+    question.get_filename.return_value = "question"
+
+    response = SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content="answer"))])
+    create = AsyncMock(side_effect=[connection_error(), response, connection_error(), connection_error()])
+
+    fake_client(create)
+
+    model = OpenAIModel(
+        "test", log_dir=tmp_path, cache_mode=CacheMode.BYPASS, retry_policy=RetryPolicy(attempts=2, base=0)
+    )
+
+    assert await model.call_chat([user_message("hello")], question) == ("answer", question)
+
+    with pytest.raises(APIConnectionError):
+        await model.call_chat([user_message("again")], question)
+
+    assert model.retries == 2
+
+
+@pytest.mark.asyncio
+async def test_call_chat_does_not_retry_permanent_errors(tmp_path, fake_client):
+    question = MagicMock()
+    question.get_filename.return_value = "question"
+
+    create = AsyncMock(side_effect=ValueError("bad key"))
+
+    fake_client(create)
+
+    model = OpenAIModel("test", log_dir=tmp_path, cache_mode=CacheMode.BYPASS)
+
+    for _ in range(10):
+        with pytest.raises(ValueError):
+            await model.call_chat([user_message("hello")], question)
+
+    assert create.call_count == 10
+    assert model.retries == 0
+    assert model.circuit_breaker.failures == 0
+
+
+@pytest.mark.asyncio
+async def test_half_open_circuit_breaker_admits_one_probe():
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=0.01)
+    breaker.record_failure()
+    await asyncio.sleep(0.02)
+
+    waiters = [asyncio.ensure_future(breaker.wait_ready()) for _ in range(3)]
+    await asyncio.sleep(0)
+    assert [waiter.done() for waiter in waiters] == [True, False, False]
+
+    breaker.record_success()
+    await asyncio.sleep(0)
+    assert all(waiter.done() for waiter in waiters)
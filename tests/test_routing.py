@@ -0,0 +1,65 @@
+from pathlib import Path
+from unittest.mock import AsyncMock, MagicMock
+
+import pytest
+from gen.convert_source_language import ParsedCode, RustQuestion
+from gen.openapi_adaptor import user_message
+from gen.parsers import ParsedItem
+from gen.routing import ModelRouter, Tier, score_item
+
+CONST = ParsedItem("MAX", "const", "pub const MAX: usize = 10;")
+
+HANDLER = ParsedItem(
+    "handle",
+    "method",
+    """pub async fn handle<'a, T: Store>(&self, store: &'a T) -> Result<(), Error> {
+    for message in self.messages.iter() {
+        if let Some(reply) = store.get(message.id).await? {
+            self.send(reply).await?;
+        }
+    }
+    Ok(())
+}""",
+    "Handler",
+)
+
+
+def make_question(item: ParsedItem) -> RustQuestion:
+    return RustQuestion(item, ParsedCode([item]), Path("handler.go"))
+
+
+def make_model(name: str) -> MagicMock:
+    model = MagicMock()
+    model.call_chat = AsyncMock()
+    model.call_chat.side_effect = lambda messages, question, **kwargs: (name, question)
+    model.stats.return_value = {}
+    return model
+
+
+def test_score_item():
+    assert score_item(CONST) < 5
+    assert score_item(HANDLER) > 20
+
+
+def test_score_item_ignores_literals_and_comments():
+    plain = ParsedItem("quote", "function", 'fn quote(c: char) -> bool {\n    c == x\n}')
+    literals = ParsedItem(
+        "quote", "function", "fn quote(c: char) -> bool {\n    // it's a quote\n    c == 'q' || c == \"don't\"\n}"
+    )
+    lifetime = ParsedItem("quote", "function", "fn quote<'a>(c: &'a str) -> bool {\n    c == x\n}")
+
+    assert score_item(literals) == score_item(plain) + 0.2
+    assert score_item(lifetime) > score_item(plain) + 4
+
+
+@pytest.mark.asyncio
+async def test_routes_by_score():
+    router = ModelRouter([Tier("large", make_model("large")), Tier("small", make_model("small"), 10)])
+
+    assert await router.call_chat([user_message("")], make_question(CONST)) == ("small", make_question(CONST))
+    assert (await router.call_chat([user_message("")], make_question(HANDLER)))[0] == "large"
+    assert (await router.call_chat([user_message("")]))[0] == "large"
+
+    stats = router.stats()
+    assert stats["tier small requests"] == 1
+    assert stats["tier large requests"] == 2
@@ -0,0 +1,104 @@
+import re
+from unittest.mock import patch
+
+import pytest
+from gen.convert_source_language import FragmentQuestion, LanguageConverter
+from gen.enums import Language
+from gen.openapi_adaptor import OpenAIModel
+from gen.parsers import GoParser, ParsedItem
+from gen.parsers.common import TAB
+from gen.splitting import ItemSplitter, segments
+
+FUNCTION = """pub fn total(values: &[i64]) -> i64 {
+    let mut sum = 0;
+    // braces in strings and comments are ignored: { "}"
+    for value in values {
+        sum += value;
+    }
+    let label = if sum > 0 { "positive" } else { "negative" };
+    println!("{} {}", label, '}');
+    sum
+}"""
+
+IMPL = """impl Shape for Square {
+    fn area(&self) -> f64 {
+        self.side * self.side
+    }
+
+    /// the outline
+    fn perimeter(&self) -> f64 {
+        4.0 * self.side
+    }
+}"""
+
+
+def test_segments():
+    start = FUNCTION.index("{") + 1
+    end = FUNCTION.rindex("}")
+
+    assert [segment.strip().split("\n")[0] for segment in segments(FUNCTION, start, end)] == [
+        "let mut sum = 0;",
+        '// braces in strings and comments are ignored: { "}"',
+        'let label = if sum > 0 { "positive" } else { "negative" };',
+        "println!(\"{} {}\", label, '}');",
+        "sum",
+    ]
+
+
+def test_split_container():
+    pieces = ItemSplitter(max_tokens=20).split(ParsedItem("Square", "impl", IMPL))
+
+    assert [(piece.name, piece.type, piece.receiver) for piece in pieces] == [
+        ("area", "method", "Square"),
+        ("perimeter", "method", "Square"),
+    ]
+    assert pieces[1].source.startswith("impl Shape for Square {\n    /// the outline\n    fn perimeter")
+    assert pieces[1].source.endswith("}\n}")
+
+
+def test_split_function():
+    splitter = ItemSplitter(max_tokens=30)
+    fragments = splitter.split(ParsedItem("total", "function", FUNCTION))
+
+    assert len(fragments) > 1
+    assert all(fragment.type == "fragment" for fragment in fragments)
+    assert fragments[0].source.startswith("pub fn total(values: &[i64]) -> i64 {")
+    assert fragments[-1].source.endswith("sum\n}")
+    assert "".join(fragment.source for fragment in fragments).count("sum += value;") == 1
+    assert ItemSplitter().split(ParsedItem("total", "function", FUNCTION)) == [ParsedItem("total", "function", FUNCTION)]
+
+
+def test_join_go_code_blocks():
+    code = GoParser.join_code_blocks(
+        ['package main\n\nimport "fmt"\n\nfunc total() {\n\tfmt.Println(1)', 'package main\n\nimport (\n\t"os"\n)\n\tos.Exit(0)\n}']
+    )
+
+    assert code == (
+        f'package main\n\nimport (\n{TAB}"fmt"\n{TAB}"os"\n)\n\nfunc total() {{\n\tfmt.Println(1)\n\tos.Exit(0)\n}}\n'
+    )
+
+
+@pytest.mark.asyncio
+async def test_convert_split_function(tmp_path):
+    async def fake_chat_gpt(messages, question):
+        assert isinstance(question, FragmentQuestion)
+        lines = [f"\tstep{question.part}()"]
+        if question.part == 0:
+            lines.insert(0, "func Total(values []int64) int64 {")
+        if question.part == question.parts - 1:
+            lines.append("\treturn 0\n}")
+        return "```go\npackage main\n\n" + "\n".join(lines) + "\n```", question
+
+    dest = tmp_path / "total.go"
+
+    with patch("gen.openapi_adaptor.OpenAIModel.call_chat", side_effect=fake_chat_gpt):
+        converter = LanguageConverter(
+            Language.Rust, Language.Golang, OpenAIModel("rust-go"), splitter=ItemSplitter(max_tokens=30)
+        )
+        await converter.convert_source("maths", FUNCTION, dest, converter.make_source_conversion_messages)
+
+    code = dest.read_text()
+    steps = re.findall(r"step\d", code)
+    assert code.count("func Total") == 1
+    assert steps == sorted(steps) and len(steps) > 1
+    assert converter.stats()["items split"] == 1
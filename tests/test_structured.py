@@ -0,0 +1,98 @@
+import json
+from unittest.mock import patch
+
+import pytest
+from gen.convert_source_language import LanguageConverter
+from gen.enums import Language
+from gen.openapi_adaptor import OpenAIModel
+from gen.parsers.common import ConvertedCode
+from gen.structured import parse_structured, to_converted_code
+
+
+class Question:
+    def __init__(self, name: str, type_name: str = "method") -> None:
+        self.name = name
+        self.type_name = type_name
+
+    def get_name(self) -> str:
+        return self.name
+
+
+RESPONSE = {
+    "decls": [
+        {"name": "MediaStore", "kind": "type", "receiver": None, "source": "type MediaStore struct {\n}"},
+        {
+            "name": "AddFile",
+            "kind": "method",
+            "receiver": "*MediaStore",
+            "source": 'func (m *MediaStore) AddFile() {\n    fmt.Println("added")\n}',
+        },
+        {"name": "main", "kind": "func", "source": "func main() {\n}"},
+    ],
+    "imports": ["fmt"],
+}
+
+
+def test_parse_structured():
+    structured = parse_structured(json.dumps(RESPONSE))
+
+    assert [decl.name for decl in structured.decls] == ["MediaStore", "AddFile", "main"]
+    assert structured.decls[1].receiver == "MediaStore"
+    assert structured.imports == ["fmt"]
+
+    assert parse_structured(f"Here it is:\n```json\n{json.dumps(RESPONSE)}\n```") is not None
+
+    assert parse_structured("```go\nfunc main() {}\n```") is None
+    assert parse_structured('{"decls": [{"name": "x", "kind": "class", "source": "x"}]}') is None
+    assert parse_structured('{"decls": [{"name": "x", "kind": "func", "source": ""}]}') is None
+    assert parse_structured('{"decls": [], "imports": []}') is None
+    assert parse_structured('{"decls": [{"name": "x", "kind": "func", "source": "x"}], "imports": [1]}') is None
+
+
+def test_to_converted_code():
+    structured = parse_structured(json.dumps(RESPONSE))
+
+    code = to_converted_code(structured, Question("add_file"))
+    assert code.startswith("func (m *MediaStore) AddFile()") and code.imports == ("fmt",)
+
+    code = to_converted_code(structured, Question("MediaStore", "impl_group"))
+    assert "type MediaStore struct" in code and "AddFile" in code and "func main" not in code
+
+    # like a markdown response, a lone function is taken when no name matches
+    assert to_converted_code(structured, Question("add", "function")).startswith("func (m *MediaStore) AddFile()")
+
+    structured.decls = structured.decls[:1]
+    assert to_converted_code(structured, Question("Other", "struct")) is None
+
+
+@pytest.mark.asyncio
+async def test_convert_source_structured(tmp_path):
+    code = "pub fn add(a: i32, b: i32) -> i32 {\n    a + b\n}\n\npub fn sub(a: i32, b: i32) -> i32 {\n    a - b\n}\n"
+
+    responses = {
+        "add": json.dumps(
+            {"decls": [{"name": "Add", "kind": "func", "source": "func Add(a, b int32) int32 {\n    return a + b\n}"}]}
+        ),
+        # not JSON, read as markdown instead
+        "sub": "```go\nfunc Sub(a, b int32) int32 {\n    return a - b\n}\n```",
+    }
+
+    async def fake_chat_gpt(messages, question):
+        assert "JSON" in messages[-3]["content"] and messages[-1]["content"].startswith("pub fn")
+        return responses[question.name], question
+
+    with patch("gen.openapi_adaptor.OpenAIModel.call_chat", side_effect=fake_chat_gpt):
+        converter = LanguageConverter(Language.Rust, Language.Golang, OpenAIModel("rust-go"), structured=True)
+
+        requests = await converter.make_requests(code, tmp_path / "maths.go", converter.make_source_conversion_messages)
+        answers = await converter.respond_all(requests)
+
+    assert isinstance(answers[0][0], ConvertedCode)
+    assert not isinstance(answers[1][0], ConvertedCode)
+
+    new_code = await converter.write_code("maths", answers, tmp_path / "maths.go")
+
+    assert "func Add(a, b int32) int32" in new_code
+    assert "func Sub(a, b int32) int32" in new_code
+    assert converter.stats()["structured responses assembled directly"] == 1
+    assert converter.stats()["structured responses read as markdown"] == 1